@@ -0,0 +1,349 @@
+"""Benchmarks
+
+Times the load -> crop -> annotate -> analyse -> export path of fibresem on
+the sample data, or on a synthetic corpus scaled up from the sample data.
+
+    python benchmarks/run_benchmarks.py --output results.json
+    python benchmarks/run_benchmarks.py --copies 10 --upscale 2 --engine python
+    python benchmarks/run_benchmarks.py --compare baseline.json --output results.json
+
+Every stage is reported with its total and per image wall time, throughput
+(images/s and MB/s of decoded pixel data) and the peak resident set size of
+the process after the stage. The peak RSS only grows, so it is the peak of
+this stage and all stages before it.
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import platform
+import tempfile
+import subprocess
+import statistics
+from collections import defaultdict
+
+import click
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from fibresem.core.config import Config
+from fibresem.core.fibresem import Project, Image
+from fibresem.io import readtif, tifffile
+from fibresem.analysis import analysis_engines
+
+REPO_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE_DATA_PATH = os.path.join(REPO_PATH, "sampledata")
+
+LOG_MSGFORMAT = "[%(asctime)s] %(message)s"
+LOG_TIMEFORMAT = "%H:%M:%S"
+
+STAGES = (
+    "importtif",
+    "importtif_memmap",
+    "readtags",
+    "readmeta",
+    "crop_square",
+    "annotate_matplotlib",
+    "save_figure",
+    "annotate_raster",
+    "engine_start",
+    "analysis",
+    "export_analysis",
+    "export_mat",
+)
+
+
+def peak_rss() -> int:
+    """Peak resident set size of this process in bytes, None if unknown"""
+
+    if resource is None:
+        return None
+
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # Linux reports kilobytes, macOS bytes
+    return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+
+def git_revision() -> str:
+    """Commit of the working tree, None if not a git repository"""
+
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=REPO_PATH,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def make_corpus(source_path: str, target_path: str, copies=1, upscale=1) -> list:
+    """Fill target_path with a corpus scaled up from the .tif files in source_path
+
+    Parameters
+    ----------
+    copies : int
+        Number of copies of every source image
+    upscale : int
+        Upscaling factor of every image (nearest neighbour), the pixel size
+        in the ZEISS SEM tag is scaled down accordingly
+
+    Returns
+    -------
+    list
+        Paths to the corpus images
+    """
+
+    files = []
+
+    for source in sorted(os.listdir(source_path)):
+        if not source.endswith(".tif"):
+            continue
+
+        name = os.path.splitext(source)[0]
+        source = os.path.join(source_path, source)
+
+        if upscale > 1:
+            data, tags = readtif.importtif(source)
+            data = np.repeat(np.repeat(data, upscale, axis=0), upscale, axis=1)
+
+            # Scale pixel size in the ZEISS SEM tag
+            zeiss = tags[str(readtif.TAG_INDEX)].replace("\x00", "")
+            pixel_size = tags["image"]["Image Pixel Size"]
+            scaled = f"{tags['Pixel Size Value'] / upscale:.4g} {tags['Pixel Size Unit']}"
+            zeiss = zeiss.replace(f"Image Pixel Size = {pixel_size}", f"Image Pixel Size = {scaled}")
+            zeiss = zeiss.encode("latin-1")
+
+        for i in range(copies):
+            target = os.path.join(target_path, f"{name}_copy{i:03d}.tif")
+
+            if upscale > 1:
+                tifffile.imwrite(
+                    target, data, extratags=[(readtif.TAG_INDEX, 2, 0, zeiss, True)]
+                )
+            else:
+                shutil.copyfile(source, target)
+
+            files.append(target)
+
+    return files
+
+
+class Timer:
+    """Collects wall times and processed bytes per stage"""
+
+    def __init__(self):
+        self.times = defaultdict(list)
+        self.nbytes = defaultdict(int)
+        self.rss = {}
+
+    def run(self, stage: str, func, *args, nbytes=0, **kwargs):
+        """Time a single call of func"""
+
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        self.times[stage].append(time.perf_counter() - start)
+        self.nbytes[stage] += nbytes
+        self.rss[stage] = peak_rss()
+
+        return result
+
+    def wrap(self, stage: str, func):
+        """Return func, timed on every call"""
+
+        def timed(*args, **kwargs):
+            return self.run(stage, func, *args, **kwargs)
+
+        return timed
+
+    def summary(self) -> dict:
+        summary = {}
+
+        for stage in STAGES:
+            times = self.times.get(stage)
+            if not times:
+                continue
+
+            total = sum(times)
+            summary[stage] = {
+                "calls": len(times),
+                "total_s": total,
+                "mean_s": total / len(times),
+                "median_s": statistics.median(times),
+                "min_s": min(times),
+                "images_per_s": len(times) / total if total > 0 else None,
+                "mb_per_s": self.nbytes[stage] / 2**20 / total if total > 0 and self.nbytes[stage] else None,
+                "peak_rss_mb": self.rss[stage] / 2**20 if self.rss[stage] else None,
+            }
+
+        return summary
+
+
+def run_benchmarks(files: list, project_path: str, engine=None, repeat=1) -> dict:
+    """Run every stage on every image
+
+    Parameters
+    ----------
+    files : list
+        Paths to the images
+    project_path : str
+        Project directory, outputs are written here
+    engine : str
+        Analysis engine, e.g. "simpoly-python". None: skip the analysis
+    repeat : int
+        Number of runs of the load, crop and annotate stages
+
+    Returns
+    -------
+    dict
+        Summary per stage
+    """
+
+    timer = Timer()
+
+    config = Config()
+    config.set("cache", "enabled", "False")
+
+    project = Project(path=project_path, config=config)
+    project.Images = [Image(project, path) for path in files]
+
+    for _ in range(repeat):
+        for image in project.Images:
+            data, _ = timer.run("importtif", readtif.importtif, image.Path)
+            nbytes = data.nbytes
+            timer.nbytes["importtif"] += nbytes
+
+            timer.run("importtif_memmap", readtif.importtif, image.Path, memmap=True, nbytes=nbytes)
+
+            with tifffile.TiffFile(image.Path) as fh:
+                timer.run("readtags", readtif.readtags, fh)
+
+            timer.run("readmeta", readtif.readmeta, image.Path)
+
+            image.Data = data
+            timer.run("crop_square", image.crop_square, copy=True, nbytes=nbytes)
+
+            image.unloadImage()
+            image.save_figure = timer.wrap("save_figure", image.save_figure)
+            timer.run("annotate_matplotlib", image.annotate, renderer="matplotlib", nbytes=nbytes)
+            del image.save_figure
+
+            timer.run("annotate_raster", image.annotate, renderer="raster", nbytes=nbytes)
+
+    if engine is not None:
+        project.engine_handler = timer.run("engine_start", analysis_engines.create_engine, engine)
+
+        if project.engine_handler is None or not project.engine_handler.is_running:
+            logging.error(f"Could not start engine {engine}, skipping analysis.")
+        else:
+            for image in project.Images:
+                timer.run(
+                    "analysis",
+                    image.run_diameter_analysis,
+                    engine_handler=project.engine_handler,
+                    config=config,
+                    nbytes=os.path.getsize(image.Path),
+                )
+
+            project.close_engine()
+
+    timer.run("export_analysis", project.export_analysis)
+    timer.run("export_mat", project.export_mat)
+
+    return timer.summary()
+
+
+def compare(results: dict, baseline: dict):
+    """Print speedup of every stage relative to a baseline"""
+
+    print(f"\n{'stage':<22}{'baseline (s)':>14}{'current (s)':>14}{'speedup':>10}")
+
+    for stage, current in results["stages"].items():
+        if stage not in baseline["stages"]:
+            continue
+
+        before = baseline["stages"][stage]["median_s"]
+        after = current["median_s"]
+        speedup = before / after if after > 0 else float("inf")
+
+        print(f"{stage:<22}{before:>14.4f}{after:>14.4f}{speedup:>9.2f}x")
+
+
+def print_summary(summary: dict):
+    print(f"\n{'stage':<22}{'calls':>6}{'median (s)':>12}{'img/s':>10}{'MB/s':>10}{'peak RSS (MB)':>15}")
+
+    for stage, s in summary.items():
+        mb_per_s = f"{s['mb_per_s']:.1f}" if s["mb_per_s"] else "-"
+        images_per_s = f"{s['images_per_s']:.2f}" if s["images_per_s"] else "-"
+        rss = f"{s['peak_rss_mb']:.0f}" if s["peak_rss_mb"] else "-"
+        print(f"{stage:<22}{s['calls']:>6}{s['median_s']:>12.4f}{images_per_s:>10}{mb_per_s:>10}{rss:>15}")
+
+
+@click.command()
+@click.option("--source", default=SAMPLE_DATA_PATH, help="Directory with .tif images")
+@click.option("--copies", type=int, default=1, help="Copies of every source image")
+@click.option("--upscale", type=int, default=1, help="Upscaling factor of every source image")
+@click.option("--engine", type=click.Choice(["none", "python", "matlab"]), default="python")
+@click.option("--repeat", type=int, default=1, help="Runs of the load, crop and annotate stages")
+@click.option("--output", default=None, help="Write results to JSON file")
+@click.option("--compare", "baseline", default=None, help="Compare with results in JSON file")
+def main(source, copies, upscale, engine, repeat, output, baseline):
+    """Benchmark the fibresem load, crop, annotate, analyse and export stages"""
+
+    logging.basicConfig(format=LOG_MSGFORMAT, datefmt=LOG_TIMEFORMAT, level=logging.WARNING)
+
+    with tempfile.TemporaryDirectory(prefix="fibresem-bench-") as project_path:
+        files = make_corpus(source, project_path, copies, upscale)
+        if not files:
+            logging.error(f"No .tif images found in {source}")
+            return
+
+        summary = run_benchmarks(
+            files,
+            project_path,
+            engine=None if engine == "none" else f"simpoly-{engine}",
+            repeat=repeat,
+        )
+
+    results = {
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "corpus": {
+            "source": os.path.abspath(source),
+            "images": len(files),
+            "copies": copies,
+            "upscale": upscale,
+        },
+        "engine": engine,
+        "repeat": repeat,
+        "stages": summary,
+    }
+
+    print_summary(summary)
+
+    if baseline is not None:
+        with open(baseline, encoding="utf-8") as fh:
+            compare(results, json.load(fh))
+
+    if output is not None:
+        with open(output, "w", encoding="utf-8") as fh:
+            json.dump(results, fh, indent=2)
+        print(f"\nResults written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,7 @@ FIBRESEM
 """
 
 # External
+import os
 import logging
 import click
 
@@ -10,6 +11,9 @@ import click
 # Internal
 from fibresem.core.config import Config
 from fibresem.core.fibresem import Project
+from fibresem.core.pipeline import Stage, run_streaming, run_watching, DEFAULT_PREFETCH, DEFAULT_EXPORT_INTERVAL
+from fibresem.core.watcher import FolderWatcher, DEFAULT_INTERVAL, DEFAULT_SETTLE
+from fibresem.helper import instrument
 from fibresem.helper.clickhelp import PerCommandArgWantSubCmdHelp
 
 # from fibresem.core.fibresem import Image
@@ -26,9 +30,17 @@ logging.getLogger("PIL").setLevel(logging.WARNING)
 
 @click.group(chain=True)
 @click.option('-v', '--verbose', is_flag=True)
+@click.option('--stream', is_flag=True, help='Run chained commands image by image, decoding every image once')
+@click.option('--prefetch', type=int, default=DEFAULT_PREFETCH, help='Number of images decoded ahead when streaming')
+@click.option('--memmap', is_flag=True, help='Memory-map uncompressed images instead of reading them')
+@click.option('--profile', type=click.Path(dir_okay=False), default=None, help='Write a Chrome trace (JSON) of all stages to this file')
+@click.option('--profile-memory', is_flag=True, help='Also trace the memory allocated per stage with --profile (slows down processing)')
+@click.option('-r', '--recursive', is_flag=True, help='Include images in subfolders')
+@click.option('--include', multiple=True, help='Only include images matching this glob pattern (relative to INPUT_PATH), repeatable')
+@click.option('--exclude', multiple=True, help='Exclude images and folders matching this glob pattern (relative to INPUT_PATH), repeatable')
 @click.argument('input_path', cls=PerCommandArgWantSubCmdHelp)
 @click.pass_context
-def cli(context = None, verbose = False, input_path = None):
+def cli(context = None, verbose = False, stream = False, prefetch = DEFAULT_PREFETCH, memmap = False, profile = None, profile_memory = False, recursive = False, include = (), exclude = (), input_path = None):
     """Simple tool to process and manipulate SEM images of fibrous mats
     
     To get help for a specific command, e.g. 'diam', use:
@@ -45,7 +57,7 @@ def cli(context = None, verbose = False, input_path = None):
 
 
 @cli.result_callback()
-def process_pipeline(processors, verbose, input_path):
+def process_pipeline(processors, verbose, stream, prefetch, memmap, profile, profile_memory, recursive, include, exclude, input_path):
     """Commands pipeline"""
 
     # Config
@@ -56,22 +68,71 @@ def process_pipeline(processors, verbose, input_path):
     if verbose:
         config.set("general", "verbose", "True")
 
+    if memmap:
+        config.set("general", "memmap", "True")
+
     # Parse project path
     config.project_path = input_path
 
-    # Start a project
+    # Trace from the discovery of the images on
+    if profile:
+        instrument.enable(trace_memory=profile_memory)
+
+    # The watch command runs all other commands on new images
+    watch = next((processor.watch for processor in processors if hasattr(processor, "watch")), None)
+
+    # Start a project, streamed images are processed while the folder is scanned
     project = Project(path=config.project_path, config=config)
-    if not project.add_images():
+    streaming = stream and watch is None
+
+    if streaming:
+        print(f"- Input Path: {project.Path}")
+        if not os.path.isdir(project.Path):
+            logging.warning("File path not found.")
+            return
+    elif not project.add_images(recursive=recursive, include=include, exclude=exclude) and watch is None:
         return
 
-    # Go through commands
-    for i, processor in enumerate(processors):
-        logging.info(f"Running command {i + 1} of {len(processors)}")
-        project = processor(project)
+    if watch is not None:
+        processors = [processor for processor in processors if not hasattr(processor, "watch")]
+        project = watch(project, processors, prefetch)
+    elif streaming:
+        # Stream images through the commands, as they are found
+        logging.info(f"Streaming images through {len(processors)} commands")
+        images = project.discover_images(recursive=recursive, include=include, exclude=exclude)
+        project = run_streaming(project, processors, prefetch, images)
+
+        if not project.Images:
+            logging.warning("No files were found on path.")
+    else:
+        # Go through commands
+        for i, processor in enumerate(processors):
+            logging.info(f"Running command {i + 1} of {len(processors)}")
+            project = processor(project)
+
+    if profile:
+        write_profile(profile)
 
     logging.info("Process exited.")
 
 
+def write_profile(path: str):
+    """Log a summary of the recorded stages and write the Chrome trace"""
+
+    for stage, totals in instrument.get_tracer().summary().items():
+        line = f"{stage:<16} n={totals['count']:<4d} wall={totals['wall_s']:8.3f} s  cpu={totals['cpu_s']:8.3f} s"
+        if instrument.traces_memory():
+            line += f"  alloc={totals['alloc_bytes'] / 2**20:8.1f} MB"
+        logging.info(line)
+
+    try:
+        instrument.write_chrome_trace(path)
+    except OSError as err:
+        logging.warning(err)
+    else:
+        logging.info(f"Trace written to {path}")
+
+
 @cli.command('rename')
 @click.pass_context
 @click.argument('overview_file')
@@ -98,7 +159,9 @@ def auto_rename(ctx, overview_file=""):
 
 @cli.command('crop')
 @click.pass_context
-def annotate(ctx):
+@click.option('--renderer', type=click.Choice(['matplotlib', 'raster']), default='matplotlib')
+@click.option('--workers', type=int, default=1, help='Number of worker processes (raster renderer)')
+def annotate(ctx, renderer, workers):
     """annotate"""
     def processor(project: Project):
         """Crop and annotate all images"""
@@ -106,8 +169,46 @@ def annotate(ctx):
         num_images = len(project.Images)
         logging.info(f"Running annotate script on {num_images} images.")
 
-        for i, image in enumerate(project.Images):
-            image.annotate()
+        project.config.set("annotate", "renderer", renderer)
+        project.annotate_images(workers=workers)
+
+        return project
+
+    def stage(project: Project, image):
+        """Crop and annotate a single image"""
+        image.annotate(
+            add_scalebar=project.config.getboolean("annotate", "add_scalebar"),
+            add_sample_name=project.config.getboolean("annotate", "add_samplename"),
+            renderer=renderer,
+        )
+
+    def setup(project: Project):
+        project.config.set("annotate", "renderer", renderer)
+        return True
+
+    processor.stage = Stage(run=stage, setup=setup)
+    return processor
+
+
+@cli.command('info')
+@click.pass_context
+def metadata(ctx):
+    """metadata"""
+    def processor(project: Project):
+        """Scan metadata of all images and export as table"""
+
+        logging.info("Running script: metadata")
+
+        table = project.scan_metadata()
+        print(table.to_string())
+
+        output_path = os.path.join(project.Path, "metadata.csv")
+        try:
+            table.to_csv(output_path)
+        except OSError as err:
+            logging.warning(err)
+        else:
+            logging.info(f"Metadata written to {output_path}")
 
         return project
     return processor
@@ -116,24 +217,141 @@ def annotate(ctx):
 @cli.command('diam')
 @click.pass_context
 @click.option('--thick-opt/--no-thick-opt', default=False)
-def diameter_analysis(ctx, thick_opt):
+@click.option('--engine', type=click.Choice(['matlab', 'matlab-pool', 'python']), default='matlab')
+@click.option('--workers', type=int, default=1, help='Number of worker processes')
+@click.option('--max-edge-distance', type=float, default=55, help='Max. distance (px) between skeleton and edge')
+@click.option('--cache/--no-cache', default=True, help='Reuse cached results of unchanged images')
+@click.option('--batch-size', type=int, default=1, help='Images per engine call, loaded from file by the engine')
+@click.option('--export-diameters', type=click.Choice(['none', 'parquet', 'arrow']), default='none', help='Write every fibre diameter to a dataset, per image as it is analysed')
+@click.option('--journal', is_flag=True, default=False, help='Journal every result in the project folder, so that an interrupted run can be resumed')
+@click.option('--resume', is_flag=True, default=False, help='Skip images analysed by a previous, interrupted run (implies --journal)')
+@click.option('--tile-size', type=int, default=0, help='Analyse large images in tiles of this size (px), python engine only')
+def diameter_analysis(ctx, thick_opt, engine, workers, max_edge_distance, cache, batch_size, export_diameters, journal, resume, tile_size):
     """diameter_analysis"""
-    def processor(project: Project):
-        """Run diameter analysis on all pictures"""
-
-        logging.info("Running script: diameter_analysis")
+    def configure(project: Project):
+        """Set analysis options in the project config"""
 
         if thick_opt:
             project.config.set("general", "optimise_for_thin_fibres", "False")
         else:
             project.config.set("general", "optimise_for_thin_fibres", "True")
 
-        project.run_diameter_analysis()
+        project.config.set("analysis", "engine", f"simpoly-{engine}")
+        project.config.set("general", "max_edge_distance", str(max_edge_distance))
+        project.config.set("cache", "enabled", str(cache))
+        project.config.set("analysis", "batch_size", str(batch_size))
+        project.config.set("analysis", "tile_size", str(tile_size))
+        project.config.set("export", "diameters", "" if export_diameters == "none" else export_diameters)
+        if journal:
+            project.config.set("analysis", "journal", "True")
+
+    def export(project: Project):
         project.print_analysis_summary()
         project.export_analysis()
         project.export_mat()
 
+    def processor(project: Project):
+        """Run diameter analysis on all pictures"""
+
+        logging.info("Running script: diameter_analysis")
+
+        configure(project)
+
+        project.run_diameter_analysis(workers=workers, resume=resume)
+        export(project)
+
         return project
+
+    # Images restored from the run journal (relative paths), see setup
+    restored = set()
+
+    def setup(project: Project):
+        configure(project)
+        if workers > 1:
+            logging.info("Streaming diameter analysis runs in a single process, --workers is ignored.")
+        if not project.prepare_diameter_analysis():
+            return False
+        pending = {image.relative_path for image in project.open_journal(resume)}
+        restored.update(image.relative_path for image in project.Images if image.relative_path not in pending)
+        return True
+
+    def stage(project: Project, image):
+        """Analyse a single image, already decoded in memory"""
+        if image.relative_path in restored:
+            return
+        # Images discovered after the setup are restored one by one
+        if resume and project.journal is not None and project.restore_result(image):
+            return
+        image.run_diameter_analysis(
+            engine_handler=project.engine_handler,
+            load_externally=False,
+            config=project.config,
+            cache=project.result_cache,
+        )
+
+    def finish(project: Project):
+        export(project)
+        project.close_journal()
+        project.close_engine()
+
+    processor.stage = Stage(run=stage, setup=setup, finish=finish, update=export)
+    return processor
+
+
+@cli.command('watch')
+@click.pass_context
+@click.option('--backend', type=click.Choice(['auto', 'inotify', 'poll']), default='auto', help='Watch with inotify (Linux) or poll the folder')
+@click.option('--interval', type=float, default=DEFAULT_INTERVAL, help='Seconds between polls of the folder')
+@click.option('--settle', type=float, default=DEFAULT_SETTLE, help='Seconds a new file must be unchanged before it is processed')
+@click.option('--skip-existing', is_flag=True, default=False, help='Only process images that appear after the start')
+@click.option('--idle-timeout', type=float, default=None, help='Stop after this many seconds without new images')
+@click.option('--export-interval', type=float, default=DEFAULT_EXPORT_INTERVAL, help='Minimum seconds between updates of the summary exports')
+def watch_folder(ctx, backend, interval, settle, skip_existing, idle_timeout, export_interval):
+    """Run the other commands on new images in the project folder"""
+    def watch(project: Project, processors: list, prefetch: int):
+        """Process the images in the project folder as they are written"""
+
+        logging.info("Running script: watch")
+
+        # Watch the images selected by the options of the command group
+        options = ctx.find_root().params
+
+        try:
+            watcher = FolderWatcher(
+                project.Path,
+                known=project.FileList,
+                backend=backend,
+                interval=interval,
+                settle=settle,
+                recursive=options["recursive"],
+                include=options["include"],
+                exclude=options["exclude"],
+            )
+        except OSError as err:
+            logging.error("Could not watch project folder")
+            print(err)
+            return project
+
+        try:
+            with watcher:
+                project = run_watching(
+                    project,
+                    processors,
+                    watcher,
+                    prefetch=prefetch,
+                    process_existing=not skip_existing,
+                    idle_timeout=idle_timeout,
+                    export_interval=export_interval,
+                )
+        except KeyboardInterrupt:
+            logging.info("Stopped watching.")
+
+        return project
+
+    def processor(project: Project):
+        return project
+
+    processor.watch = watch
     return processor
 
 
@@ -1,14 +1,22 @@
 from abc import ABC, abstractmethod
 import os
 import logging
+import tempfile
 import numpy as np
 
 from fibresem.analysis.fibreanalysis import Analysis, Result
+from fibresem.io import readtif
+from fibresem.helper import instrument
 
 
 class EngineHandler(ABC):
     """EngineHandler (Base) Class that provides the functionality to run analysis"""
 
+    name = ""
+
+    # Engines running the same algorithm share cached results, default: name
+    cache_name = ""
+
     def __init__(self):
         self.engine = None
         self.module = None
@@ -29,10 +37,40 @@ class EngineHandler(ABC):
     def run(self, analysis: Analysis, load_externally = False) -> Result:
         """Run analysis"""
 
+    def run_batch(self, analyses: list) -> list:
+        """Run analyses of several images, loaded from file by the engine
+
+        Runs the analyses one by one. Engines with a large overhead per
+        call run the whole batch in a single call.
+
+        Returns
+        -------
+        list
+            Result of every analysis, None if the analysis failed
+        """
+
+        results = []
+        for analysis in analyses:
+            try:
+                results.append(self.run(analysis, load_externally=True))
+            except Exception as err:
+                logging.error(f"Diameter analysis failed for {analysis.file_name}")
+                print(err)
+                results.append(None)
+
+        return results
+
+    def close(self):
+        """Stop or release the engine"""
+        self.engine = None
+
 
 class MatlabEngine(EngineHandler):
     """MATLAB Engine Handler"""
 
+    name = "simpoly-matlab"
+    cache_name = "simpoly-matlab"
+
     def __init__(self):
         super().__init__()
 
@@ -55,9 +93,56 @@ Remove --user flag for installation within environment"""
         # Keep module loaded
         self.module = matlab
 
+        # MATLAB R2022a and newer construct arrays from the buffer protocol
+        self.supports_buffer = self._probe_buffer_support()
+
+        # ... and expose the buffer of MATLAB arrays
+        self.supports_result_buffer = self._probe_result_buffer_support()
+
         # Start matlab engine
         self.start()
 
+    def _probe_buffer_support(self) -> bool:
+        """Check whether matlab.uint8 accepts an ndarray directly"""
+        try:
+            probe = self.module.uint8(np.zeros((2, 3), dtype=np.uint8))
+        except (TypeError, ValueError):
+            return False
+
+        return tuple(probe.size) == (2, 3)
+
+    def _probe_result_buffer_support(self) -> bool:
+        """Check whether MATLAB arrays support the buffer protocol"""
+        try:
+            memoryview(self.module.double([1.0, 2.0]))
+        except TypeError:
+            return False
+
+        return True
+
+    def result_transfer(self, analysis: Analysis) -> str:
+        """How diameters are returned: "buffer" (array) or "rawfile" (result file)"""
+
+        transfer = analysis.params["transfer"]
+        if transfer == "auto":
+            transfer = "buffer" if self.supports_result_buffer else "rawfile"
+
+        return transfer
+
+    @staticmethod
+    def make_resultfile() -> str:
+        """Create a temporary file for simpoly.m to write the diameters to"""
+
+        handle, path = tempfile.mkstemp(suffix=".raw", prefix="fibresem_result_")
+        os.close(handle)
+
+        return path
+
+    @staticmethod
+    def read_resultfile(path: str) -> np.ndarray:
+        """Read diameters written by writeRaw.m"""
+        return np.fromfile(path, dtype=np.float64)
+
     def start(self) -> bool:
         # Start Matlab Engine
         logging.info("Starting Matlab Engine ...")
@@ -87,14 +172,34 @@ Remove --user flag for installation within environment"""
         # The matlab engine
         eng = self.engine
 
+        rawfile = ""
+        rawsize = matlab.double([0, 0])
+
+        resultfile = ""
+        if self.result_transfer(analysis) == "rawfile":
+            resultfile = self.make_resultfile()
+
         if load_externally:
             # Let MATLAB import the file
             imgdata_matlab_array = matlab.uint8([])
         else:
-            # Convert ndarray to MATLAB uint8 array
-            # Can be slow
-            logging.debug("Converting Data ...")
-            imgdata_matlab_array = matlab.uint8(analysis.parent.Data.tolist())
+            with instrument.span("engine_transfer"):
+                data = np.ascontiguousarray(analysis.parent.Data, dtype=np.uint8)
+                transfer = analysis.params["transfer"]
+
+                if transfer == "auto":
+                    transfer = "buffer" if self.supports_buffer else "rawfile"
+
+                if transfer == "buffer":
+                    # Pass the ndarray buffer directly
+                    logging.debug("Passing data buffer ...")
+                    imgdata_matlab_array = matlab.uint8(data)
+                else:
+                    # Let MATLAB memory-map a raw copy of the data
+                    logging.debug("Writing raw data ...")
+                    imgdata_matlab_array = matlab.uint8([])
+                    rawfile = self.write_rawfile(data)
+                    rawsize = matlab.double(list(data.shape))
 
         # Handle no pixel size
         if analysis.pixel_size_unit is None:
@@ -105,28 +210,187 @@ Remove --user flag for installation within environment"""
             pixel_size_unit = analysis.pixel_size_unit
 
         # fmt: off
-        matlab_result = eng.simpoly(
-            imgdata_matlab_array,
-            "pixelsize", pixel_size_value,
-            "pixelsizeunit", pixel_size_unit,
-            "optimiseForThinFibres", analysis.params["optimise_for_thin_fibres"],
-            "filename", analysis.file_name.replace(".tif",".png"),
-            "outputpath", analysis.output_path,
-            "load_externally", load_externally,
-            "filepath", analysis.image_path,
-            "verbose", analysis.params["verbose"],
-            nargout=1,
-        )
-        # fmt: on
+        try:
+            with instrument.span("engine_compute"):
+                matlab_result = eng.simpoly(
+                    imgdata_matlab_array,
+                    "pixelsize", pixel_size_value,
+                    "pixelsizeunit", pixel_size_unit,
+                    "optimiseForThinFibres", analysis.params["optimise_for_thin_fibres"],
+                    "maxEdgeDistance", analysis.params["max_edge_distance"],
+                    "filename", os.path.splitext(analysis.file_name)[0] + ".png",
+                    "outputpath", analysis.output_path,
+                    "load_externally", load_externally,
+                    "filepath", analysis.image_path,
+                    "verbose", analysis.params["verbose"],
+                    "rawfile", rawfile,
+                    "rawsize", rawsize,
+                    "resultfile", resultfile,
+                    nargout=1,
+                )
 
-        result = Result()
-        self.parse_matlab_result(result, matlab_result)
+            result = Result()
+            with instrument.span("result_parse"):
+                diameters = None
+                if resultfile:
+                    diameters = self.read_resultfile(resultfile)
+
+                self.parse_matlab_result(result, matlab_result, diameters)
+        finally:
+            for file in (rawfile, resultfile):
+                if file:
+                    os.remove(file)
+        # fmt: on
 
         return result
-        
 
-    def parse_matlab_result(self, result: Result, matlab_result):
-        """Parse and add the resulting struct returned by MATLAB"""
+    def run_batch(self, analyses: list) -> list:
+        """Run analyses of several image files in a single call to simpoly_batch.m
+
+        The analyses share the parameters of the first analysis. MATLAB
+        analyses the images in a parfor loop, if the Parallel Computing
+        Toolbox is available.
+        """
+
+        if not analyses:
+            return []
+
+        matlab = self.module
+        params = analyses[0].params
+
+        pixel_size_values = []
+        pixel_size_units = []
+        for analysis in analyses:
+            # Handle no pixel size
+            if analysis.pixel_size_unit is None:
+                pixel_size_values.append(1.0)
+                pixel_size_units.append("px")
+            else:
+                pixel_size_values.append(float(analysis.pixel_size_value))
+                pixel_size_units.append(analysis.pixel_size_unit)
+
+        resultfile = ""
+        if self.result_transfer(analyses[0]) == "rawfile":
+            resultfile = self.make_resultfile()
+
+        # fmt: off
+        try:
+            with instrument.span("engine_compute"):
+                matlab_result = self.engine.simpoly_batch(
+                    [analysis.image_path for analysis in analyses],
+                    "pixelsize", matlab.double(pixel_size_values),
+                    "pixelsizeunit", pixel_size_units,
+                    "filenames", [os.path.splitext(analysis.file_name)[0] + ".png" for analysis in analyses],
+                    "optimiseForThinFibres", params["optimise_for_thin_fibres"],
+                    "maxEdgeDistance", params["max_edge_distance"],
+                    "outputpath", analyses[0].output_path,
+                    "verbose", params["verbose"],
+                    "useParallel", params["parallel"],
+                    "resultfile", resultfile,
+                    nargout=1,
+                )
+
+            with instrument.span("result_parse"):
+                diameters = None
+                if resultfile:
+                    diameters = self.read_resultfile(resultfile)
+
+                return self.parse_matlab_batch_result(analyses, matlab_result, diameters)
+        except Exception as err:
+            logging.error("Batch diameter analysis failed")
+            print(err)
+            return [None] * len(analyses)
+        finally:
+            if resultfile:
+                os.remove(resultfile)
+        # fmt: on
+
+    def parse_matlab_batch_result(self, analyses: list, matlab_result, diameters=None) -> list:
+        """Split the concatenated results returned by simpoly_batch.m
+
+        Parameters
+        ----------
+        diameters : numpy.ndarray
+            Concatenated diameters, if read from a result file instead
+        """
+
+        if diameters is None:
+            diameters = self.to_ndarray(matlab_result["diameters"])
+
+        pixel_averages = self.to_ndarray(matlab_result["avgp"])
+        pixel_sdevs = self.to_ndarray(matlab_result["sdevp"])
+        counts = self.to_ndarray(matlab_result["counts"]).astype(np.int64)
+        diameters = np.split(diameters, np.cumsum(counts)[:-1])
+
+        # A string array with a single element is returned as str
+        errors = matlab_result["errors"]
+        if isinstance(errors, str):
+            errors = [errors]
+
+        results = []
+        for i, analysis in enumerate(analyses):
+            if errors[i]:
+                logging.error(f"Diameter analysis failed for {analysis.file_name}")
+                print(errors[i])
+                results.append(None)
+                continue
+
+            result = Result()
+            result.pixel_average = float(pixel_averages[i])
+            result.pixel_sdev = float(pixel_sdevs[i])
+            result.pixel_diameters = diameters[i]
+            results.append(result)
+
+        return results
+
+    @staticmethod
+    def to_ndarray(matlab_array) -> np.ndarray:
+        """View a MATLAB array, or a scalar returned as float, as a 1D ndarray
+
+        The data is not copied if the MATLAB array supports the buffer
+        protocol (R2022a and newer), or exposes its column-major data as
+        an array.array (older releases).
+        """
+
+        if isinstance(matlab_array, (int, float)):
+            return np.array([matlab_array], dtype=np.float64)
+
+        try:
+            # MATLAB arrays are column-major
+            return np.asarray(memoryview(matlab_array)).ravel(order="F")
+        except TypeError:
+            pass
+
+        data = getattr(matlab_array, "_data", None)
+        if data is not None:
+            return np.asarray(data)
+
+        return np.asarray(matlab_array, dtype=np.float64).ravel()
+
+    @staticmethod
+    def write_rawfile(data: np.ndarray) -> str:
+        """Write uint8 data row-major to a temporary raw file for simpoly.m
+
+        Returns
+        -------
+        str
+            Path to the raw file, to be removed by the caller
+        """
+
+        handle, path = tempfile.mkstemp(suffix=".raw", prefix="fibresem_")
+        with os.fdopen(handle, "wb") as fh:
+            data.tofile(fh)
+
+        return path
+
+    def parse_matlab_result(self, result: Result, matlab_result, diameters=None):
+        """Parse and add the resulting struct returned by MATLAB
+
+        Parameters
+        ----------
+        diameters : numpy.ndarray
+            Diameters, if read from a result file instead
+        """
 
         # Parse pixel average
         result.pixel_average = matlab_result["avgp"]
@@ -135,4 +399,181 @@ Remove --user flag for installation within environment"""
         result.pixel_sdev = matlab_result["sdevp"]
 
         # Parse list of all pixel diameters
-        result.pixel_diameters = np.asarray(matlab_result["diameters"]._data.tolist())
\ No newline at end of file
+        if diameters is None:
+            diameters = self.to_ndarray(matlab_result["diameters"])
+
+        result.pixel_diameters = diameters
+
+
+class PooledMatlabEngine(MatlabEngine):
+    """MATLAB Engine Handler that borrows a warm engine from the engine pool
+
+    Falls back to starting its own engine, if no pool is running or the pool
+    has no free engine within enginepool.ACQUIRE_TIMEOUT. See enginepool.py
+    """
+
+    name = "simpoly-matlab-pool"
+
+    def __init__(self):
+        self.lease = None
+        super().__init__()
+
+    def start(self) -> bool:
+        from fibresem.analysis import enginepool  #pylint: disable=import-outside-toplevel
+
+        try:
+            self.lease = enginepool.EngineLease()
+        except (OSError, AttributeError, RuntimeError) as err:
+            logging.warning(f"Engine pool not reachable ({err})")
+            return super().start()
+
+        logging.info(f"Connecting to Matlab Engine {self.lease.name} ...")
+
+        try:
+            eng = self.module.engine.connect_matlab(self.lease.name)
+        except Exception as err:
+            logging.error("Could not connect to MATLAB Engine")
+            print(err)
+            self.close()
+            return False
+
+        # Set Engine, path and warnings have been set by the pool
+        self.engine = eng
+
+        return True
+
+    def close(self):
+        if self.lease is not None:
+            self.lease.release()
+            self.lease = None
+
+        self.engine = None
+
+
+class PythonEngine(EngineHandler):
+    """Native Python Engine Handler
+
+    Runs the SIMPoly method ported to NumPy/SciPy, see simpoly.py
+    """
+
+    name = "simpoly-python"
+
+    def __init__(self):
+        super().__init__()
+
+        # Keep module loaded
+        from fibresem.analysis import simpoly  #pylint: disable=import-outside-toplevel
+
+        self.module = simpoly
+
+        # Start engine
+        self.start()
+
+    def start(self) -> bool:
+        # Nothing runs in the background, the module acts as engine
+        self.engine = self.module
+
+        return True
+
+    def run(self, analysis: Analysis, load_externally = False) -> Result:
+
+        simpoly = self.module
+
+        if analysis.params.get("tile_size", 0) > 0:
+            return self.run_tiled(analysis, load_externally)
+
+        if load_externally:
+            # Map the file and remove the SEM bar, like simpoly.m does.
+            # The image is only read, so a read-only mapping will do.
+            with instrument.span("load"):
+                image, _ = readtif.importtif(analysis.image_path, memmap=True)
+            image = simpoly.sem_crop(image)
+        else:
+            image = analysis.parent.Data
+
+        with instrument.span("engine_compute"):
+            simpoly_result = simpoly.simpoly(
+                image,
+                optimise_for_thin_fibres=analysis.params["optimise_for_thin_fibres"],
+                max_edge_distance=analysis.params["max_edge_distance"],
+                verbose=analysis.params["verbose"],
+                output_path=analysis.output_path,
+                filename=os.path.splitext(analysis.file_name)[0] + ".png",
+            )
+
+        result = Result()
+        with instrument.span("result_parse"):
+            result.pixel_average = simpoly_result["avgp"]
+            result.pixel_sdev = simpoly_result["sdevp"]
+            result.pixel_diameters = simpoly_result["diameters"]
+
+        return result
+
+    def run_tiled(self, analysis: Analysis, load_externally = False) -> Result:
+        """Analyse the image tile by tile, see simpoly.simpoly_tiled
+
+        If loaded externally, only the tiles are read from file, the image
+        is never loaded as a whole. No overlay is saved.
+        """
+
+        simpoly = self.module
+
+        kwargs = {
+            "tile_size": analysis.params["tile_size"],
+            "halo": analysis.params["tile_halo"],
+            "optimise_for_thin_fibres": analysis.params["optimise_for_thin_fibres"],
+            "max_edge_distance": analysis.params["max_edge_distance"],
+            "verbose": analysis.params["verbose"],
+        }
+
+        if load_externally:
+            with readtif.RegionReader(analysis.image_path) as reader:
+                # Remove the SEM bar, like simpoly.m does
+                shape = (round(reader.shape[0] * (1 - simpoly.SEM_BAR_HEIGHT)), reader.shape[1])
+
+                with instrument.span("engine_compute"):
+                    simpoly_result = simpoly.simpoly_tiled(reader.read, shape, **kwargs)
+        else:
+            image = analysis.parent.Data
+            if image.ndim == 3:
+                image = image[:, :, 0]
+
+            def read(y0, y1, x0, x1):
+                return image[y0:y1, x0:x1]
+
+            with instrument.span("engine_compute"):
+                simpoly_result = simpoly.simpoly_tiled(read, image.shape, **kwargs)
+
+        result = Result()
+        with instrument.span("result_parse"):
+            result.pixel_average = simpoly_result["avgp"]
+            result.pixel_sdev = simpoly_result["sdevp"]
+            result.pixel_diameters = simpoly_result["diameters"]
+
+        return result
+
+
+# Available engines, by name
+ENGINES = {
+    MatlabEngine.name: MatlabEngine,
+    PooledMatlabEngine.name: PooledMatlabEngine,
+    PythonEngine.name: PythonEngine,
+}
+
+
+def create_engine(name: str) -> EngineHandler:
+    """Create engine handler by name, e.g. "simpoly-matlab" or "simpoly-python"
+
+    Returns
+    -------
+    EngineHandler
+        Engine handler, or None if the engine is unknown
+    """
+
+    try:
+        engine_class = ENGINES[name]
+    except KeyError:
+        logging.error(f"Unknown analysis engine: {name}")
+        return None
+
+    return engine_class()
@@ -0,0 +1,222 @@
+"""Result cache
+
+On-disk cache of diameter analysis results, keyed on the content of the
+image file, the engine and the analysis parameters. The cache is bounded
+in size; the least recently used results are evicted first.
+"""
+
+import os
+import hashlib
+import json
+import logging
+import zipfile
+import numpy as np
+
+from fibresem.analysis.fibreanalysis import Result
+
+# Analysis parameters that do not change the result
+IGNORED_PARAMS = ("verbose", "transfer", "parallel")
+
+CACHE_FILE_EXTENSION = ".npz"
+
+
+def default_cache_path() -> str:
+    """Return the user cache directory for fibresem"""
+
+    if os.name == "nt":
+        root = os.environ.get("LOCALAPPDATA", os.path.expanduser("~"))
+    else:
+        root = os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache"))
+
+    return os.path.join(root, "fibresem", "results")
+
+
+def file_hash(path: str, chunk_size=1 << 20) -> str:
+    """SHA-256 hash of the file content"""
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(chunk_size), b""):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """Size-bounded LRU cache of analysis results
+
+    Attributes
+    ----------
+    path : str
+        Cache directory
+    max_size : int
+        Maximum total size of the cache in bytes
+    """
+
+    def __init__(self, path=None, max_size=1 << 30):
+        if not path:
+            path = default_cache_path()
+
+        self.path = path
+        self.max_size = max_size
+
+        # Content hashes by (path, size, mtime), to hash every file once
+        self._hashes = {}
+
+        # Running total size of the cache files, None until the first scan.
+        # Other processes may write to the same directory, the total is
+        # corrected on every eviction.
+        self._size = None
+
+        os.makedirs(self.path, exist_ok=True)
+
+    @classmethod
+    def from_config(cls, config):
+        """Create cache from the [cache] config section, None if disabled"""
+
+        if not config.getboolean("cache", "enabled"):
+            return None
+
+        try:
+            return cls(
+                path=config.get("cache", "path"),
+                max_size=int(config.getfloat("cache", "max_size_mb") * 2**20),
+            )
+        except OSError as err:
+            logging.warning(f"Could not create result cache: {err}")
+            return None
+
+    def key(self, image_path: str, engine_name: str, params: dict) -> str:
+        """Cache key of an analysis
+
+        Parameters
+        ----------
+        engine_name : str
+            Algorithm of the engine, see EngineHandler.cache_name
+        """
+
+        stat = os.stat(image_path)
+        file_id = (os.path.abspath(image_path), stat.st_size, stat.st_mtime_ns)
+
+        if file_id not in self._hashes:
+            self._hashes[file_id] = file_hash(image_path)
+
+        relevant = {k: v for k, v in params.items() if k not in IGNORED_PARAMS}
+        description = json.dumps(
+            [self._hashes[file_id], engine_name, relevant], sort_keys=True
+        )
+
+        return hashlib.sha256(description.encode("utf-8")).hexdigest()
+
+    def _file(self, key: str) -> str:
+        return os.path.join(self.path, key + CACHE_FILE_EXTENSION)
+
+    def load(self, key: str) -> Result:
+        """Load cached result, returns None if not cached"""
+
+        file = self._file(key)
+
+        try:
+            with np.load(file) as data:
+                result = Result()
+                result.pixel_average = float(data["pixel_average"])
+                result.pixel_sdev = float(data["pixel_sdev"])
+                result.pixel_diameters = data["pixel_diameters"]
+        except OSError:
+            return None
+        except (zipfile.BadZipFile, EOFError, KeyError, ValueError) as err:
+            # Truncated or corrupt entry, e.g. from an interrupted write
+            logging.warning(f"Removing invalid cache entry {os.path.basename(file)}: {err}")
+            self._remove(file)
+            return None
+
+        # Mark as recently used
+        try:
+            os.utime(file)
+        except OSError:
+            pass
+
+        return result
+
+    def store(self, key: str, result: Result):
+        """Store result and evict least recently used results"""
+
+        file = self._file(key)
+        temp_file = file + ".tmp"
+
+        if self._size is None:
+            self._size = sum(size for _, size, _ in self._entries())
+
+        try:
+            replaced = os.path.getsize(file)
+        except OSError:
+            replaced = 0
+
+        try:
+            with open(temp_file, "wb") as fh:
+                np.savez(
+                    fh,
+                    pixel_average=result.pixel_average,
+                    pixel_sdev=result.pixel_sdev,
+                    pixel_diameters=np.asarray(result.pixel_diameters),
+                )
+            os.replace(temp_file, file)
+            self._size += os.path.getsize(file) - replaced
+        except OSError as err:
+            logging.warning(f"Could not cache result: {err}")
+            return
+
+        if self._size > self.max_size:
+            self.evict()
+
+    def _entries(self) -> list:
+        """(mtime, size, path) of all cache files"""
+
+        entries = []
+
+        with os.scandir(self.path) as it:
+            for entry in it:
+                if not entry.name.endswith(CACHE_FILE_EXTENSION):
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+
+        return entries
+
+    def _remove(self, file: str):
+        """Remove a cache file and update the running total"""
+
+        try:
+            size = os.path.getsize(file)
+            os.remove(file)
+        except OSError:
+            return
+
+        if self._size is not None:
+            self._size -= size
+
+    def evict(self):
+        """Remove least recently used results, until the cache fits max_size"""
+
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+
+        for _, size, path in entries:
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+
+        self._size = total
+
+    def clear(self):
+        """Remove all cached results"""
+        max_size, self.max_size = self.max_size, -1
+        self.evict()
+        self.max_size = max_size
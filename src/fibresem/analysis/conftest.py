@@ -0,0 +1,27 @@
+#!/usr/bin/env python
+""" """
+
+# Standard library modules.
+
+# Third party modules.
+import numpy as np
+import pytest
+
+# Local modules.
+from fibresem.analysis.fibreanalysis import Result
+
+# Globals and constants variables.
+
+
+@pytest.fixture
+def make_result():
+    """Factory of analysis results with the given pixel diameters"""
+
+    def make(diameters=np.linspace(1, 20, 1000), average=8.5, sdev=1.5):
+        result = Result()
+        result.pixel_average = average
+        result.pixel_sdev = sdev
+        result.pixel_diameters = np.asarray(diameters, dtype=np.float64)
+        return result
+
+    return make
@@ -0,0 +1,230 @@
+"""Contrast enhancement
+
+Equivalents of adapthisteq (CLAHE) and histeq in MATLAB, the first stage
+of simpoly.m. All tile histograms are counted with a single bincount over
+the combined tile and bin index of every pixel and clipped together, the
+tile mappings are interpolated with flat lookups into one table.
+"""
+
+import numpy as np
+
+# Rows interpolated at once, keeps the temporary arrays small
+ROW_BLOCK = 32
+
+
+def tile_histograms(bins, tile_shape, num_tiles, num_bins=256) -> np.ndarray:
+    """Histograms of all tiles
+
+    Parameters
+    ----------
+    bins : numpy.ndarray
+        Bin index of every pixel, the image splits into equal tiles
+    tile_shape : tuple
+        (height, width) of a tile
+    num_tiles : tuple
+        Number of tiles (rows, columns)
+
+    Returns
+    -------
+    numpy.ndarray
+        Counts of shape (tiles_y, tiles_x, num_bins)
+    """
+
+    height, width = bins.shape
+    tiles_y, tiles_x = num_tiles
+
+    row = (np.arange(height) // tile_shape[0]) * (tiles_x * num_bins)
+    col = (np.arange(width) // tile_shape[1]) * num_bins
+
+    index = row[:, np.newaxis] + col[np.newaxis, :] + bins
+    counts = np.bincount(index.ravel(), minlength=tiles_y * tiles_x * num_bins)
+
+    return counts.reshape(tiles_y, tiles_x, num_bins)
+
+
+def adapthisteq(image, num_tiles=(8, 8), clip_limit=0.01, num_bins=256):
+    """Contrast-limited adaptive histogram equalization (CLAHE)
+
+    Follows the defaults of MATLAB's adapthisteq with a uniform distribution.
+    """
+
+    height, width = image.shape
+    tiles_y, tiles_x = num_tiles
+
+    # Pad the image symmetrically, so it splits into equal tiles
+    tile_h = -(-height // tiles_y)
+    tile_w = -(-width // tiles_x)
+    pad_y = tile_h * tiles_y - height
+    pad_x = tile_w * tiles_x - width
+    padded = np.pad(
+        image,
+        ((pad_y // 2, pad_y - pad_y // 2), (pad_x // 2, pad_x - pad_x // 2)),
+        mode="symmetric",
+    )
+
+    num_pix = tile_h * tile_w
+    min_clip = -(-num_pix // num_bins)
+    clip = min_clip + round(clip_limit * (num_pix - min_clip))
+
+    # Tile mappings
+    if num_bins == 256:
+        bins = padded.astype(np.intp)
+    else:
+        bins = (padded.astype(np.intp) * num_bins) // 256
+
+    hists = clip_histogram(tile_histograms(bins, (tile_h, tile_w), num_tiles, num_bins), clip)
+    maps = np.minimum(np.cumsum(hists, axis=-1) / num_pix, 1.0)
+
+    # Crop before the interpolation, the padding is not needed anymore
+    rows = slice(pad_y // 2, pad_y // 2 + height)
+    cols = slice(pad_x // 2, pad_x // 2 + width)
+    bins = bins[rows, cols]
+
+    # Bilinear interpolation between the mappings of the neighbouring tiles
+    y0, y1, wy = _tile_weights(padded.shape[0], tile_h, tiles_y)
+    x0, x1, wx = _tile_weights(padded.shape[1], tile_w, tiles_x)
+    y0, y1, wy = y0[rows, np.newaxis], y1[rows, np.newaxis], wy[rows, np.newaxis]
+    x0, x1, wx = x0[cols], x1[cols], wx[cols]
+
+    out = np.empty((height, width), dtype=np.uint8)
+    for r0 in range(0, height, ROW_BLOCK):
+        r1 = min(r0 + ROW_BLOCK, height)
+        out[r0:r1] = _interpolate(
+            maps, bins[r0:r1], (y0[r0:r1], y1[r0:r1], wy[r0:r1]), (x0, x1, wx)
+        )
+
+    return out
+
+
+def _interpolate(maps, bins, y, x):
+    """Bilinear interpolation of the tile mappings at every pixel
+
+    Parameters
+    ----------
+    maps : numpy.ndarray
+        Mappings of shape (tiles_y, tiles_x, num_bins)
+    bins : numpy.ndarray
+        Bin index of every pixel
+    y, x : tuple
+        (lower, upper, weight) tile indices and weights of the rows and columns
+    """
+
+    _, tiles_x, num_bins = maps.shape
+    table = maps.ravel()
+    y0, y1, wy = y
+    x0, x1, wx = x
+
+    # Flat index into maps: tile row, tile column and bin
+    left = x0 * num_bins + bins
+    right = x1 * num_bins + bins
+    index = np.empty_like(left)
+
+    def lookup(row, column):
+        np.add(row * (tiles_x * num_bins), column, out=index)
+        return table.take(index)
+
+    top = lookup(y0, left)
+    top *= 1 - wx
+    top += wx * lookup(y0, right)
+
+    bottom = lookup(y1, left)
+    bottom *= 1 - wx
+    bottom += wx * lookup(y1, right)
+
+    top *= 1 - wy
+    bottom *= wy
+    top += bottom
+    top *= 255
+
+    return np.rint(top, out=top).astype(np.uint8)
+
+
+def clip_histogram(hists, clip):
+    """Clip histograms and redistribute the excess over all bins
+
+    Parameters
+    ----------
+    hists : numpy.ndarray
+        Histograms along the last axis, e.g. of shape (tiles_y, tiles_x, num_bins)
+    clip : int
+        Clip limit (counts)
+    """
+
+    hists = hists.copy()
+    num_bins = hists.shape[-1]
+
+    excess = np.maximum(hists - clip, 0).sum(axis=-1)
+    increment = excess // num_bins
+    upper = (clip - increment)[..., np.newaxis]
+
+    over = hists > clip
+    near = ~over & (hists > upper)
+    rest = ~over & ~near
+
+    excess -= np.where(near, clip - hists, 0).sum(axis=-1) + increment * rest.sum(axis=-1)
+    hists[over | near] = clip
+    hists += np.where(rest, increment[..., np.newaxis], 0)
+
+    # Spread the remaining excess evenly over bins below the clip limit:
+    # every step-th bin below the limit, of all histograms at once
+    while True:
+        below = hists < clip
+        num_below = below.sum(axis=-1)
+        pending = (excess > 0) & (num_below > 0)
+        if not pending.any():
+            break
+
+        step = np.maximum(num_below // np.maximum(excess, 1), 1)[..., np.newaxis]
+        rank = np.cumsum(below, axis=-1) - 1
+        chosen = below & (rank % step == 0) & (rank // step < excess[..., np.newaxis])
+        chosen &= pending[..., np.newaxis]
+
+        hists += chosen
+        excess -= chosen.sum(axis=-1)
+
+    return hists
+
+
+def _tile_weights(size, tile_size, num_tiles):
+    """Neighbouring tile indices and interpolation weight along one axis"""
+
+    position = (np.arange(size) - tile_size / 2 + 0.5) / tile_size
+    lower = np.floor(position).astype(np.intp)
+    weight = position - lower
+
+    upper = np.clip(lower + 1, 0, num_tiles - 1)
+    lower = np.clip(lower, 0, num_tiles - 1)
+    weight[lower == upper] = 0
+
+    return lower, upper, weight
+
+
+def histeq(image, n=64, counts=None):
+    """Histogram equalization to n discrete levels, like MATLAB's histeq
+
+    Parameters
+    ----------
+    image : numpy.ndarray
+        Grayscale uint8 image
+    n : int
+        Number of discrete output levels
+    counts : numpy.ndarray
+        Precomputed 256-bin histogram of the image, default: computed here
+    """
+
+    m = 256
+    if counts is None:
+        counts = np.bincount(image.ravel(), minlength=m)
+    counts = np.asarray(counts, dtype=np.double)
+
+    cum = np.cumsum(counts)
+    cumd = np.cumsum(np.full(n, image.size / n))
+
+    tol = np.concatenate(([0], counts[1:-1], [0])) / 2
+    err = cumd[:, np.newaxis] - cum[np.newaxis, :] + tol[np.newaxis, :]
+    err[err < -image.size * np.sqrt(np.finfo(float).eps)] = image.size
+
+    lut = np.argmin(err, axis=0) / (n - 1)
+    lut = np.round(lut * 255).astype(np.uint8)
+
+    return lut[image]
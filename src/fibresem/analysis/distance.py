@@ -0,0 +1,250 @@
+"""Exact Euclidean distance transform
+
+Separable, linear-time distance transform (Felzenszwalb & Huttenlocher,
+Distance Transforms of Sampled Functions, 2012), equivalent to bwdist(~bw)
+in MATLAB:
+
+1. The distance to the nearest background pixel in the same column, with
+   a forward and a backward cumulative scan over the rows.
+2. Per row, the lower envelope of the parabolas g(q)^2 + (x - q)^2 of all
+   columns q. The distance at x is the envelope at x.
+
+Both passes are vectorised across columns and rows respectively. The
+distances at a sparse set of pixels, e.g. the skeleton, are evaluated
+without building a distance map, see edt_at.
+"""
+
+import numpy as np
+
+# Rows per envelope block, limits the temporary memory
+ROW_BLOCK = 1024
+
+
+def _column_distances(bw) -> np.ndarray:
+    """Distance to the nearest background pixel in the same column
+
+    The rows of the nearest background pixel above and below are found
+    with a forward and a backward cumulative maximum/minimum over the rows.
+    Columns without background get a distance larger than any distance
+    within the image.
+    """
+
+    h, w = bw.shape
+    rows = np.arange(h, dtype=np.int32)[:, np.newaxis]
+    far = np.int32(h + w)
+
+    # Row of the last background pixel at or above every pixel
+    above = np.where(bw, -far, rows)
+    np.maximum.accumulate(above, axis=0, out=above)
+
+    # Row of the first background pixel at or below every pixel
+    below = np.where(bw, h + far, rows)[::-1]
+    np.minimum.accumulate(below, axis=0, out=below)
+
+    g = np.subtract(rows, above, out=above)
+    return np.minimum(g, below[::-1] - rows, out=g)
+
+
+def _envelope(f):
+    """Lower envelopes of the parabolas f(q) + (x - q)^2 of every row
+
+    The top parabola of every row is kept in 1-d arrays, the stacks are
+    only read when parabolas are removed.
+
+    Parameters
+    ----------
+    f : numpy.ndarray
+        Squared column distances of a block of rows
+
+    Returns
+    -------
+    tuple
+        (v, z, k) per row: apex columns v[:k+1] of the parabolas in the
+        envelope, parabola j is lowest for z[j] <= x < z[j+1]
+    """
+
+    n, w = f.shape
+
+    # Column-major: the values of all rows at column q are contiguous
+    ft = np.ascontiguousarray(f.T, dtype=np.double)
+    rows = np.arange(n)
+
+    vt = np.zeros((w, n), dtype=np.int32)
+    zt = np.full((w, n), np.inf)
+    zt[0] = -np.inf
+    v_flat = vt.ravel()
+    z_flat = zt.ravel()
+
+    k = np.zeros(n, dtype=np.intp)
+
+    # Top parabola: apex column, f(v) + v^2 and start of its interval
+    v_top = np.zeros(n)
+    f_top = ft[0].copy()
+    z_top = np.full(n, -np.inf)
+
+    for q in range(1, w):
+        fq = ft[q] + float(q * q)
+        s = (fq - f_top) / (2.0 * (q - v_top))
+
+        # Remove the parabolas hidden by parabola q
+        sub = np.flatnonzero(s <= z_top)
+        while sub.size:
+            k[sub] -= 1
+            index = k[sub] * n + sub
+            vk = v_flat[index]
+            v_top[sub] = vk
+            f_top[sub] = ft[vk, sub] + vk * vk.astype(np.double)
+            z_top[sub] = z_flat[index]
+            s[sub] = (fq[sub] - f_top[sub]) / (2.0 * (q - v_top[sub]))
+            sub = sub[s[sub] <= z_top[sub]]
+
+        k += 1
+        index = k * n + rows
+        v_flat[index] = q
+        z_flat[index] = s
+
+        v_top[:] = q
+        f_top = fq
+        z_top = s
+
+    return vt.T, zt.T, k
+
+
+def _nearest_columns(v, z, k, x=None):
+    """Apex column of the lowest parabola at column x
+
+    Parameters
+    ----------
+    x : tuple
+        (rows, columns) of the query pixels, default: all pixels
+    """
+
+    n, w = v.shape
+
+    # Columns x in [z[j], z[j+1]) of every parabola j, up to the end of the row
+    bounds = np.clip(np.ceil(z), 0, w).astype(np.intp)
+    bounds[np.arange(w) > k[:, None]] = w
+    bounds = np.concatenate([bounds, np.full((n, 1), w, dtype=np.intp)], axis=1)
+
+    if x is None:
+        lengths = np.diff(bounds, axis=1)
+        return np.repeat(v.ravel(), lengths.ravel()).reshape(n, w)
+
+    rows, cols = x
+    offsets = np.arange(n) * (w + 1)
+    positions = np.searchsorted((bounds + offsets[:, None]).ravel(), offsets[rows] + cols, side="right") - 1
+    return v[rows, positions - offsets[rows]]
+
+
+def _distances(d2, shape, dtype):
+    """Distances from squared distances, inf without background"""
+    h, w = shape
+    d = np.sqrt(d2.astype(np.double)).astype(dtype, copy=False)
+    d[d2 > (h - 1) ** 2 + (w - 1) ** 2] = np.inf
+    return d
+
+
+def edt(bw, dtype=np.float64) -> np.ndarray:
+    """Distance of every pixel to the nearest background (False) pixel
+
+    Parameters
+    ----------
+    bw : numpy.ndarray
+        Binary image
+    dtype : numpy.dtype
+        np.float64 or np.float32, halves the memory of the map
+
+    Returns
+    -------
+    numpy.ndarray
+        Distance map, inf if the image has no background
+    """
+
+    bw = np.asarray(bw, dtype=bool)
+    h, w = bw.shape
+    out = np.empty((h, w), dtype=dtype)
+    if bw.size == 0:
+        return out
+
+    g = _column_distances(bw)
+
+    for r0 in range(0, h, ROW_BLOCK):
+        f = np.square(g[r0 : r0 + ROW_BLOCK], dtype=np.int64)
+        q = _nearest_columns(*_envelope(f))
+
+        rows = np.arange(f.shape[0])[:, None]
+        d2 = f[rows, q] + (np.arange(w) - q).astype(np.int64) ** 2
+        out[r0 : r0 + ROW_BLOCK] = _distances(d2, (h, w), dtype)
+
+    return out
+
+
+def edt_at(bw, rows, cols, dtype=np.float64, max_distance=None) -> np.ndarray:
+    """Distance to the nearest background pixel at query pixels only
+
+    Equivalent to edt(bw)[rows, cols], without a distance map. The column
+    pass covers the bounding box of the queries, grown by max_distance.
+    The second pass is evaluated at the query pixels only: the columns q at
+    increasing distance t from the query are searched until t^2 exceeds the
+    smallest g(q)^2 + t^2 found. Besides the column pass, the work per query
+    is proportional to its distance, e.g. the radius of a fibre.
+
+    Parameters
+    ----------
+    bw : numpy.ndarray
+        Binary image
+    rows, cols : numpy.ndarray
+        Coordinates of the query pixels, e.g. np.nonzero(skel)
+    dtype : numpy.dtype
+        np.float64 or np.float32
+    max_distance : float
+        Stop searching at this distance. Distances larger than max_distance
+        are not exact, but are guaranteed to be larger than max_distance.
+
+    Returns
+    -------
+    numpy.ndarray
+        Distances in the order of the query pixels
+    """
+
+    bw = np.asarray(bw, dtype=bool)
+    rows = np.asarray(rows, dtype=np.intp)
+    cols = np.asarray(cols, dtype=np.intp)
+    if rows.size == 0:
+        return np.empty(0, dtype=dtype)
+
+    h, w = bw.shape
+
+    # Background further than max_distance from all queries is not needed
+    if max_distance is None:
+        limit = w
+        r0, r1, c0, c1 = 0, h, 0, w
+    else:
+        limit = min(w, int(np.floor(max_distance)) + 1)
+        r0, r1 = max(rows.min() - limit, 0), min(rows.max() + limit + 1, h)
+        c0, c1 = max(cols.min() - limit, 0), min(cols.max() + limit + 1, w)
+
+    g = _column_distances(bw[r0:r1, c0:c1])
+    rows = rows - r0
+    cols = cols - c0
+
+    best = np.square(g[rows, cols], dtype=np.int64)
+
+    active = np.arange(rows.size)
+    t = 1
+
+    while t < limit:
+        active = active[t * t < best[active]]
+        if active.size == 0:
+            break
+
+        r, c = rows[active], cols[active]
+        for q in (c - t, c + t):
+            inside = (q >= 0) & (q < c1 - c0)
+            candidate = np.square(g[r[inside], q[inside]], dtype=np.int64) + t * t
+            sub = active[inside]
+            best[sub] = np.minimum(best[sub], candidate)
+
+        t += 1
+
+    return _distances(best, (h, w), dtype)
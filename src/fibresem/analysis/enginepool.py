@@ -0,0 +1,307 @@
+"""Engine Pool
+
+Keeps a number of MATLAB engines warm in a long-lived local process, so
+that short CLI runs don't pay the engine startup time. Clients borrow an
+engine over a Unix socket and connect to the shared MATLAB session.
+
+Start the pool with:
+
+    python -m fibresem.analysis.enginepool --size 4
+
+Protocol: newline-delimited JSON over the socket.
+    {"op": "acquire", "timeout": float}
+                        -> {"name": "<shared session name>"}
+                           or {"error": "..."} if no engine is free in time
+    {"op": "status"}    -> {"size": int, "free": int}
+    {"op": "shutdown"}  -> {"ok": true}
+An acquired engine is leased for as long as the connection stays open.
+"""
+
+import os
+import json
+import logging
+import queue
+import socket
+import socketserver
+import tempfile
+import threading
+
+import click
+
+# Environment variable to override the default socket path
+SOCKET_ENV = "FIBRESEM_ENGINE_POOL"
+
+# Prefix of the shared MATLAB session names
+SESSION_PREFIX = "fibresem_pool"
+
+# Seconds to wait for a free engine, before the client falls back to its own
+ACQUIRE_TIMEOUT = 30.0
+
+# Extra seconds the client waits for the reply of the pool
+REPLY_MARGIN = 5.0
+
+LOG_MSGFORMAT = "[%(asctime)s] %(message)s"
+LOG_TIMEFORMAT = "%H:%M:%S"
+
+
+def default_socket_path() -> str:
+    """Return the socket path of the engine pool of the current user"""
+
+    if SOCKET_ENV in os.environ:
+        return os.environ[SOCKET_ENV]
+
+    user = os.getuid() if hasattr(os, "getuid") else os.getlogin()
+    return os.path.join(tempfile.gettempdir(), f"fibresem-enginepool-{user}.sock")
+
+
+class EngineLease:
+    """Connection to the engine pool, holding one borrowed engine
+
+    The engine is returned to the pool when the lease is released or the
+    connection is lost.
+
+    Parameters
+    ----------
+    timeout : float
+        Seconds to wait for a free engine. Raises RuntimeError if the pool
+        has no free engine in time, socket.timeout if the pool does not reply.
+    """
+
+    def __init__(self, socket_path=None, timeout=ACQUIRE_TIMEOUT):
+        if socket_path is None:
+            socket_path = default_socket_path()
+
+        self.name = None
+
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.settimeout(timeout + REPLY_MARGIN)
+
+        try:
+            self._sock.connect(socket_path)
+            self._file = self._sock.makefile("rw", encoding="utf-8")
+            reply = self.request({"op": "acquire", "timeout": timeout})
+        except Exception:
+            self._sock.close()
+            self._sock = None
+            raise
+
+        self.name = reply["name"]
+
+    def request(self, message: dict) -> dict:
+        """Send request and wait for the reply"""
+        self._file.write(json.dumps(message) + "\n")
+        self._file.flush()
+
+        line = self._file.readline()
+        if not line:
+            raise ConnectionError("Engine pool closed the connection")
+
+        reply = json.loads(line)
+        if "error" in reply:
+            raise RuntimeError(reply["error"])
+
+        return reply
+
+    def release(self):
+        """Return the engine to the pool"""
+        if self._sock is None:
+            return
+
+        self._file.close()
+        self._sock.close()
+        self._sock = None
+        self.name = None
+
+
+def send(message: dict, socket_path=None) -> dict:
+    """Send a single request (e.g. status, shutdown) to the engine pool"""
+
+    if socket_path is None:
+        socket_path = default_socket_path()
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        with sock.makefile("rw", encoding="utf-8") as fh:
+            fh.write(json.dumps(message) + "\n")
+            fh.flush()
+            return json.loads(fh.readline())
+
+
+class EnginePool:
+    """Pool of shared MATLAB engines"""
+
+    def __init__(self, size=2):
+        import matlab.engine  # pylint: disable=import-outside-toplevel
+
+        self.module = matlab
+        self.size = size
+        self.free = queue.Queue()
+        self.engines = {}
+
+        for i in range(size):
+            name = f"{SESSION_PREFIX}_{os.getpid()}_{i}"
+            self.engines[name] = self.start_engine(name)
+            self.free.put(name)
+
+    def start_engine(self, name: str):
+        """Start and share a MATLAB engine with the SIMPoly path applied"""
+
+        logging.info(f"Starting Matlab Engine {name} ...")
+
+        eng = self.module.engine.start_matlab()
+
+        current_dir = os.path.dirname(__file__)
+        eng.addpath(os.path.join(current_dir, "matlab"), nargout=0)
+        eng.warning("off", "all", nargout=0)
+        eng.matlab.engine.shareEngine(name, nargout=0)
+
+        return eng
+
+    def acquire(self, timeout=None) -> str:
+        """Borrow an engine, raises queue.Empty if none is free within timeout"""
+        return self.free.get(timeout=timeout)
+
+    def release(self, name: str):
+        """Return an engine, restart it if it no longer responds
+
+        Figures, base workspace and global variables of the previous client
+        are removed, so the next client starts from a clean session. Loaded
+        functions are kept, so the next client does not load them again.
+        """
+
+        try:
+            self.engines[name].eval("close all force", nargout=0)
+            self.engines[name].eval("clear variables", nargout=0)
+            self.engines[name].eval("clear global", nargout=0)
+        except Exception as err:
+            logging.warning(f"Engine {name} lost, restarting: {err}")
+            self.engines[name] = self.start_engine(name)
+
+        self.free.put(name)
+
+    def close(self):
+        """Quit all engines"""
+        for eng in self.engines.values():
+            try:
+                eng.quit()
+            except Exception:
+                pass
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """Handles a single client connection"""
+
+    def handle(self):
+        pool: EnginePool = self.server.pool
+        leased = []
+
+        try:
+            for line in self.rfile:
+                try:
+                    message = json.loads(line)
+                except ValueError:
+                    self.reply({"error": "Invalid request"})
+                    continue
+
+                op = message.get("op")
+
+                if op == "acquire":
+                    timeout = message.get("timeout", ACQUIRE_TIMEOUT)
+                    try:
+                        name = pool.acquire(timeout)
+                    except queue.Empty:
+                        self.reply({"error": f"No engine free within {timeout} s"})
+                        continue
+                    leased.append(name)
+                    self.reply({"name": name})
+                elif op == "status":
+                    self.reply({"size": pool.size, "free": pool.free.qsize()})
+                elif op == "shutdown":
+                    self.reply({"ok": True})
+                    threading.Thread(target=self.server.shutdown).start()
+                    break
+                else:
+                    self.reply({"error": f"Unknown operation: {op}"})
+        finally:
+            # Connection closed: return leased engines
+            for name in leased:
+                pool.release(name)
+
+    def reply(self, message: dict):
+        self.wfile.write((json.dumps(message) + "\n").encode("utf-8"))
+        self.wfile.flush()
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve(size=2, socket_path=None):
+    """Start engine pool and serve until shutdown"""
+
+    if not hasattr(socket, "AF_UNIX"):
+        logging.error("Unix sockets are not supported on this platform.")
+        return False
+
+    if socket_path is None:
+        socket_path = default_socket_path()
+
+    # Remove stale socket
+    if os.path.exists(socket_path):
+        try:
+            send({"op": "status"}, socket_path)
+        except OSError:
+            os.remove(socket_path)
+        else:
+            logging.error(f"Engine pool is already running on {socket_path}")
+            return False
+
+    try:
+        pool = EnginePool(size)
+    except Exception as err:
+        logging.error("Could not start MATLAB Engines")
+        print(err)
+        return False
+
+    server = _Server(socket_path, _RequestHandler)
+    server.pool = pool
+
+    logging.info(f"Engine pool with {size} engines listening on {socket_path}")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.remove(socket_path)
+        pool.close()
+
+    logging.info("Engine pool stopped.")
+    return True
+
+
+@click.command()
+@click.option("--size", type=int, default=2, help="Number of warm engines")
+@click.option("--socket", "socket_path", default=None, help="Path of the Unix socket")
+@click.option("--status", is_flag=True, help="Show status of a running pool")
+@click.option("--stop", is_flag=True, help="Stop a running pool")
+def main(size, socket_path, status, stop):
+    """Keep MATLAB engines warm for fibresem diameter analysis"""
+
+    logging.basicConfig(format=LOG_MSGFORMAT, datefmt=LOG_TIMEFORMAT, level=logging.INFO)
+
+    if status or stop:
+        try:
+            reply = send({"op": "shutdown" if stop else "status"}, socket_path)
+        except OSError:
+            logging.error("Engine pool is not running.")
+            return
+        print(reply)
+        return
+
+    serve(size, socket_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,28 @@ import numpy as np
 from fibresem.core.config import Config
 
 
+def analysis_params(config) -> dict:
+    """Analysis parameters from the config"""
+
+    params = {
+        "optimise_for_thin_fibres": config.getboolean(
+            "general", "optimise_for_thin_fibres"
+        ),
+        "max_edge_distance": config.getfloat("general", "max_edge_distance"),
+        "verbose": config.getboolean("general", "verbose"),
+        "transfer": config.get("simpoly-matlab-engine", "transfer"),
+        "parallel": config.getboolean("simpoly-matlab-engine", "parallel"),
+    }
+
+    # Tiled analysis, only if enabled
+    tile_size = config.getint("analysis", "tile_size")
+    if tile_size > 0:
+        params["tile_size"] = tile_size
+        params["tile_halo"] = config.getint("analysis", "tile_halo")
+
+    return params
+
+
 class Analysis:
     """Class containing the analysis engine handler, settings, and result"""
 
@@ -26,36 +48,120 @@ class Analysis:
         self.pixel_size_value = self.parent.Meta["Pixel Size Value"]
         self.pixel_size_unit = self.parent.Meta["Pixel Size Unit"]
 
-        self.params = {
-            "optimise_for_thin_fibres": config.getboolean(
-                "general", "optimise_for_thin_fibres"
-            ),
-            "verbose": config.getboolean("general", "verbose"),
-        }
+        self.params = analysis_params(config)
 
-        self.method = "simpoly-matlab"
         self.engine_handler = engine_handler
+        self.method = getattr(engine_handler, "name", "simpoly-matlab")
+
+        # Engines running the same code share cached results
+        self.cache_name = getattr(engine_handler, "cache_name", "") or self.method
 
         self.output_path = output_path
 
         self.result = None
 
-    def start(self, load_externally=False) -> bool:
-        """Start analysis"""
+    def __getstate__(self):
+        """Detach parent image and engine when pickling, e.g. in worker processes"""
+        state = self.__dict__.copy()
+        state["parent"] = None
+        state["engine_handler"] = None
+        return state
+
+    def start(self, load_externally=False, cache=None) -> bool:
+        """Start analysis
+
+        Parameters
+        ----------
+        load_externally : bool
+            Let the engine load the image file
+        cache : ResultCache
+            If provided, reuse a cached result or cache the new result
+        """
 
         if not self.engine_handler:
             logging.warning("No engine handler defined for analysis!")
             return False
 
+        # Look up cached result
+        if self.load_cached(cache):
+            return True
+
         # Run analysis engine
         result: Result
         result = self.engine_handler.run(analysis=self, load_externally=load_externally)
+        self.set_result(result, cache)
+
+        # Return success
+        return True
+
+    def load_cached(self, cache) -> bool:
+        """Set cached result, returns False if not cached"""
+
+        if cache is None:
+            return False
+
+        result = cache.load(cache.key(self.image_path, self.cache_name, self.params))
+        if result is None:
+            return False
+
+        logging.info(f"Loaded cached result for {self.file_name}")
         result.parent = self
         self.result = result
 
-        # Return success
         return True
 
+    def set_result(self, result, cache=None):
+        """Set result of the engine and store it in the cache"""
+
+        result.parent = self
+        self.result = result
+
+        if cache is not None:
+            cache.store(cache.key(self.image_path, self.cache_name, self.params), result)
+
+
+def start_batch(analyses: list, cache=None) -> int:
+    """Start several analyses with a single engine call
+
+    The engine of the first analysis loads all image files itself, see
+    EngineHandler.run_batch. Cached results are reused.
+
+    Parameters
+    ----------
+    analyses : list
+        Analyses sharing the engine handler and parameters
+    cache : ResultCache
+        If provided, reuse cached results or cache the new results
+
+    Returns
+    -------
+    int
+        Number of successful analyses
+    """
+
+    if not analyses:
+        return 0
+
+    engine_handler = analyses[0].engine_handler
+    if not engine_handler:
+        logging.warning("No engine handler defined for analysis!")
+        return 0
+
+    pending = [analysis for analysis in analyses if not analysis.load_cached(cache)]
+    successful = len(analyses) - len(pending)
+
+    if pending:
+        logging.info(f"Analysing {len(pending)} images in one batch.")
+
+    for analysis, result in zip(pending, engine_handler.run_batch(pending)):
+        if result is None:
+            continue
+
+        analysis.set_result(result, cache)
+        successful += 1
+
+    return successful
+
 
 @dataclass
 class Result:
@@ -64,12 +170,46 @@ class Result:
     def __init__(self, analysis_parent=None):
         self.parent = analysis_parent
 
+        # ResultStore holding the diameters, see bind
+        self.store = None
+        self.row = None
+
         self.pixel_average = 0.0
         self.pixel_sdev = 0.0
         self.pixel_diameters = {}
 
         self.unit = "µm"
 
+    def __getstate__(self):
+        """Detach from the result store when pickling, keeping a copy of the diameters"""
+        state = self.__dict__.copy()
+        if self.store is not None:
+            state["_pixel_diameters"] = np.array(self.pixel_diameters)
+            state["store"] = None
+            state["row"] = None
+        return state
+
+    def bind(self, store, row: int):
+        """Keep the diameters in a ResultStore, instead of a separate array"""
+        self.store = store
+        self.row = row
+        self._pixel_diameters = None
+
+    @property
+    def pixel_diameters(self) -> np.ndarray:
+        """All fibre diameters in pixels"""
+        if self.store is not None:
+            return self.store.diameters_of(self.row)
+
+        return self._pixel_diameters
+
+    @pixel_diameters.setter
+    def pixel_diameters(self, value):
+        # Setting the diameters detaches the result from the store
+        self.store = None
+        self.row = None
+        self._pixel_diameters = value
+
     def __str__(self):
         return (
             f"avgp: {self.pixel_average:.3f} px \t"
@@ -0,0 +1,190 @@
+"""Run journal
+
+Append-only journal of a diameter analysis run in the project folder. The
+result of every image is appended as soon as the image has been analysed:
+the diameters to a raw float32 file, then a JSON line with the summary
+values and the location of the diameters. A run that is interrupted can
+be resumed, skipping all images in the journal. Images are identified by
+their path relative to the project folder.
+
+An entry is only reused if the image file (size and modification time),
+the engine and the analysis parameters are unchanged. A JSON line that
+was cut off by a crash is ignored, so the image is analysed again.
+"""
+
+import os
+import json
+import logging
+import numpy as np
+
+from fibresem.analysis.fibreanalysis import Result
+from fibresem.analysis.cache import IGNORED_PARAMS
+
+JOURNAL_FILE = "fibresem_journal.jsonl"
+DIAMETERS_FILE = "fibresem_journal.f32"
+
+
+class RunJournal:
+    """Journal of the analysed images of a project
+
+    Attributes
+    ----------
+    path : str
+        Directory of the journal files, usually the project folder
+    engine_name : str
+        Analysis engine of the run, e.g. "simpoly-matlab"
+    params : dict
+        Analysis parameters of the run, see Analysis.params
+    entries : dict
+        Journal entries by image path relative to the project folder
+    """
+
+    def __init__(self, path: str, engine_name: str, params: dict, resume=False):
+        """
+        Parameters
+        ----------
+        resume : bool
+            Keep the entries of a previous run, otherwise start a new journal
+        """
+
+        self.path = path
+        self.engine_name = engine_name
+        self.params = {k: v for k, v in params.items() if k not in IGNORED_PARAMS}
+        self.entries = {}
+
+        os.makedirs(path, exist_ok=True)
+
+        if resume:
+            self.read()
+        else:
+            self.remove()
+
+    @property
+    def journal_file(self) -> str:
+        return os.path.join(self.path, JOURNAL_FILE)
+
+    @property
+    def diameters_file(self) -> str:
+        return os.path.join(self.path, DIAMETERS_FILE)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, name):
+        return name in self.entries
+
+    def remove(self):
+        """Remove the journal files"""
+
+        for file in (self.journal_file, self.diameters_file):
+            if os.path.exists(file):
+                os.remove(file)
+
+        self.entries = {}
+
+    def read(self):
+        """Read the entries of the journal, of the same engine and parameters"""
+
+        if not os.path.exists(self.journal_file):
+            return
+
+        diameters_size = os.path.getsize(self.diameters_file) if os.path.exists(self.diameters_file) else 0
+        item_size = np.dtype(np.float32).itemsize
+
+        with open(self.journal_file, encoding="utf-8") as fh:
+            for line in fh:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # Line cut off by a crash
+                    continue
+
+                if entry.get("engine") != self.engine_name or entry.get("params") != self.params:
+                    continue
+
+                if (entry["offset"] + entry["count"]) * item_size > diameters_size:
+                    continue
+
+                # Later entries of an image replace earlier ones
+                self.entries[entry["name"]] = entry
+
+        logging.info(f"Read {len(self.entries)} results from the run journal")
+
+    @staticmethod
+    def file_id(image_path: str) -> list:
+        stat = os.stat(image_path)
+        return [stat.st_size, stat.st_mtime_ns]
+
+    def lookup(self, name: str, image_path: str) -> dict:
+        """Journal entry of an image, None if missing or the file has changed"""
+
+        entry = self.entries.get(name)
+        if entry is None:
+            return None
+
+        try:
+            if entry["file"] != self.file_id(image_path):
+                return None
+        except OSError:
+            return None
+
+        return entry
+
+    def load(self, entry: dict) -> Result:
+        """Result of a journal entry"""
+
+        result = Result()
+        result.pixel_average = entry["pixel_average"]
+        result.pixel_sdev = entry["pixel_sdev"]
+        result.pixel_diameters = np.fromfile(
+            self.diameters_file,
+            dtype=np.float32,
+            count=entry["count"],
+            offset=entry["offset"] * np.dtype(np.float32).itemsize,
+        )
+
+        return result
+
+    def append(self, name: str, image_path: str, result: Result, pixel_size_value=None, pixel_size_unit=None):
+        """Append the result of an image, flushed to disk before returning"""
+
+        diameters = np.ascontiguousarray(result.pixel_diameters, dtype=np.float32).ravel()
+
+        # Diameters first: a journal line only points to diameters on disk
+        with open(self.diameters_file, "ab") as fh:
+            # Skip the partial value of an interrupted write
+            padding = -fh.tell() % diameters.itemsize
+            fh.write(b"\0" * padding)
+
+            offset = fh.tell() // diameters.itemsize
+            diameters.tofile(fh)
+            fh.flush()
+            os.fsync(fh.fileno())
+
+        entry = {
+            "name": name,
+            "file": self.file_id(image_path),
+            "engine": self.engine_name,
+            "params": self.params,
+            "pixel_average": float(result.pixel_average),
+            "pixel_sdev": float(result.pixel_sdev),
+            "pixel_size_value": None if pixel_size_value is None else float(pixel_size_value),
+            "pixel_size_unit": pixel_size_unit,
+            "offset": offset,
+            "count": int(diameters.size),
+        }
+
+        line = (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8")
+
+        with open(self.journal_file, "ab+") as fh:
+            # Terminate a line cut off by a crash
+            if fh.seek(0, os.SEEK_END) > 0:
+                fh.seek(-1, os.SEEK_END)
+                if fh.read(1) != b"\n":
+                    line = b"\n" + line
+
+            fh.write(line)
+            fh.flush()
+            os.fsync(fh.fileno())
+
+        self.entries[name] = entry
@@ -10,7 +10,12 @@ function res = simpoly(I, kwargs)
     % pixelsizeunit   - pixel size unit
     % params          - struct containing additional parameters:
     %                   optimiseForThinFibres:  - optimise for fibres < 5 px.
+    % maxEdgeDistance - remove skeleton pixels further away from an edge (px)
     % outputpath      - path where output figures should be saved
+    % rawfile         - optional raw uint8 file (row-major) to read I from
+    % rawsize         - size [rows cols] of the image in rawfile
+    % resultfile      - optional file to write the diameters to (raw
+    %                   double), instead of returning them in res
     %
     % OUTPUT:
     %
@@ -26,11 +31,23 @@ function res = simpoly(I, kwargs)
         kwargs.pixelsize = 1;
         kwargs.pixelsizeunit = 'px';
         kwargs.optimiseForThinFibres = true;
+        kwargs.maxEdgeDistance = 55;
         kwargs.filename = "image.png";
         kwargs.outputpath = fullfile(pwd, 'fibre_analysis');
         kwargs.load_externally = false;
         kwargs.verbose = false;
         kwargs.filepath = "";
+        kwargs.rawfile = "";
+        kwargs.rawsize = [0 0];
+        kwargs.resultfile = "";
+    end
+
+    if strlength(kwargs.rawfile) > 0
+        % Memory-map uint8 data written row-major by Python
+        fprintf("Mapping raw image data in MATLAB\n")
+        m = memmapfile(kwargs.rawfile, 'Format', {'uint8', fliplr(kwargs.rawsize), 'I'});
+        I = m.Data.I';
+        clear m
     end
 
      if kwargs.load_externally == true
@@ -110,10 +127,13 @@ function res = simpoly(I, kwargs)
     %median filter than cleans image, stops when loop no longer changes image
     logging("Cleaning: ");
 
+    % Until the image no longer changes, or alternates between two states
     BWf = medfilt2(BW);
+    BWp = [];
     i = 0;
-    while sum(sum(BWf)) ~= sum(sum(BW))
+    while ~isequal(BWf, BW) && ~isequal(BWf, BWp)
         i = i + 1;
+        BWp = BW;
         BW = BWf;
         BWf = medfilt2(BW);
         
@@ -141,23 +161,10 @@ function res = simpoly(I, kwargs)
     % Uses edge overlay to filter out background noise
     % To debug F, use imshow(F, []);
     % If skeleton segment is at a large distance from edge: remove segment
-    logging("Clean skeleton:   0%%");
-
-    [m,n] = size(SK);
-    F=bwdist(E);
-    for i = 1:m
-        for j = 1:n
-            if SK(i,j)==1
-                Ry=F(i,j);
-                if Ry > 55
-                    SK(i,j) = 0;
-                end
-            end
-        end
-        logging(sprintf("\b\b\b\b%3.0f%%", i/m * 100));
-    end
+    logging("Clean skeleton\n");
 
-    logging("\n");
+    F = bwdist(E);
+    SK(F > kwargs.maxEdgeDistance) = 0;
 
     %togglefig('Segmented Image')
     %imshow(BW)
@@ -242,6 +249,12 @@ function res = simpoly(I, kwargs)
     res.sdevp = stdevp;
     res.diameters = diameters;
 
+    if strlength(kwargs.resultfile) > 0
+        % Write diameters as raw doubles, read by Python without conversion
+        writeRaw(kwargs.resultfile, diameters);
+        res.diameters = [];
+    end
+
     %%set(gca,'LooseInset',get(gca,'TightInset'));
     %saveas(gcf, fullfile(outputpath{1}, 'histogram', outputpath{2}));
     close all
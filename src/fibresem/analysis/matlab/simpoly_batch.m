@@ -0,0 +1,109 @@
+function res = simpoly_batch(filepaths, kwargs)
+    %SIMPOLY_BATCH Calculates fibre diameter distributions of several images
+    %   SIMPOLY_BATCH runs SIMPOLY on every image file in a single call. The
+    %   images are analysed in parallel (parfor) if the Parallel Computing
+    %   Toolbox is available and useParallel is set.
+    %
+    % INPUT:
+    %
+    % filepaths       - string array of image files
+    % pixelsize       - pixel size of every image
+    % pixelsizeunit   - string array, pixel size unit of every image
+    % filenames       - string array, file names of the output figures
+    % optimiseForThinFibres, maxEdgeDistance, outputpath, verbose
+    %                 - see SIMPOLY, shared by all images
+    % useParallel     - analyse images in a parfor loop
+    % resultfile      - optional file to write the concatenated diameters
+    %                   to (raw double), instead of returning them in res
+    %
+    % OUTPUT:
+    %
+    % res             - struct containing the results of all images:
+    %                   avgp        - average in pixels, per image
+    %                   sdevp       - standard deviation in pixels, per image
+    %                   counts      - number of diameters, per image
+    %                   diameters   - diameters (in pixels) of all images,
+    %                                 concatenated in order of filepaths
+    %                   errors      - error message per image, "" if none
+
+    arguments
+        filepaths string;
+        kwargs.pixelsize double = [];
+        kwargs.pixelsizeunit string = string.empty;
+        kwargs.filenames string = string.empty;
+        kwargs.optimiseForThinFibres = true;
+        kwargs.maxEdgeDistance = 55;
+        kwargs.outputpath = fullfile(pwd, 'fibre_analysis');
+        kwargs.verbose = false;
+        kwargs.useParallel = true;
+        kwargs.resultfile = "";
+    end
+
+    n = numel(filepaths);
+
+    if isempty(kwargs.pixelsize)
+        kwargs.pixelsize = ones(1, n);
+    end
+    if isempty(kwargs.pixelsizeunit)
+        kwargs.pixelsizeunit = repmat("px", 1, n);
+    end
+    if isempty(kwargs.filenames)
+        kwargs.filenames = compose("image%d.png", 1:n);
+    end
+
+    % parfor runs in the client, like a for loop, if M = 0
+    if kwargs.useParallel && license('test', 'Distrib_Computing_Toolbox')
+        M = Inf;
+    else
+        M = 0;
+    end
+
+    pixelsize = kwargs.pixelsize;
+    pixelsizeunit = kwargs.pixelsizeunit;
+    filenames = kwargs.filenames;
+    optimiseForThinFibres = kwargs.optimiseForThinFibres;
+    maxEdgeDistance = kwargs.maxEdgeDistance;
+    outputpath = kwargs.outputpath;
+    verbose = kwargs.verbose;
+
+    avgp = nan(1, n);
+    sdevp = nan(1, n);
+    counts = zeros(1, n);
+    diameters = cell(1, n);
+    errors = repmat("", 1, n);
+
+    parfor (i = 1:n, M)
+        try
+            r = simpoly([], ...
+                "pixelsize", pixelsize(i), ...
+                "pixelsizeunit", char(pixelsizeunit(i)), ...
+                "optimiseForThinFibres", optimiseForThinFibres, ...
+                "maxEdgeDistance", maxEdgeDistance, ...
+                "filename", filenames(i), ...
+                "outputpath", outputpath, ...
+                "load_externally", true, ...
+                "filepath", filepaths(i), ...
+                "verbose", verbose);
+
+            avgp(i) = r.avgp;
+            sdevp(i) = r.sdevp;
+            diameters{i} = double(r.diameters(:));
+            counts(i) = numel(diameters{i});
+        catch err
+            diameters{i} = zeros(0, 1);
+            errors(i) = string(err.message);
+        end
+    end
+
+    res.avgp = avgp;
+    res.sdevp = sdevp;
+    res.counts = counts;
+    res.diameters = vertcat(diameters{:});
+    res.errors = errors;
+
+    if strlength(kwargs.resultfile) > 0
+        % Write diameters as raw doubles, read by Python without conversion
+        writeRaw(kwargs.resultfile, res.diameters);
+        res.diameters = [];
+    end
+end
@@ -0,0 +1,14 @@
+function writeRaw(filepath, values)
+
+% Write values as raw doubles in native byte order, e.g. to be read by
+% numpy.fromfile(filepath, dtype=numpy.float64)
+
+fid = fopen(filepath, 'w');
+if fid < 0
+    error('writeRaw:open', 'Could not open %s', filepath);
+end
+
+fwrite(fid, double(values(:)), 'double');
+fclose(fid);
+
+end
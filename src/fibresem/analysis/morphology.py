@@ -0,0 +1,276 @@
+"""Binary morphology with 3x3 lookup tables
+
+Equivalents of the bwmorph operations used by simpoly.m. Every operation
+is a lookup table indexed by the 9-bit code of the 3x3 neighbourhood of a
+pixel (see makelut/applylut in MATLAB), evaluated on whole arrays.
+
+Iterative operations track an active set: after the first pass over the
+image, only pixels next to a pixel that changed are evaluated again, the
+others cannot change. An operation stops as soon as a pass changes
+nothing.
+"""
+
+import numpy as np
+from scipy import ndimage
+
+# Neighbours x1..x8 as (dy, dx), counter-clockwise starting east. Bit k of
+# a neighbourhood code is x(k+1), bit 8 is the centre pixel.
+NEIGHBOURS = [(0, 1), (-1, 1), (-1, 0), (-1, -1), (0, -1), (1, -1), (1, 0), (1, 1)]
+CENTRE = 8
+
+# Evaluate the whole image again if more pixels than this fraction are active
+ACTIVE_FRACTION = 0.25
+
+# 8-connectivity structuring element
+EIGHT_CONNECTED = np.ones((3, 3), dtype=bool)
+
+
+def makelut(fn) -> np.ndarray:
+    """Lookup table of a 3x3 neighbourhood operation
+
+    Parameters
+    ----------
+    fn : callable
+        fn(centre, x) -> bool, evaluated on arrays of all 512 neighbourhoods,
+        x is the list of neighbours x1..x8
+
+    Returns
+    -------
+    numpy.ndarray
+        Boolean lookup table of 512 entries
+    """
+
+    codes = np.arange(512)
+    x = [(codes >> k & 1).astype(bool) for k in range(8)]
+    centre = (codes >> CENTRE & 1).astype(bool)
+
+    return np.broadcast_to(fn(centre, x), codes.shape).astype(bool)
+
+
+def neighbourhood(bw) -> np.ndarray:
+    """9-bit neighbourhood codes of all pixels, zero padded"""
+
+    h, w = bw.shape
+    p = np.pad(bw, 1).astype(np.uint16)
+
+    codes = p[1:-1, 1:-1] << CENTRE
+    for k, (dy, dx) in enumerate(NEIGHBOURS):
+        codes |= p[1 + dy : h + 1 + dy, 1 + dx : w + 1 + dx] << k
+
+    return codes
+
+
+def applylut(bw, lut) -> np.ndarray:
+    """Apply a lookup table to every pixel"""
+    return lut[neighbourhood(np.asarray(bw, dtype=bool))]
+
+
+def _unique(indices, stamp) -> np.ndarray:
+    """Unique indices, without sorting
+
+    stamp is a scratch array covering all indices. The last position of
+    every index is written to stamp, only that occurrence is kept.
+    """
+    positions = np.arange(indices.size, dtype=stamp.dtype)
+    stamp[indices] = positions
+    return indices[stamp[indices] == positions]
+
+
+def iterate(bw, luts, n=1, cycles=False) -> np.ndarray:
+    """Apply lookup tables n times, or until the image no longer changes
+
+    Parameters
+    ----------
+    bw : numpy.ndarray
+        Binary image
+    luts : tuple
+        Lookup tables applied in turn in every iteration, e.g. the two
+        subiterations of thinning
+    n : int
+        Number of iterations, np.inf: until the image no longer changes
+    cycles : bool
+        Also stop if a pass undoes the previous pass, the image alternates
+        between two states. The pass is undone. Single table only.
+    """
+
+    bw = np.asarray(bw, dtype=bool)
+    h, w = bw.shape
+
+    padded = np.pad(bw, 1).astype(np.uint8)
+    inner = padded[1:-1, 1:-1]
+    flat = padded.ravel()
+
+    stride = w + 2
+    offsets = np.array([dy * stride + dx for dy, dx in NEIGHBOURS])
+    weights = np.array([1 << k for k in range(8)], dtype=np.uint16)
+    max_active = ACTIVE_FRACTION * bw.size
+    stamp = np.empty(flat.size, dtype=np.int64)
+
+    # Pixels (flat indices into padded) to evaluate for every table, None: all
+    active = [None] * len(luts)
+    previous = None
+
+    i = 0
+    while i < n:
+        changed_any = False
+
+        for k, lut in enumerate(luts):
+            idx = active[k]
+
+            if idx is None:
+                new = lut[neighbourhood(inner)]
+                rows, cols = np.nonzero(new != inner)
+                inner[...] = new
+                changed = (rows + 1) * stride + cols + 1
+            else:
+                codes = flat[idx].astype(np.uint16) << CENTRE
+                codes |= flat[idx[:, None] + offsets] @ weights
+                new = lut[codes]
+                changed = idx[new != flat[idx].astype(bool)]
+                flat[changed] ^= 1
+
+            if changed.size == 0:
+                active[k] = np.zeros(0, dtype=np.intp)
+                continue
+
+            if cycles:
+                changed = np.sort(changed)
+                if previous is not None and np.array_equal(changed, previous):
+                    flat[changed] ^= 1
+                    return inner.astype(bool)
+                previous = changed
+
+            changed_any = True
+
+            # Changed pixels and their neighbours, within the image
+            spread = _unique(np.concatenate([changed, (changed[:, None] + offsets).ravel()]), stamp)
+            rows, cols = np.divmod(spread, stride)
+            spread = spread[(rows >= 1) & (rows <= h) & (cols >= 1) & (cols <= w)]
+
+            for j in range(len(luts)):
+                if j == k:
+                    active[j] = spread
+                elif active[j] is not None:
+                    active[j] = _unique(np.concatenate([active[j], spread]), stamp)
+
+                if active[j] is not None and active[j].size > max_active:
+                    active[j] = None
+
+        if not changed_any:
+            break
+        i += 1
+
+    return inner.astype(bool)
+
+
+def _count(x):
+    """Number of set neighbours"""
+    return sum(xk.astype(np.uint8) for xk in x)
+
+
+def _thin_lut(first) -> np.ndarray:
+    """Thinning subiteration (Lam, Lee & Suen)"""
+
+    def fn(centre, x):
+        x = x + [x[0]]  # x9 = x1
+
+        # G1: Hilditch crossing number equals one
+        crossings = sum((~x[2 * i]) & (x[2 * i + 1] | x[2 * i + 2]) for i in range(4)).astype(np.uint8)
+
+        # G2: 2 <= min(n1, n2) <= 3
+        n1 = sum((x[2 * i] | x[2 * i + 1]).astype(np.uint8) for i in range(4))
+        n2 = sum((x[2 * i + 1] | x[2 * i + 2]).astype(np.uint8) for i in range(4))
+        nmin = np.minimum(n1, n2)
+
+        # G3 / G3'
+        if first:
+            g3 = ~((x[1] | x[2] | ~x[7]) & x[0])
+        else:
+            g3 = ~((x[5] | x[6] | ~x[3]) & x[4])
+
+        return centre & ~((crossings == 1) & (nmin >= 2) & (nmin <= 3) & g3)
+
+    return makelut(fn)
+
+
+def _branchpoint(centre, x):
+    x = x + [x[0]]
+    transitions = sum((~x[i] & x[i + 1]).astype(np.uint8) for i in range(8))
+    return centre & (transitions >= 3)
+
+
+CLEAN = makelut(lambda centre, x: centre & (_count(x) > 0))
+FILL = makelut(lambda centre, x: centre | (_count(x) == 8))
+MAJORITY = makelut(lambda centre, x: (_count(x) + centre) >= 5)
+SPUR = makelut(lambda centre, x: centre & (_count(x) != 1))
+BRANCHPOINTS = makelut(_branchpoint)
+THIN = (_thin_lut(True), _thin_lut(False))
+
+# A 3x3 binary median is the majority of the neighbourhood
+MEDIAN = MAJORITY
+
+
+def clean(bw, n=1):
+    """Remove isolated pixels"""
+    return iterate(bw, (CLEAN,), n)
+
+
+def fill(bw, n=1):
+    """Fill isolated interior pixels"""
+    return iterate(bw, (FILL,), n)
+
+
+def majority(bw, n=1):
+    """Set a pixel if five or more pixels in its 3x3 neighbourhood are set"""
+    return iterate(bw, (MAJORITY,), n)
+
+
+def medfilt(bw):
+    """3x3 median filter of a binary image with zero padding"""
+    return applylut(bw, MEDIAN)
+
+
+def medfilt_converge(bw, n=np.inf):
+    """Repeat the 3x3 median filter until the image no longer changes
+
+    After the first pass, only the neighbourhoods of pixels that flipped
+    are filtered again. Stops at a fixed point, or if the image alternates
+    between two states (returning the state before the repeat).
+    """
+    return iterate(bw, (MEDIAN,), n, cycles=True)
+
+
+def thin(bw, n=1):
+    """Thin objects to lines"""
+    return iterate(bw, THIN, n)
+
+
+def thicken(bw, n=1):
+    """Thicken objects by thinning the background"""
+    padded = np.pad(~np.asarray(bw, dtype=bool), 2, constant_values=True)
+    return ~thin(padded, n)[2:-2, 2:-2]
+
+
+def spur(bw, n=1):
+    """Remove end points of lines"""
+    return iterate(bw, (SPUR,), n)
+
+
+def branchpoints(bw):
+    """Find branch points of a skeleton, where three or more branches meet"""
+    return applylut(bw, BRANCHPOINTS)
+
+
+def bwareaopen(bw, min_area):
+    """Remove 8-connected objects with less than min_area pixels"""
+    labels, _ = ndimage.label(bw, structure=EIGHT_CONNECTED)
+    sizes = np.bincount(labels.ravel())
+    keep = sizes >= min_area
+    keep[0] = False
+    return keep[labels]
+
+
+def imclose(bw, structure):
+    """Binary closing, without eroding the image border"""
+    dilated = ndimage.binary_dilation(bw, structure=structure)
+    return ndimage.binary_erosion(dilated, structure=structure, border_value=1)
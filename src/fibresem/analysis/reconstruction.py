@@ -0,0 +1,152 @@
+"""Grayscale erosion and morphological reconstruction
+
+Equivalents of imerode(I, strel('disk', r)) and imreconstruct in MATLAB,
+used for the opening-by-reconstruction step of simpoly.m.
+
+The disk erosion is decomposed into line segments: a flat disk is the
+union of centred rectangles, so its erosion is the minimum of rectangle
+erosions, each a vertical and a horizontal line erosion.
+
+The reconstruction follows the hybrid algorithm of Vincent (Morphological
+Grayscale Reconstruction in Image Analysis, 1993): raster scans propagate
+the marker through most of the image, a queue of the pixels that can still
+raise a neighbour propagates the rest. Both phases are vectorised: the
+scans along the image rows and columns, the queue as a wavefront of all
+queued pixels at once.
+"""
+
+import numpy as np
+from scipy import ndimage
+
+# 8-connected neighbours (dy, dx)
+NEIGHBOURS = [(0, 1), (-1, 1), (-1, 0), (-1, -1), (0, -1), (1, -1), (1, 0), (1, 1)]
+
+
+def disk(radius) -> np.ndarray:
+    """Flat disk shaped structuring element"""
+    y, x = np.ogrid[-radius : radius + 1, -radius : radius + 1]
+    return x**2 + y**2 <= radius**2
+
+
+def disk_rectangles(radius) -> list:
+    """Centred rectangles whose union is disk(radius)
+
+    Returns
+    -------
+    list
+        (half height, half width) of every rectangle, by increasing height
+    """
+
+    dy = np.arange(radius + 1)
+    half_widths = np.floor(np.sqrt(radius**2 - dy**2) + 1e-9).astype(int)
+
+    # The tallest rectangle of every half width
+    return [(int(np.flatnonzero(half_widths >= w).max()), int(w)) for w in np.unique(half_widths)[::-1]]
+
+
+def imerode_disk(image, radius) -> np.ndarray:
+    """Grayscale erosion with disk(radius), pixels outside the image are ignored
+
+    Equal to ndimage.grey_erosion(image, footprint=disk(radius)) with the
+    image padded by its maximum value.
+    """
+
+    image = np.asarray(image)
+    if np.issubdtype(image.dtype, np.integer):
+        cval = np.iinfo(image.dtype).max
+    else:
+        cval = np.inf
+
+    def line(image, half, axis):
+        if half == 0:
+            return image
+        return ndimage.minimum_filter1d(image, 2 * half + 1, axis=axis, mode="constant", cval=cval)
+
+    out = None
+    vertical, height = image, 0
+
+    for h, w in disk_rectangles(radius):
+        # Taller line from the previous one: (2a + 1) + (2b + 1) - 1 = 2(a + b) + 1
+        vertical = line(vertical, h - height, axis=0)
+        height = h
+
+        eroded = line(vertical, w, axis=1)
+        out = eroded.copy() if out is None else np.minimum(out, eroded, out=out)
+
+    return out
+
+
+def imreconstruct(marker, mask):
+    """Morphological reconstruction by dilation (8-connected)
+
+    Parameters
+    ----------
+    marker, mask : numpy.ndarray
+        Grayscale images of the same shape, e.g. uint8
+
+    Returns
+    -------
+    numpy.ndarray
+        Reconstruction of mask from marker
+    """
+
+    rec = np.minimum(marker, mask)
+    mask = np.asarray(mask)
+
+    # Raster phase: directional sweeps down, up, right and left
+    _sweep(rec, mask)
+    _sweep(rec[::-1], mask[::-1])
+    _sweep(rec.T, mask.T)
+    _sweep(rec.T[::-1], mask.T[::-1])
+
+    # Queue phase, on padded images: the border is never raised
+    h, w = rec.shape
+    rec_p = np.pad(rec, 1)
+    mask_p = np.pad(mask, 1)
+    inner = rec_p[1:-1, 1:-1]
+
+    # Pixels that can raise a neighbour
+    queued = np.zeros((h, w), dtype=bool)
+    for dy, dx in NEIGHBOURS:
+        neighbour = rec_p[1 + dy : h + 1 + dy, 1 + dx : w + 1 + dx]
+        neighbour_mask = mask_p[1 + dy : h + 1 + dy, 1 + dx : w + 1 + dx]
+        queued |= neighbour < np.minimum(inner, neighbour_mask)
+
+    stride = w + 2
+    offsets = [dy * stride + dx for dy, dx in NEIGHBOURS]
+    rec_flat = rec_p.ravel()
+    mask_flat = mask_p.ravel()
+
+    rows, cols = np.nonzero(queued)
+    queue = (rows + 1) * stride + cols + 1
+
+    while queue.size:
+        values = rec_flat[queue]
+        raised = []
+
+        for offset in offsets:
+            # Neighbours of distinct pixels in one direction are distinct
+            neighbours = queue + offset
+            candidate = np.minimum(values, mask_flat[neighbours])
+            higher = candidate > rec_flat[neighbours]
+
+            if higher.any():
+                neighbours = neighbours[higher]
+                rec_flat[neighbours] = candidate[higher]
+                raised.append(neighbours)
+
+        queue = np.unique(np.concatenate(raised)) if raised else np.zeros(0, dtype=np.intp)
+
+    return rec_p[1:-1, 1:-1].copy()
+
+
+def _sweep(rec, mask):
+    """Propagate every row into the next row (in-place)"""
+    line = np.empty_like(rec[0])
+    for i in range(1, rec.shape[0]):
+        prev = rec[i - 1]
+        np.copyto(line, prev)
+        np.maximum(line[1:], prev[:-1], out=line[1:])
+        np.maximum(line[:-1], prev[1:], out=line[:-1])
+        np.maximum(line, rec[i], out=line)
+        np.minimum(line, mask[i], out=rec[i])
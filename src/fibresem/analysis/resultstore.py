@@ -0,0 +1,309 @@
+"""Result Store
+
+Column-wise store of the analysis results of all images of a project. All
+fibre diameters are kept in a single contiguous float32 buffer, every image
+owns a slice of it. The summary values of every image are kept in numpy
+columns, so summaries and statistics across images are vectorized.
+"""
+
+import numpy as np
+import pandas as pd
+
+# Unit of the physical diameters, see Result.unit
+UNIT = "µm"
+
+# Compact the diameters buffer when more than this fraction is replaced diameters
+COMPACT_FRACTION = 0.5
+
+# Exponents of the pixel size units
+UNIT_EXPONENT = {"nm": -9, "um": -6, "µm": -6, "mm": -3, "m": 0}
+
+
+def conversion_factors(pixel_size_values: np.ndarray, pixel_size_units: list) -> np.ndarray:
+    """Vectorized Result.conversion_factor, NaN for unknown units"""
+
+    exponents = np.array(
+        [UNIT_EXPONENT.get(unit, np.nan) if unit else np.nan for unit in pixel_size_units],
+        dtype=np.float64,
+    )
+
+    return pixel_size_values * 10.0 ** (exponents - UNIT_EXPONENT[UNIT])
+
+
+class ResultStore:
+    """Analysis results of all images, stored column-wise
+
+    Every image is a row, identified by its path relative to the project
+    (or its file name). A result added
+    again for the same image replaces the row; its previous diameters are
+    dropped on the next compact(), which runs automatically once more than
+    COMPACT_FRACTION of the buffer are replaced diameters.
+
+    Attributes
+    ----------
+    names : list
+        Image of every row, see add
+    sample_names : list
+        Sample name of every row
+    pixel_size_units : list
+        Pixel size unit of every row
+    """
+
+    def __init__(self):
+        self.names = []
+        self.sample_names = []
+        self.pixel_size_units = []
+        self.rows = {}
+
+        # Per row columns, with spare capacity
+        self._pixel_average = np.empty(0, dtype=np.float64)
+        self._pixel_sdev = np.empty(0, dtype=np.float64)
+        self._pixel_size_value = np.empty(0, dtype=np.float64)
+        self._starts = np.empty(0, dtype=np.int64)
+        self._counts = np.empty(0, dtype=np.int64)
+
+        # Diameters of all rows, the first _used elements are in use,
+        # _live of them belong to the current rows
+        self._buffer = np.empty(0, dtype=np.float32)
+        self._used = 0
+        self._live = 0
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self.rows
+
+    @staticmethod
+    def _grow(array: np.ndarray, size: int) -> np.ndarray:
+        """Return array with room for at least size elements"""
+
+        if size <= array.size:
+            return array
+
+        grown = np.empty(max(size, 2 * array.size, 16), dtype=array.dtype)
+        grown[: array.size] = array
+
+        return grown
+
+    def _new_row(self, name: str) -> int:
+        row = len(self.names)
+
+        self.names.append(name)
+        self.sample_names.append("")
+        self.pixel_size_units.append(None)
+        self.rows[name] = row
+
+        self._pixel_average = self._grow(self._pixel_average, row + 1)
+        self._pixel_sdev = self._grow(self._pixel_sdev, row + 1)
+        self._pixel_size_value = self._grow(self._pixel_size_value, row + 1)
+        self._starts = self._grow(self._starts, row + 1)
+        self._counts = self._grow(self._counts, row + 1)
+
+        return row
+
+    def add(self, name: str, result, sample_name="", pixel_size_value=np.nan, pixel_size_unit=None) -> int:
+        """Add result and bind it to the store
+
+        The diameters of the result are moved into the store (as float32),
+        result.pixel_diameters becomes a view into the store.
+
+        Parameters
+        ----------
+        name : str
+            Image, e.g. path relative to the project
+        result : Result
+            Analysis result
+
+        Returns
+        -------
+        int
+            Row of the result
+        """
+
+        diameters = np.asarray(result.pixel_diameters, dtype=np.float32).ravel()
+
+        row = self.rows.get(name)
+        if row is None:
+            row = self._new_row(name)
+        else:
+            # The previous diameters of the row become dead space
+            self._live -= self._counts[row]
+            self._counts[row] = 0
+
+            if self._used - self._live > COMPACT_FRACTION * self._used:
+                self.compact()
+
+        start = self._used
+        self._buffer = self._grow(self._buffer, start + diameters.size)
+        self._buffer[start : start + diameters.size] = diameters
+        self._used += diameters.size
+        self._live += diameters.size
+
+        self.sample_names[row] = sample_name
+        self.pixel_size_units[row] = pixel_size_unit
+        self._pixel_average[row] = result.pixel_average
+        self._pixel_sdev[row] = result.pixel_sdev
+        self._pixel_size_value[row] = np.nan if pixel_size_value is None else pixel_size_value
+        self._starts[row] = start
+        self._counts[row] = diameters.size
+
+        result.bind(self, row)
+
+        return row
+
+    def diameters_of(self, row: int) -> np.ndarray:
+        """Pixel diameters of a row, a view into the store"""
+        start = self._starts[row]
+        return self._buffer[start : start + self._counts[row]]
+
+    def split_diameters(self) -> list:
+        """Pixel diameters of every row, views into the store, in row order"""
+
+        if self._used > self._live:
+            self.compact()
+
+        counts = self.counts
+        starts = self._starts[: len(self)]
+
+        # Rows are contiguous after compact(), but not necessarily in row order
+        if np.array_equal(starts, np.concatenate(([0], np.cumsum(counts)[:-1]))):
+            return np.split(self._buffer[: self._used], np.cumsum(counts)[:-1])
+
+        return [self.diameters_of(row) for row in range(len(self))]
+
+    @property
+    def pixel_average(self) -> np.ndarray:
+        return self._pixel_average[: len(self)]
+
+    @property
+    def pixel_sdev(self) -> np.ndarray:
+        return self._pixel_sdev[: len(self)]
+
+    @property
+    def pixel_size_value(self) -> np.ndarray:
+        return self._pixel_size_value[: len(self)]
+
+    @property
+    def counts(self) -> np.ndarray:
+        """Number of diameters of every row"""
+        return self._counts[: len(self)]
+
+    @property
+    def conversion_factor(self) -> np.ndarray:
+        return conversion_factors(self.pixel_size_value, self.pixel_size_units)
+
+    def compact(self):
+        """Drop replaced diameters and store the rows contiguously, in row order"""
+
+        counts = self.counts
+        buffer = np.empty(int(counts.sum()), dtype=np.float32)
+
+        starts = np.zeros(len(self), dtype=np.int64)
+        np.cumsum(counts[:-1], out=starts[1:])
+
+        for row, start in enumerate(starts):
+            buffer[start : start + counts[row]] = self.diameters_of(row)
+
+        self._buffer = buffer
+        self._used = self._live = buffer.size
+        self._starts[: len(self)] = starts
+
+    def summary(self, index=None) -> dict:
+        """Summary columns, as Project.analysis_summary
+
+        Parameters
+        ----------
+        index : list
+            File names of the rows to return, default: all rows in order.
+            File names without result get the defaults of an empty Result.
+
+        Returns
+        -------
+        dict
+            Column name: numpy.ndarray
+        """
+
+        if index is None:
+            rows = np.arange(len(self))
+        else:
+            rows = np.array([self.rows.get(name, -1) for name in index], dtype=np.int64)
+
+        found = rows >= 0
+        rows = rows[found]
+
+        def column(values, fill, dtype=None):
+            out = np.full(found.size, fill, dtype=dtype if dtype is not None else np.asarray(values).dtype)
+            out[found] = np.asarray(values, dtype=out.dtype)[rows]
+            return out
+
+        pixel_average = column(self.pixel_average, 0.0)
+        pixel_sdev = column(self.pixel_sdev, 0.0)
+        factor = column(self.conversion_factor, np.nan)
+
+        return {
+            "sample_name": column(self.sample_names, "", dtype=object),
+            "pixel_size_value": column(self.pixel_size_value, np.nan),
+            "pixel_size_unit": column(self.pixel_size_units, "", dtype=object),
+            "pixel_average": pixel_average,
+            "pixel_sdev": pixel_sdev,
+            "average": pixel_average * factor,
+            "sdev": pixel_sdev * factor,
+            "unit": np.full(found.size, UNIT, dtype=object),
+        }
+
+    def statistics(self, by="sample_name") -> pd.DataFrame:
+        """Statistics of all diameters, per sample (or per image)
+
+        Plain mean and standard deviation of the diameters, in pixels and
+        physical units, rather than the fitted distribution.
+
+        Parameters
+        ----------
+        by : str
+            "sample_name" or "name"
+
+        Returns
+        -------
+        pandas.DataFrame
+        """
+
+        counts = self.counts
+        starts = self._starts[: len(self)]
+        factor = self.conversion_factor
+
+        # Per row sums from the cumulative sums of the buffer
+        buffer = self._buffer[: self._used].astype(np.float64)
+        csum = np.concatenate(([0.0], np.cumsum(buffer)))
+        csum2 = np.concatenate(([0.0], np.cumsum(buffer**2)))
+
+        row_sum = csum[starts + counts] - csum[starts]
+        row_sum2 = csum2[starts + counts] - csum2[starts]
+
+        keys = self.sample_names if by == "sample_name" else self.names
+        groups, inverse = np.unique(np.asarray(keys, dtype=object).astype(str), return_inverse=True)
+
+        n = np.bincount(inverse, weights=counts, minlength=groups.size)
+        total = np.bincount(inverse, weights=row_sum, minlength=groups.size)
+        total2 = np.bincount(inverse, weights=row_sum2, minlength=groups.size)
+        total_unit = np.bincount(inverse, weights=row_sum * factor, minlength=groups.size)
+        total2_unit = np.bincount(inverse, weights=row_sum2 * factor**2, minlength=groups.size)
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = total / n
+            mean_unit = total_unit / n
+            std = np.sqrt(np.maximum(total2 / n - mean**2, 0))
+            std_unit = np.sqrt(np.maximum(total2_unit / n - mean_unit**2, 0))
+
+        return pd.DataFrame(
+            {
+                "images": np.bincount(inverse, minlength=groups.size),
+                "diameters": n.astype(np.int64),
+                "pixel_mean": mean,
+                "pixel_std": std,
+                "mean": mean_unit,
+                "std": std_unit,
+                "unit": UNIT,
+            },
+            index=pd.Index(groups, name=by),
+        )
@@ -0,0 +1,417 @@
+"""SIMPoly fibre diameter analysis in Python
+
+Port of the SIMPoly MATLAB method (see matlab/simpoly.m) to NumPy and SciPy.
+Every stage works on whole arrays, so no MATLAB Engine is required.
+"""
+
+import os
+import logging
+import numpy as np
+from scipy import ndimage, optimize
+
+from fibresem.analysis.contrast import adapthisteq, histeq
+from fibresem.analysis.distance import edt_at
+from fibresem.analysis.reconstruction import disk, imerode_disk, imreconstruct
+from fibresem.analysis.morphology import (
+    clean,
+    fill,
+    majority,
+    medfilt_converge,
+    thin,
+    thicken,
+    spur,
+    branchpoints,
+    bwareaopen,
+    imclose,
+)
+
+# SEM bar height as fraction of the image height (see matlab/semCrop.m)
+SEM_BAR_HEIGHT = 0.11
+
+# Maximum distance (px) between a skeleton pixel and the nearest edge
+MAX_EDGE_DISTANCE = 55
+
+# Tiled analysis of large images: core size and overlap of the tiles (px)
+TILE_SIZE = 2048
+TILE_HALO = 128
+
+# 8-connectivity structuring element
+EIGHT_CONNECTED = np.ones((3, 3), dtype=bool)
+
+
+def simpoly(
+    image,
+    optimise_for_thin_fibres=True,
+    max_edge_distance=MAX_EDGE_DISTANCE,
+    verbose=False,
+    output_path=None,
+    filename="image.png",
+    counts=None,
+) -> dict:
+    """Calculates fibre diameter distribution
+
+    Parameters
+    ----------
+    image : numpy.ndarray
+        Grayscale uint8 image of electrospun fibres
+    optimise_for_thin_fibres : bool
+        Skip the additional thinning and thickening of the binary image
+    max_edge_distance : float
+        Skeleton pixels further away from an edge (px) are discarded
+    verbose : bool
+        Log every stage of the analysis
+    output_path : str
+        If set, an overlay of the skeleton is saved to output_path/overlay
+    filename : str
+        File name of the overlay image
+    counts : numpy.ndarray
+        Precomputed 256-bin histogram of the image, e.g. of a previous run
+        on the same image, default: computed here
+
+    Returns
+    -------
+    dict
+        avgp : average diameter in pixels
+        sdevp : standard deviation in pixels
+        diameters : all fibre diameters (in pixels)
+    """
+
+    image = np.asarray(image)
+    if image.ndim == 3:
+        image = image[:, :, 0]
+    if image.size == 0:
+        return {"avgp": np.nan, "sdevp": np.nan, "diameters": np.zeros(0)}
+
+    ihist, bw, skel = segment(image, optimise_for_thin_fibres, max_edge_distance, verbose, counts=counts)
+
+    if output_path is not None:
+        save_overlay(ihist, bw, skel, output_path, filename)
+
+    if verbose:
+        logging.info("Calculate diameters")
+    diameters = skeleton_diameters(bw, skel)
+
+    avgp, sdevp = fit_distribution(diameters)
+
+    if verbose:
+        logging.info("Morphological Analysis Complete!")
+
+    return {"avgp": avgp, "sdevp": sdevp, "diameters": diameters}
+
+
+def segment(
+    image, optimise_for_thin_fibres=True, max_edge_distance=MAX_EDGE_DISTANCE, verbose=False, threshold=None,
+    counts=None,
+):
+    """Segment the fibres and find their skeleton
+
+    Parameters
+    ----------
+    image : numpy.ndarray
+        Grayscale uint8 image
+    threshold : float
+        Otsu threshold in [0, 1], default: Otsu threshold of counts
+    counts : numpy.ndarray
+        Precomputed 256-bin histogram of the image, default: computed here
+
+    Returns
+    -------
+    tuple
+        (ihist, bw, skel) contrast enhanced image, segmentation and skeleton
+    """
+
+    def log(msg):
+        if verbose:
+            logging.info(msg)
+
+    image = image.astype(np.uint8, copy=False)
+
+    if threshold is None:
+        threshold = graythresh(image) if counts is None else otsu(counts)
+
+    # Enhance contrast using histogram equalization
+    log("Enhance contrast")
+    ihist = histeq(adapthisteq(image))
+
+    # Erode the grayscale image and reconstruct
+    log("Erode Grayscale")
+    marker = imerode_disk(ihist, 5)
+
+    log("Morphological Reconstruction")
+    iobr = imreconstruct(marker, ihist)
+
+    # Find edges in intensity image, remove small objects
+    log("Find edges")
+    edges = canny(iobr, low=0.2, high=0.4)
+    edges = bwareaopen(edges, 20)
+    edges = thicken(edges, 1)
+
+    # Binarise with a global threshold and optimise
+    log("Create and optimise binary")
+    level = threshold + 0.1
+    bw = ihist > level * 255
+
+    bw = imclose(bw, disk(1))
+    bw = clean(bw, 100000)
+    bw = fill(bw, 5000)
+    bw = majority(bw, 500)
+
+    if not optimise_for_thin_fibres:
+        bw = thin(bw, 4)
+
+    # Median filter until the image no longer changes
+    log("Cleaning")
+    bw = medfilt_converge(bw)
+
+    # Skeletonise
+    log("Skeletonise")
+    if not optimise_for_thin_fibres:
+        bw = thicken(bw, 4)
+
+    skel = thin(bw, np.inf)
+
+    bp = ndimage.binary_dilation(branchpoints(skel), structure=disk(3))
+    skel = skel & ~bp
+    skel = spur(skel, 1)
+
+    # Remove skeleton segments at a large distance from an edge
+    log("Clean skeleton")
+    rows, cols = np.nonzero(skel)
+    far = edt_at(~edges, rows, cols, dtype=np.float32, max_distance=max_edge_distance) > max_edge_distance
+    skel[rows[far], cols[far]] = False
+
+    return ihist, bw, skel
+
+
+def skeleton_diameters(bw, skel):
+    """Diameters at the skeleton pixels, twice the distance to the background
+
+    Diameters are in column-major order, consistent with MATLAB's Dist(SK).
+    """
+    cols, rows = np.nonzero(skel.T)
+    return 2 * edt_at(bw, rows, cols)
+
+
+def tile_grid(height, width, tile_size=TILE_SIZE, halo=TILE_HALO):
+    """Tiles covering an image
+
+    Yields
+    ------
+    tuple
+        (core, outer) regions (y0, y1, x0, x1). The cores do not overlap,
+        the outer region adds a halo around the core, within the image.
+    """
+
+    for y0 in range(0, height, tile_size):
+        for x0 in range(0, width, tile_size):
+            y1, x1 = min(y0 + tile_size, height), min(x0 + tile_size, width)
+            yield (
+                (y0, y1, x0, x1),
+                (max(y0 - halo, 0), min(y1 + halo, height), max(x0 - halo, 0), min(x1 + halo, width)),
+            )
+
+
+def simpoly_tiled(
+    read,
+    shape,
+    tile_size=TILE_SIZE,
+    halo=TILE_HALO,
+    optimise_for_thin_fibres=True,
+    max_edge_distance=MAX_EDGE_DISTANCE,
+    verbose=False,
+    counts=None,
+) -> dict:
+    """Calculates fibre diameter distribution of a large image, tile by tile
+
+    Every tile is segmented with a halo of surrounding pixels, so that the
+    skeleton and distances near the tile border are those of the whole
+    image. Only diameters of skeleton pixels in the core of a tile are
+    counted, every fibre pixel at a seam is counted once. Memory use
+    depends on the tile size, not on the size of the image.
+
+    The Otsu threshold is computed from the histogram of the whole image,
+    the (adaptive) contrast enhancement is done per tile.
+
+    Parameters
+    ----------
+    read : callable
+        read(y0, y1, x0, x1) -> numpy.ndarray, grayscale region of the image,
+        e.g. readtif.RegionReader.read
+    shape : tuple
+        (height, width) of the image
+    tile_size : int
+        Size of the core of every tile (px)
+    halo : int
+        Overlap of the tiles (px), should be larger than the fibre radius
+        and max_edge_distance
+    counts : numpy.ndarray
+        Precomputed 256-bin histogram of the whole image, e.g. of a previous
+        run on the same image, default: computed in a first pass over the
+        tiles
+
+    Returns
+    -------
+    dict
+        avgp, sdevp and diameters, see simpoly
+    """
+
+    height, width = shape
+    tiles = list(tile_grid(height, width, tile_size, halo))
+
+    # Global threshold
+    if counts is None:
+        counts = np.zeros(256, dtype=np.int64)
+        for core, _ in tiles:
+            counts += np.bincount(read(*core).ravel(), minlength=256)[:256]
+    threshold = otsu(counts)
+
+    diameters = []
+
+    for i, ((y0, y1, x0, x1), outer) in enumerate(tiles):
+        if verbose:
+            logging.info(f"Tile {i + 1} of {len(tiles)}")
+
+        image = read(*outer)
+        _, bw, skel = segment(image, optimise_for_thin_fibres, max_edge_distance, False, threshold=threshold)
+
+        # Skeleton pixels in the core only
+        core = np.zeros_like(skel)
+        core[y0 - outer[0] : y1 - outer[0], x0 - outer[2] : x1 - outer[2]] = True
+
+        diameters.append(skeleton_diameters(bw, skel & core))
+
+    diameters = np.concatenate(diameters) if diameters else np.zeros(0)
+
+    avgp, sdevp = fit_distribution(diameters)
+
+    return {"avgp": avgp, "sdevp": sdevp, "diameters": diameters}
+
+
+def sem_crop(image, bar_height=SEM_BAR_HEIGHT):
+    """Remove the SEM meta bar, equivalent to semCrop(I, barHeight, false)"""
+    new_height = round(image.shape[0] * (1 - bar_height))
+    return image[0:new_height, :]
+
+
+def fit_distribution(diameters) -> tuple:
+    """Fit a single gaussian to the diameter histogram
+
+    Mirrors the gauss1 fit of simpoly.m, returns (average, sdev) in pixels.
+    """
+
+    if diameters.size < 2:
+        return (np.nan, np.nan)
+
+    counts, edges = np.histogram(diameters, bins="scott")
+
+    # Pad the histogram with two empty bins to the left
+    x = np.concatenate(([edges[0] - 2, edges[0] - 1], edges[:-1]))
+    y = np.concatenate(([0, 0], counts)).astype(np.double)
+
+    def gauss1(x, a1, b1, c1):
+        return a1 * np.exp(-(((x - b1) / c1) ** 2))
+
+    p0 = (y.max(), diameters.mean(), max(np.sqrt(2) * diameters.std(), 1e-3))
+
+    try:
+        (_, b1, c1), _ = optimize.curve_fit(gauss1, x, y, p0=p0, maxfev=10000)
+    except (RuntimeError, ValueError) as err:
+        logging.warning(f"Could not fit diameter distribution: {err}")
+        return (np.nan, np.nan)
+
+    return (b1, abs(c1) / 2)
+
+
+def save_overlay(ihist, bw, skel, output_path, filename):
+    """Save the skeleton (red) and the segmentation (cyan) on the image"""
+
+    import matplotlib.image  # pylint: disable=import-outside-toplevel
+
+    overlay = np.repeat(ihist[:, :, np.newaxis], 3, axis=2).astype(np.double)
+    overlay[bw] = 0.7 * overlay[bw] + 0.3 * np.array([0, 255, 255])
+    overlay[skel] = (255, 0, 0)
+
+    directory = os.path.join(output_path, "overlay")
+    os.makedirs(directory, exist_ok=True)
+
+    try:
+        matplotlib.image.imsave(
+            os.path.join(directory, filename), overlay.astype(np.uint8)
+        )
+    except OSError as err:
+        logging.warning(err)
+
+
+# Threshold
+
+
+def graythresh(image) -> float:
+    """Global threshold using Otsu's method, normalised to [0, 1]"""
+    return otsu(np.bincount(image.ravel(), minlength=256))
+
+
+def otsu(counts) -> float:
+    """Otsu threshold of a 256-bin histogram, normalised to [0, 1]"""
+
+    counts = np.asarray(counts, dtype=np.double)
+    p = counts / counts.sum()
+
+    omega = np.cumsum(p)
+    mu = np.cumsum(p * np.arange(256))
+    mu_t = mu[-1]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sigma_b = (mu_t * omega - mu) ** 2 / (omega * (1 - omega))
+
+    maxval = np.nanmax(sigma_b)
+    if not np.isfinite(maxval):
+        return 0.0
+
+    return np.mean(np.flatnonzero(sigma_b == maxval)) / 255
+
+
+def canny(image, low=0.2, high=0.4, sigma=np.sqrt(2)):
+    """Canny edge detector with thresholds relative to the maximum gradient"""
+
+    image = image.astype(np.double) / 255
+
+    # Gaussian and derivative of Gaussian kernels
+    n = 4 * np.ceil(sigma)
+    x = np.arange(-n, n + 1)
+    gauss = np.exp(-(x**2) / (2 * sigma**2))
+    gauss /= gauss.sum()
+
+    deriv = np.gradient(gauss)
+    deriv[deriv > 0] /= deriv[deriv > 0].sum()
+    deriv[deriv < 0] /= -deriv[deriv < 0].sum()
+
+    dx = ndimage.convolve1d(image, gauss, axis=0, mode="nearest")
+    dx = ndimage.convolve1d(dx, deriv, axis=1, mode="nearest")
+    dy = ndimage.convolve1d(image, gauss, axis=1, mode="nearest")
+    dy = ndimage.convolve1d(dy, deriv, axis=0, mode="nearest")
+
+    magnitude = np.hypot(dx, dy)
+    if magnitude.max() > 0:
+        magnitude /= magnitude.max()
+
+    # Non-maximum suppression along the gradient direction
+    with np.errstate(divide="ignore", invalid="ignore"):
+        uy = np.nan_to_num(dy / magnitude)
+        ux = np.nan_to_num(dx / magnitude)
+
+    rows, cols = np.indices(image.shape, dtype=np.double)
+    ahead = ndimage.map_coordinates(magnitude, (rows + uy, cols + ux), order=1, mode="nearest")
+    behind = ndimage.map_coordinates(magnitude, (rows - uy, cols - ux), order=1, mode="nearest")
+    maxima = (magnitude >= ahead) & (magnitude >= behind)
+
+    # Hysteresis thresholding
+    weak = maxima & (magnitude > low)
+    strong = maxima & (magnitude > high)
+
+    labels, num = ndimage.label(weak, structure=EIGHT_CONNECTED)
+    keep = np.zeros(num + 1, dtype=bool)
+    keep[labels[strong]] = True
+    keep[0] = False
+
+    return keep[labels]
+
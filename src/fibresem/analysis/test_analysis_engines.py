@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+""" """
+
+# Standard library modules.
+import os
+import array
+
+# Third party modules.
+import numpy as np
+import pytest
+
+# Local modules.
+from fibresem.analysis.analysis_engines import MatlabEngine
+from fibresem.analysis.fibreanalysis import Analysis
+
+# Globals and constants variables.
+
+
+class FakeMatlabArray:
+    """Column-major array, like matlab.double"""
+
+    def __init__(self, values):
+        self._data = array.array("d", values)
+
+
+def make_analysis(name):
+    analysis = Analysis.__new__(Analysis)
+    analysis.file_name = name
+    return analysis
+
+
+def test_parse_matlab_batch_result():
+    engine = MatlabEngine.__new__(MatlabEngine)
+    analyses = [make_analysis(f"{i}.tif") for i in range(3)]
+
+    matlab_result = {
+        "avgp": FakeMatlabArray([1.0, 2.0, 3.0]),
+        "sdevp": FakeMatlabArray([0.1, 0.2, 0.3]),
+        "counts": FakeMatlabArray([2, 0, 3]),
+        "diameters": FakeMatlabArray([1, 2, 3, 4, 5]),
+        "errors": ["", "", ""],
+    }
+
+    results = engine.parse_matlab_batch_result(analyses, matlab_result)
+
+    assert [result.pixel_average for result in results] == [1.0, 2.0, 3.0]
+    np.testing.assert_array_equal(results[0].pixel_diameters, [1, 2])
+    assert results[1].pixel_diameters.size == 0
+    np.testing.assert_array_equal(results[2].pixel_diameters, [3, 4, 5])
+
+
+def test_parse_matlab_batch_result_single_failed():
+    engine = MatlabEngine.__new__(MatlabEngine)
+
+    matlab_result = {
+        "avgp": float("nan"),
+        "sdevp": float("nan"),
+        "counts": 0.0,
+        "diameters": FakeMatlabArray([]),
+        "errors": "Could not read file",
+    }
+
+    assert engine.parse_matlab_batch_result([make_analysis("a.tif")], matlab_result) == [None]
+
+
+def test_to_ndarray():
+    # Scalars are returned as float
+    np.testing.assert_array_equal(MatlabEngine.to_ndarray(2.5), [2.5])
+
+    # Column-major data is viewed, not copied
+    matlab_array = FakeMatlabArray([1, 2, 3])
+    values = MatlabEngine.to_ndarray(matlab_array)
+    np.testing.assert_array_equal(values, [1, 2, 3])
+    assert np.shares_memory(values, np.frombuffer(matlab_array._data))
+
+
+def test_to_ndarray_buffer():
+    matlab_array = memoryview(np.asfortranarray([[1.0, 2.0, 3.0], [4.0, 5.0, 6.0]]))
+
+    np.testing.assert_array_equal(MatlabEngine.to_ndarray(matlab_array), [1, 4, 2, 5, 3, 6])
+
+
+def test_to_ndarray_nested_list():
+    # Neither buffer nor _data, e.g. a list of rows
+    np.testing.assert_array_equal(MatlabEngine.to_ndarray([[1.0, 2.0], [3.0, 4.0]]), [1, 2, 3, 4])
+
+
+def test_write_rawfile():
+    data = np.arange(3 * 5, dtype=np.uint8).reshape(3, 5)
+
+    path = MatlabEngine.write_rawfile(data)
+    try:
+        # simpoly.m maps the file as uint8 of size fliplr(rawsize) and transposes it
+        mapped = np.fromfile(path, dtype=np.uint8).reshape((5, 3), order="F")
+        np.testing.assert_array_equal(mapped.T, data)
+    finally:
+        os.remove(path)
+
+
+def test_read_resultfile():
+    diameters = np.array([1.5, 2.0, 12.25])
+
+    path = MatlabEngine.make_resultfile()
+    try:
+        assert os.path.getsize(path) == 0
+
+        # writeRaw.m: fwrite(fid, double(values(:)), 'double')
+        diameters.astype(np.float64).tofile(path)
+
+        np.testing.assert_array_equal(MatlabEngine.read_resultfile(path), diameters)
+    finally:
+        os.remove(path)
+
+
+class FakeMatlabModule:
+    """The matlab module, arrays are ndarrays"""
+
+    @staticmethod
+    def uint8(values):
+        return np.array(values, dtype=np.uint8)
+
+    @staticmethod
+    def double(values):
+        return np.array(values, dtype=np.float64)
+
+
+class FakeSimpolyEngine:
+    """Runs a stand-in for simpoly.m, handling rawfile and resultfile like it does"""
+
+    def __init__(self):
+        self.files = []
+
+    def simpoly(self, image, *args, nargout=1):
+        kwargs = dict(zip(args[::2], args[1::2]))
+
+        if kwargs["rawfile"]:
+            rows, cols = (int(size) for size in kwargs["rawsize"])
+            image = np.fromfile(kwargs["rawfile"], dtype=np.uint8).reshape((cols, rows), order="F").T
+            self.files.append(kwargs["rawfile"])
+
+        diameters = image.sum(axis=0).astype(np.float64)
+        result = {"avgp": float(image.mean()), "sdevp": 1.0, "diameters": FakeMatlabArray(diameters)}
+
+        if kwargs["resultfile"]:
+            diameters.tofile(kwargs["resultfile"])
+            result["diameters"] = FakeMatlabArray([])
+            self.files.append(kwargs["resultfile"])
+
+        return result
+
+
+@pytest.mark.parametrize("transfer", ["buffer", "rawfile"])
+def test_run_transfers_image(tmp_path, transfer):
+    engine = MatlabEngine.__new__(MatlabEngine)
+    engine.module = FakeMatlabModule
+    engine.engine = FakeSimpolyEngine()
+    engine.supports_buffer = True
+    engine.supports_result_buffer = True
+
+    data = np.arange(4 * 6, dtype=np.uint8).reshape(4, 6)
+
+    class Parent:
+        Data = data
+
+    analysis = make_analysis("a.tif")
+    analysis.parent = Parent
+    analysis.image_path = str(tmp_path / "a.tif")
+    analysis.output_path = str(tmp_path)
+    analysis.pixel_size_value = 10.0
+    analysis.pixel_size_unit = "nm"
+    analysis.params = {
+        "transfer": transfer,
+        "optimise_for_thin_fibres": True,
+        "max_edge_distance": 55.0,
+        "verbose": False,
+    }
+
+    result = engine.run(analysis, load_externally=False)
+
+    assert result.pixel_average == data.mean()
+    np.testing.assert_array_equal(result.pixel_diameters, data.sum(axis=0))
+
+    # The raw image and the result file are removed
+    assert len(engine.engine.files) == (2 if transfer == "rawfile" else 0)
+    assert not any(os.path.exists(file) for file in engine.engine.files)
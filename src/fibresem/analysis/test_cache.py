@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+""" """
+
+# Standard library modules.
+import os
+
+# Third party modules.
+import numpy as np
+
+# Local modules.
+from fibresem.analysis.cache import ResultCache
+
+# Globals and constants variables.
+
+
+def test_key_follows_content(tmp_path):
+    cache = ResultCache(tmp_path / "cache")
+    a = tmp_path / "a.tif"
+    b = tmp_path / "b.tif"
+    a.write_bytes(b"image")
+    b.write_bytes(b"image")
+
+    params = {"optimise_for_thin_fibres": True, "verbose": False}
+
+    assert cache.key(a, "simpoly-python", params) == cache.key(b, "simpoly-python", params)
+    assert cache.key(a, "simpoly-python", params) != cache.key(a, "simpoly-matlab", params)
+    assert cache.key(a, "simpoly-python", params) == cache.key(
+        a, "simpoly-python", {**params, "verbose": True}
+    )
+    assert cache.key(a, "simpoly-python", params) != cache.key(
+        a, "simpoly-python", {**params, "optimise_for_thin_fibres": False}
+    )
+
+
+def test_store_and_load(tmp_path, make_result):
+    cache = ResultCache(tmp_path)
+
+    cache.store("key", make_result())
+    result = cache.load("key")
+
+    assert result.pixel_average == 8.5
+    assert result.pixel_sdev == 1.5
+    np.testing.assert_array_equal(result.pixel_diameters, make_result().pixel_diameters)
+    assert cache.load("missing") is None
+
+
+def test_evicts_least_recently_used(tmp_path, make_result):
+    cache = ResultCache(tmp_path, max_size=1 << 40)
+
+    for i, key in enumerate(["a", "b", "c"]):
+        cache.store(key, make_result())
+        os.utime(tmp_path / f"{key}.npz", ns=(i * 10**9, i * 10**9))
+
+    # Use "a", so "b" is the least recently used
+    cache.load("a")
+
+    cache.max_size = 2 * os.path.getsize(tmp_path / "a.npz")
+    cache.evict()
+
+    assert cache.load("b") is None
+    assert cache.load("a") is not None
+    assert cache.load("c") is not None
+
+
+def test_store_evicts_over_max_size(tmp_path, make_result):
+    cache = ResultCache(tmp_path, max_size=1 << 40)
+    cache.store("a", make_result())
+    size = os.path.getsize(tmp_path / "a.npz")
+
+    cache.max_size = 2 * size
+    os.utime(tmp_path / "a.npz", ns=(0, 0))
+
+    # Replacing an entry does not add to the total
+    cache.store("b", make_result())
+    cache.store("b", make_result())
+    assert cache._size == 2 * size
+
+    cache.store("c", make_result())
+
+    assert sorted(os.listdir(tmp_path)) == ["b.npz", "c.npz"]
+    assert cache._size == 2 * size
+
+
+def test_load_removes_corrupt_entry(tmp_path):
+    cache = ResultCache(tmp_path)
+    (tmp_path / "bad.npz").write_bytes(b"not a zip file")
+
+    assert cache.load("bad") is None
+    assert not (tmp_path / "bad.npz").exists()
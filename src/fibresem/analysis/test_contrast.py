@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+""" """
+
+# Standard library modules.
+
+# Third party modules.
+import numpy as np
+
+# Local modules.
+from fibresem.analysis import contrast
+
+# Globals and constants variables.
+
+
+def test_tile_histograms():
+    bins = np.random.default_rng(0).integers(0, 16, (12, 20))
+
+    hists = contrast.tile_histograms(bins, (4, 5), (3, 4), num_bins=16)
+
+    for ty in range(3):
+        for tx in range(4):
+            tile = bins[ty * 4 : (ty + 1) * 4, tx * 5 : (tx + 1) * 5]
+            np.testing.assert_array_equal(hists[ty, tx], np.bincount(tile.ravel(), minlength=16))
+
+
+def test_adapthisteq():
+    rng = np.random.default_rng(0)
+    image = rng.normal(100, 10, (301, 419)).clip(0, 255).astype(np.uint8)
+    image[:, 200:] += 60
+
+    out = contrast.adapthisteq(image)
+
+    assert out.shape == image.shape and out.dtype == np.uint8
+    # Contrast is stretched within tiles, the global ordering is kept
+    assert np.ptp(out[:, :150]) > np.ptp(image[:, :150])
+    assert out[:, 250:].mean() > out[:, :150].mean()
+
+    # A uniform image stays uniform
+    assert np.unique(contrast.adapthisteq(np.full((64, 64), 77, dtype=np.uint8))).size == 1
+
+
+def test_clip_histogram():
+    rng = np.random.default_rng(0)
+    hists = rng.integers(0, 100, (3, 4, 64)) * (rng.random((3, 4, 64)) < 0.3)
+
+    clipped = contrast.clip_histogram(hists, 40)
+
+    # The excess is redistributed, no bin exceeds the limit
+    np.testing.assert_array_equal(clipped.sum(axis=-1), hists.sum(axis=-1))
+    assert clipped.max() <= 40
+
+    for ty in range(3):
+        for tx in range(4):
+            np.testing.assert_array_equal(contrast.clip_histogram(hists[ty, tx], 40), clipped[ty, tx])
+
+
+def test_histeq():
+    image = np.random.default_rng(0).integers(0, 256, (50, 60)).astype(np.uint8)
+
+    out = contrast.histeq(image)
+
+    assert out.dtype == np.uint8
+    assert np.unique(out).size <= 64
+
+
+def test_histeq_counts():
+    image = np.random.default_rng(0).integers(0, 256, (50, 60)).astype(np.uint8)
+    counts = np.bincount(image.ravel(), minlength=256)
+
+    np.testing.assert_array_equal(contrast.histeq(image, counts=counts), contrast.histeq(image))
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+""" """
+
+# Standard library modules.
+
+# Third party modules.
+import numpy as np
+import pytest
+from scipy import ndimage
+
+# Local modules.
+from fibresem.analysis import distance
+
+# Globals and constants variables.
+
+
+@pytest.mark.parametrize("shape, density", [((60, 75), 0.9), ((31, 17), 0.5), ((1, 9), 0.8), ((9, 1), 0.8)])
+def test_edt_exact(shape, density):
+    rng = np.random.default_rng(0)
+    bw = rng.random(shape) < density
+    bw[0, 0] = False
+    expected = ndimage.distance_transform_edt(bw)
+
+    np.testing.assert_array_equal(distance.edt(bw), expected)
+
+    result = distance.edt(bw, dtype=np.float32)
+    assert result.dtype == np.float32
+    np.testing.assert_allclose(result, expected, rtol=1e-6)
+
+    rows, cols = np.nonzero(rng.random(shape) < 0.3)
+    np.testing.assert_array_equal(distance.edt_at(bw, rows, cols), expected[rows, cols])
+
+
+def test_edt_at_max_distance():
+    bw = np.ones((50, 80), dtype=bool)
+    bw[25, 10] = False
+    expected = ndimage.distance_transform_edt(bw)
+
+    rows, cols = np.nonzero(bw)
+    result = distance.edt_at(bw, rows, cols, max_distance=20)
+
+    near = expected[rows, cols] <= 20
+    np.testing.assert_array_equal(result[near], expected[rows, cols][near])
+    assert (result[~near] > 20).all()
+
+
+def test_edt_without_background():
+    bw = np.ones((4, 5), dtype=bool)
+
+    assert np.isinf(distance.edt(bw)).all()
+    assert np.isinf(distance.edt_at(bw, [1], [2])).all()
+
+
+def test_edt_at_window():
+    rng = np.random.default_rng(1)
+    bw = rng.random((80, 90)) < 0.97
+    expected = ndimage.distance_transform_edt(bw)
+
+    # Queries in a corner, the column pass only covers their neighbourhood
+    rows, cols = np.nonzero(bw[:10, 70:])
+    cols = cols + 70
+    result = distance.edt_at(bw, rows, cols, max_distance=6)
+
+    near = expected[rows, cols] <= 6
+    np.testing.assert_array_equal(result[near], expected[rows, cols][near])
+    assert (result[~near] > 6).all()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+""" """
+
+# Standard library modules.
+import queue
+import threading
+
+# Third party modules.
+import pytest
+
+# Local modules.
+from fibresem.analysis import enginepool
+
+# Globals and constants variables.
+
+
+class FakeEngine:
+    def __init__(self):
+        self.commands = []
+
+    def eval(self, command, nargout=0):
+        self.commands.append(command)
+
+
+def make_pool(names):
+    """EnginePool with fake engines, without starting MATLAB"""
+    pool = enginepool.EnginePool.__new__(enginepool.EnginePool)
+    pool.size = len(names)
+    pool.free = queue.Queue()
+    pool.engines = {name: FakeEngine() for name in names}
+    for name in names:
+        pool.free.put(name)
+    return pool
+
+
+@pytest.fixture
+def server(tmp_path):
+    socket_path = str(tmp_path / "pool.sock")
+    server = enginepool._Server(socket_path, enginepool._RequestHandler)
+    server.pool = make_pool(["engine"])
+
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server, socket_path
+
+    server.shutdown()
+    server.server_close()
+
+
+def test_acquire_times_out(server):
+    server, socket_path = server
+
+    lease = enginepool.EngineLease(socket_path, timeout=1.0)
+    assert lease.name == "engine"
+
+    with pytest.raises(RuntimeError):
+        enginepool.EngineLease(socket_path, timeout=0.1)
+
+    lease.release()
+
+    # Released when the connection is closed, the session is cleared
+    lease = enginepool.EngineLease(socket_path, timeout=1.0)
+    assert lease.name == "engine"
+    assert server.pool.engines["engine"].commands == ["close all force", "clear variables", "clear global"]
+    lease.release()
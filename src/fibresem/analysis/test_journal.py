@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+""" """
+
+# Standard library modules.
+import os
+
+# Third party modules.
+import numpy as np
+
+# Local modules.
+from fibresem.analysis.journal import RunJournal
+
+# Globals and constants variables.
+PARAMS = {"optimise_for_thin_fibres": True, "max_edge_distance": 55.0, "verbose": False}
+
+
+def make_image(tmp_path, name):
+    path = tmp_path / name
+    path.write_bytes(b"image")
+    return str(path)
+
+
+def test_resume_restores_results(tmp_path, make_result):
+    a = make_image(tmp_path, "a.tif")
+    b = make_image(tmp_path, "b.tif")
+
+    journal = RunJournal(str(tmp_path), "simpoly-python", PARAMS)
+    journal.append("a.tif", a, make_result([1.0, 2.0]), pixel_size_value=np.float64(9.7), pixel_size_unit="nm")
+    journal.append("b.tif", b, make_result([3.0]))
+
+    resumed = RunJournal(str(tmp_path), "simpoly-python", {**PARAMS, "verbose": True}, resume=True)
+
+    assert len(resumed) == 2
+    result = resumed.load(resumed.lookup("a.tif", a))
+    assert result.pixel_average == 8.5
+    np.testing.assert_array_equal(result.pixel_diameters, [1.0, 2.0])
+    np.testing.assert_array_equal(resumed.load(resumed.lookup("b.tif", b)).pixel_diameters, [3.0])
+
+    # A new run starts a new journal
+    assert len(RunJournal(str(tmp_path), "simpoly-python", PARAMS)) == 0
+    assert len(RunJournal(str(tmp_path), "simpoly-python", PARAMS, resume=True)) == 0
+
+
+def test_resume_skips_changed_entries(tmp_path, make_result):
+    a = make_image(tmp_path, "a.tif")
+
+    journal = RunJournal(str(tmp_path), "simpoly-python", PARAMS)
+    journal.append("a.tif", a, make_result([1.0]))
+
+    assert len(RunJournal(str(tmp_path), "simpoly-matlab", PARAMS, resume=True)) == 0
+    assert len(RunJournal(str(tmp_path), "simpoly-python", {**PARAMS, "max_edge_distance": 30.0}, resume=True)) == 0
+
+    os.utime(a, ns=(0, 0))
+    assert RunJournal(str(tmp_path), "simpoly-python", PARAMS, resume=True).lookup("a.tif", a) is None
+
+
+def test_resume_after_interrupted_write(tmp_path, make_result):
+    a = make_image(tmp_path, "a.tif")
+    b = make_image(tmp_path, "b.tif")
+
+    journal = RunJournal(str(tmp_path), "simpoly-python", PARAMS)
+    journal.append("a.tif", a, make_result([1.0, 2.0]))
+
+    # Crash while appending b.tif
+    with open(journal.diameters_file, "ab") as fh:
+        fh.write(b"\x01\x02")
+    with open(journal.journal_file, "a", encoding="utf-8") as fh:
+        fh.write('{"name": "b.tif", "fi')
+
+    resumed = RunJournal(str(tmp_path), "simpoly-python", PARAMS, resume=True)
+    assert "a.tif" in resumed and "b.tif" not in resumed
+
+    resumed.append("b.tif", b, make_result([3.0]))
+
+    resumed = RunJournal(str(tmp_path), "simpoly-python", PARAMS, resume=True)
+    np.testing.assert_array_equal(resumed.load(resumed.lookup("a.tif", a)).pixel_diameters, [1.0, 2.0])
+    np.testing.assert_array_equal(resumed.load(resumed.lookup("b.tif", b)).pixel_diameters, [3.0])
+
+
+def test_remove(tmp_path, make_result):
+    a = make_image(tmp_path, "a.tif")
+
+    journal = RunJournal(str(tmp_path), "simpoly-python", PARAMS)
+    journal.append("sub/a.tif", a, make_result([1.0]))
+    journal.remove()
+
+    assert len(journal) == 0
+    assert not os.path.exists(journal.journal_file) and not os.path.exists(journal.diameters_file)
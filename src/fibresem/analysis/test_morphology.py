@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+""" """
+
+# Standard library modules.
+
+# Third party modules.
+import numpy as np
+import pytest
+from scipy import ndimage
+
+# Local modules.
+from fibresem.analysis import morphology
+
+# Globals and constants variables.
+
+
+def full_iterate(bw, luts, n):
+    """Reference: apply the tables to the whole image in every iteration"""
+    i = 0
+    while i < n:
+        new = bw
+        for lut in luts:
+            new = morphology.applylut(new, lut)
+        if np.array_equal(new, bw):
+            break
+        bw = new
+        i += 1
+    return bw
+
+
+@pytest.mark.parametrize("density", [0.3, 0.5, 0.7])
+@pytest.mark.parametrize("name", ["CLEAN", "FILL", "MAJORITY", "SPUR", "THIN"])
+def test_iterate_active_set(name, density):
+    bw = np.random.default_rng(0).random((120, 97)) < density
+    luts = getattr(morphology, name)
+    if not isinstance(luts, tuple):
+        luts = (luts,)
+
+    for n in (1, 3, np.inf):
+        np.testing.assert_array_equal(morphology.iterate(bw, luts, n), full_iterate(bw, luts, n))
+
+
+def test_lookup_tables():
+    bw = np.zeros((7, 7), dtype=bool)
+    bw[1, 1] = True
+    bw[3:6, 3:6] = True
+    bw[4, 4] = False
+
+    assert not morphology.clean(bw)[1, 1]
+    assert morphology.fill(bw)[4, 4]
+    assert morphology.medfilt(bw)[4, 4] and morphology.medfilt(bw).sum() == 5
+
+    skel = np.zeros((7, 7), dtype=bool)
+    skel[3, :] = True
+    skel[:3, 3] = True
+    assert np.argwhere(morphology.branchpoints(skel)).tolist() == [[3, 3]]
+    assert morphology.spur(skel, 1).sum() == skel.sum() - 3
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_medfilt_converge(seed):
+    rng = np.random.default_rng(seed)
+    bw = ndimage.uniform_filter(rng.random((200, 240)), 5) > 0.5
+    bw ^= rng.random(bw.shape) < 0.05
+
+    # Reference: filter the whole image until it is unchanged or repeats
+    previous, expected = None, bw
+    while True:
+        new = morphology.medfilt(expected)
+        if np.array_equal(new, expected) or np.array_equal(new, previous):
+            break
+        previous, expected = expected, new
+
+    result = morphology.medfilt_converge(bw)
+
+    np.testing.assert_array_equal(result, expected)
+    np.testing.assert_array_equal(morphology.medfilt(morphology.medfilt(result)), result)
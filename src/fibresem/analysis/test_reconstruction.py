@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+""" """
+
+# Standard library modules.
+
+# Third party modules.
+import numpy as np
+import pytest
+from scipy import ndimage
+
+# Local modules.
+from fibresem.analysis import reconstruction
+
+# Globals and constants variables.
+
+
+@pytest.mark.parametrize("radius", [0, 1, 3, 5, 8])
+def test_disk_rectangles(radius):
+    union = np.zeros((2 * radius + 1,) * 2, dtype=bool)
+    for h, w in reconstruction.disk_rectangles(radius):
+        union[radius - h : radius + h + 1, radius - w : radius + w + 1] = True
+
+    np.testing.assert_array_equal(union, reconstruction.disk(radius))
+
+
+@pytest.mark.parametrize("radius", [1, 3, 5])
+def test_imerode_disk(radius):
+    image = np.random.default_rng(0).integers(0, 256, (57, 43)).astype(np.uint8)
+    expected = ndimage.grey_erosion(image, footprint=reconstruction.disk(radius), mode="constant", cval=255)
+
+    np.testing.assert_array_equal(reconstruction.imerode_disk(image, radius), expected)
+
+
+@pytest.mark.parametrize("seed", [0, 1])
+def test_imreconstruct(seed):
+    rng = np.random.default_rng(seed)
+    mask = ndimage.uniform_filter(rng.integers(0, 256, (64, 80)).astype(np.uint8), 5)
+    marker = reconstruction.imerode_disk(mask, 3)
+
+    # Reference: dilate the marker under the mask until it is stable
+    expected = np.minimum(marker, mask)
+    while True:
+        dilated = np.minimum(ndimage.grey_dilation(expected, size=(3, 3)), mask)
+        if np.array_equal(dilated, expected):
+            break
+        expected = dilated
+
+    np.testing.assert_array_equal(reconstruction.imreconstruct(marker, mask), expected)
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+""" """
+
+# Standard library modules.
+import pickle
+
+# Third party modules.
+import numpy as np
+import pytest
+
+# Local modules.
+from fibresem.analysis.resultstore import ResultStore
+
+# Globals and constants variables.
+
+
+def test_add_binds_result(make_result):
+    store = ResultStore()
+    result = make_result([1.0, 2.0, 3.0])
+
+    row = store.add("a.tif", result, sample_name="a", pixel_size_value=2.0, pixel_size_unit="nm")
+
+    assert row == 0
+    assert result.store is store
+    assert result.pixel_diameters.dtype == np.float32
+    np.testing.assert_array_equal(result.pixel_diameters, [1.0, 2.0, 3.0])
+    assert store.conversion_factor[0] == pytest.approx(2e-3)
+
+
+def test_replace_and_compact(make_result):
+    store = ResultStore()
+    store.add("a.tif", make_result([1.0, 2.0]))
+    store.add("b.tif", make_result([3.0]))
+    store.add("a.tif", make_result([4.0, 5.0, 6.0]))
+
+    assert len(store) == 2
+    np.testing.assert_array_equal(store.counts, [3, 1])
+
+    store.compact()
+
+    assert store._used == 4
+    np.testing.assert_array_equal(store.diameters_of(0), [4.0, 5.0, 6.0])
+    np.testing.assert_array_equal(store.diameters_of(1), [3.0])
+
+
+def test_replace_keeps_buffer_bounded(make_result):
+    store = ResultStore()
+    store.add("b.tif", make_result(np.ones(100)))
+
+    for i in range(50):
+        store.add("a.tif", make_result(np.full(100, i)))
+
+    assert store._used <= 2 * 200
+    assert store._buffer.size <= 4 * 200
+    np.testing.assert_array_equal(store.diameters_of(store.rows["a.tif"]), np.full(100, 49))
+    np.testing.assert_array_equal(store.diameters_of(store.rows["b.tif"]), np.ones(100))
+
+
+def test_split_diameters(make_result):
+    store = ResultStore()
+    assert store.split_diameters() == []
+
+    store.add("a.tif", make_result([1.0, 2.0]))
+    store.add("b.tif", make_result([3.0]))
+    store.add("c.tif", make_result([]))
+    store.add("a.tif", make_result([4.0, 5.0, 6.0]))
+
+    diameters = store.split_diameters()
+
+    assert [d.tolist() for d in diameters] == [[4.0, 5.0, 6.0], [3.0], []]
+    assert all(np.shares_memory(d, store._buffer) for d in diameters if d.size)
+
+
+def test_summary_fills_missing_images(make_result):
+    store = ResultStore()
+    store.add("a.tif", make_result([1.0]), pixel_size_value=10.0, pixel_size_unit="nm")
+
+    summary = store.summary(["missing.tif", "a.tif"])
+
+    np.testing.assert_array_equal(summary["pixel_average"], [0.0, 8.5])
+    assert np.isnan(summary["average"][0])
+    assert summary["average"][1] == pytest.approx(8.5 * 10e-3)
+    assert summary["pixel_size_unit"][0] == ""
+
+
+def test_statistics_per_sample(make_result):
+    store = ResultStore()
+    store.add("a1.tif", make_result([1.0, 3.0]), sample_name="a", pixel_size_value=1.0, pixel_size_unit="um")
+    store.add("a2.tif", make_result([5.0]), sample_name="a", pixel_size_value=1.0, pixel_size_unit="um")
+    store.add("b1.tif", make_result([2.0, 2.0]), sample_name="b", pixel_size_value=1.0, pixel_size_unit="um")
+
+    stats = store.statistics()
+
+    assert list(stats["images"]) == [2, 1]
+    assert stats.loc["a", "pixel_mean"] == pytest.approx(3.0)
+    assert stats.loc["a", "pixel_std"] == pytest.approx(np.std([1.0, 3.0, 5.0]))
+    assert stats.loc["b", "std"] == pytest.approx(0.0)
+
+
+def test_pickle_detaches_result(make_result):
+    store = ResultStore()
+    result = make_result([1.0, 2.0])
+    store.add("a.tif", result)
+
+    restored = pickle.loads(pickle.dumps(result))
+
+    assert restored.store is None
+    np.testing.assert_array_equal(restored.pixel_diameters, [1.0, 2.0])
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+""" """
+
+# Standard library modules.
+
+# Third party modules.
+import numpy as np
+import pytest
+
+# Local modules.
+from fibresem.analysis import simpoly
+
+# Globals and constants variables.
+
+
+def fibre_image(width=10, size=400, seed=0):
+    """Synthetic SEM-like image with bright horizontal and vertical fibres"""
+    rng = np.random.default_rng(seed)
+    image = rng.normal(40, 8, (size, size))
+
+    for centre in range(40, size, 80):
+        lo, hi = centre - width // 2, centre - width // 2 + width
+        image[lo:hi, :] = rng.normal(200, 8, (width, size))
+        image[:, lo:hi] = rng.normal(200, 8, (size, width))
+
+    return image.clip(0, 255).astype(np.uint8)
+
+
+def test_thin_bar():
+    bw = np.zeros((20, 40), dtype=bool)
+    bw[8:13, 5:35] = True
+
+    skel = simpoly.thin(bw, np.inf)
+
+    assert skel.sum() > 20
+    assert skel.sum(axis=0).max() == 1
+
+
+def test_graythresh_bimodal():
+    image = np.zeros((10, 10), dtype=np.uint8)
+    image[:, 5:] = 200
+
+    level = simpoly.graythresh(image)
+
+    assert 0 <= level * 255 < 200
+
+
+def test_imreconstruct_single_peak():
+    mask = np.zeros((9, 9), dtype=np.uint8)
+    mask[2:7, 2:7] = 100
+    marker = np.zeros_like(mask)
+    marker[4, 4] = 50
+
+    rec = simpoly.imreconstruct(marker, mask)
+
+    assert (rec[2:7, 2:7] == 50).all()
+    assert rec.sum() == 25 * 50
+
+
+@pytest.mark.parametrize("width", [14, 20])
+def test_simpoly_fibre_width(width):
+    result = simpoly.simpoly(fibre_image(width))
+
+    assert result["diameters"].size > 0
+    assert result["avgp"] == pytest.approx(width, rel=0.1)
+
+
+def test_tile_grid_covers_image():
+    covered = np.zeros((300, 500), dtype=int)
+
+    for (y0, y1, x0, x1), (oy0, oy1, ox0, ox1) in simpoly.tile_grid(300, 500, tile_size=128, halo=16):
+        covered[y0:y1, x0:x1] += 1
+        assert oy0 <= y0 and oy1 >= y1 and ox0 <= x0 and ox1 >= x1
+
+    assert (covered == 1).all()
+
+
+def test_simpoly_tiled():
+    image = fibre_image(14)
+
+    def read(y0, y1, x0, x1):
+        return image[y0:y1, x0:x1]
+
+    expected = simpoly.simpoly(image)
+
+    # A single tile is the whole image
+    result = simpoly.simpoly_tiled(read, image.shape, tile_size=image.shape[0], halo=0)
+    np.testing.assert_array_equal(result["diameters"], expected["diameters"])
+
+    # The global histogram of a previous run is reused
+    counts = np.bincount(image.ravel(), minlength=256)
+    np.testing.assert_array_equal(simpoly.simpoly(image, counts=counts)["diameters"], expected["diameters"])
+
+    regions = []
+
+    def read_once(*region):
+        regions.append(region)
+        return read(*region)
+
+    result = simpoly.simpoly_tiled(read_once, image.shape, tile_size=200, halo=100, counts=counts)
+
+    # No first pass over the tiles for the threshold
+    assert len(regions) == len(list(simpoly.tile_grid(*image.shape, 200, 100)))
+    np.testing.assert_array_equal(
+        result["diameters"], simpoly.simpoly_tiled(read, image.shape, tile_size=200, halo=100)["diameters"]
+    )
+
+    # Fibres at the seams are counted once
+    result = simpoly.simpoly_tiled(read, image.shape, tile_size=200, halo=100)
+    assert result["diameters"].size == pytest.approx(expected["diameters"].size, rel=0.05)
+    assert result["avgp"] == pytest.approx(expected["avgp"], rel=0.05)
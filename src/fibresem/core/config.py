@@ -25,7 +25,9 @@ class Config(configparser.ConfigParser):
                 "sem_bar_height": 0.11,
                 "output_folder_name": "cropped",
                 "keep_in_memory": False,
+                "memmap": False,
                 "optimise_for_thin_fibres": True,
+                "max_edge_distance": 55,
                 "verbose": False,
             },
             "annotate": {
@@ -33,16 +35,32 @@ class Config(configparser.ConfigParser):
                 "add_samplename": True,
                 "samplename_separator": "_",
                 "samplename_parts": "0",
+                "renderer": "matplotlib",  # or "raster"
             },
             "crop": {
                 "ratio": 1.0,
                 "sem_bar_height": 0.11,
             },
             "analysis": {
-                "engine": "simpoly-matlab",
+                "engine": "simpoly-matlab",  # or "simpoly-python"
+                "batch_size": 1,  # images per engine call, files are loaded by the engine
+                "journal": False,  # append every result to a run journal, see diam --journal/--resume
+                "tile_size": 0,  # px, analyse large images tile by tile (python engine), 0: disabled
+                "tile_halo": 128,  # px, overlap of the tiles
+            },
+            "export": {
+                "diameters": "",  # "parquet" or "arrow", stream all diameters to a dataset
+                "diameters_folder_name": "diameters",
+            },
+            "cache": {
+                "enabled": True,
+                "path": "",  # default: user cache directory
+                "max_size_mb": 1024,
             },
             "simpoly-matlab-engine": {
                 "load_externally": True,
+                "transfer": "auto",  # "buffer" or "rawfile"
+                "parallel": True,  # batches use parfor, if available
                 "optimise_for_thin_fibres": True,
                 "verbose_image_output_path": "analysis",
             },
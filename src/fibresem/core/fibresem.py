@@ -1,7 +1,9 @@
 # External imports
 
 import os
+import fnmatch
 import logging
+import concurrent.futures
 
 import matplotlib.pyplot as plt
 import numpy as np
@@ -10,8 +12,13 @@ from fibresem.core.config import Config
 
 # Internal imports
 from fibresem.matplotlib_scalebar.scalebar import ScaleBar
-from fibresem.io import readtif
+from fibresem.io import readtif, fibredataset
+from fibresem.core import render
 from fibresem.analysis import fibreanalysis, analysis_engines
+from fibresem.analysis.cache import ResultCache
+from fibresem.analysis.resultstore import ResultStore
+from fibresem.analysis.journal import RunJournal
+from fibresem.helper import instrument
 
 # from lib.fibreanalysis import Analysis
 # from lib.fibreanalysis import Result
@@ -37,7 +44,96 @@ def printtoarr():
 """
 
 
-def get_file_list_on_path(path: str, filterExtension="") -> list:
+def matches(relpath: str, patterns) -> bool:
+    """Path relative to the root matches any glob pattern
+
+    Patterns without a slash are also matched against the file name.
+    """
+
+    name = relpath.rsplit("/", 1)[-1]
+
+    for pattern in patterns:
+        if fnmatch.fnmatch(relpath, pattern):
+            return True
+        if "/" not in pattern and fnmatch.fnmatch(name, pattern):
+            return True
+
+    return False
+
+
+def iter_files_on_path(path: str, extension="", recursive=False, include=None, exclude=None):
+    """Yields paths of files in path, while the directories are being scanned
+
+    Uses os.scandir: file types are taken from the directory entries, no
+    file is stat-ed on file systems that report them (e.g. ext4, NFS).
+    Entries are yielded in order of name, per directory.
+
+    Parameters
+    ----------
+    path : str
+        Root path to look in
+    extension : str or tuple
+        File path extension filter, not case-sensitive, e.g. ".tif"
+    recursive : bool
+        Include subdirectories
+    include : list
+        Glob patterns of files to include, e.g. ["PU.088*"], relative to path
+    exclude : list
+        Glob patterns of files and directories to exclude, e.g. ["*/raw/*"]
+
+    Yields
+    ------
+    str
+        Path to a file
+    """
+
+    if isinstance(extension, str):
+        extension = (extension,)
+    extension = tuple(ext.lower() for ext in extension)
+
+    include = list(include or [])
+    exclude = list(exclude or [])
+
+    # Directories to scan: (path, path relative to root)
+    stack = [(os.path.abspath(path), "")]
+
+    while stack:
+        directory, reldir = stack.pop()
+
+        try:
+            with os.scandir(directory) as it:
+                entries = sorted(it, key=lambda entry: entry.name)
+        except OSError as err:
+            if not reldir:
+                raise
+            logging.warning(f"Could not scan {directory}: {err}")
+            continue
+
+        subdirectories = []
+
+        for entry in entries:
+            relpath = f"{reldir}/{entry.name}" if reldir else entry.name
+
+            if exclude and matches(relpath, exclude):
+                continue
+
+            try:
+                if entry.is_file():
+                    if not entry.name.lower().endswith(extension):
+                        continue
+                    if include and not matches(relpath, include):
+                        continue
+                    yield entry.path
+                elif recursive and entry.is_dir(follow_symlinks=False):
+                    subdirectories.append((entry.path, relpath))
+            except OSError:
+                continue
+
+        # Depth-first, in order of name
+        stack.extend(reversed(subdirectories))
+
+
+def get_file_list_on_path(path: str, filterExtension="", recursive=False, include=None, exclude=None) -> list:
     """Returns list of files in path
     
     Parameters
@@ -46,6 +142,8 @@ def get_file_list_on_path(path: str, filterExtension="") -> list:
         Root path to look in
     filterExtension : str
         File path extension filter, default = ".tif"
+    recursive, include, exclude
+        See iter_files_on_path
 
     Returns
     -------
@@ -53,22 +151,81 @@ def get_file_list_on_path(path: str, filterExtension="") -> list:
         List of strings, each a path to a file with the provided file extension
     """
 
-    fileList = []
-
-    # Get absolute path
-    path = os.path.abspath(path)
-
-    # Get list of all files
     try:
-        for item in os.listdir(path):
-            if os.path.isfile(os.path.join(path, item)):
-                if item.endswith(filterExtension):
-                    fileList.append(os.path.join(path, item))
+        return list(iter_files_on_path(path, filterExtension, recursive, include, exclude))
     except OSError as e:
         logging.warning("File path not found.")
         print(e)
+        return []
+
+
+# Engine handler, project and result cache of a worker process,
+# see Project.iter_diameter_analysis
+_worker_engine_handler = None
+_worker_project = None
+_worker_cache = None
+
+
+def _init_worker(engine_name: str, project_path: str, config: Config, trace=False, trace_memory=False):
+    """Start the engine of a worker process and set up its project and cache"""
+    global _worker_engine_handler, _worker_project, _worker_cache  # pylint: disable=global-statement
+
+    instrument.init_worker(trace, trace_memory)
+
+    _worker_engine_handler = analysis_engines.create_engine(engine_name)
+    _worker_project = Project(path=project_path, config=config)
+    _worker_cache = ResultCache.from_config(config)
+
+
+def _run_diameter_analysis_in_worker(image_path: str):
+    """Run diameter analysis of a single image in a worker process
+
+    Returns
+    -------
+    tuple
+        (Analysis, list) analysis detached from its image, or None if the
+        analysis failed, and the spans recorded by the worker
+    """
+
+    if _worker_engine_handler is None or not _worker_engine_handler.is_running:
+        logging.warning("Engine is not running in worker process.")
+        return None, instrument.collect()
 
-    return fileList
+    # The results are returned to the main process, do not keep them
+    _worker_project.results = ResultStore()
+
+    config = _worker_project.config
+    image = Image(_worker_project, image_path)
+
+    if not image.run_diameter_analysis(
+        engine_handler=_worker_engine_handler,
+        load_externally=config.getboolean("simpoly-matlab-engine", "load_externally"),
+        config=config,
+        cache=_worker_cache,
+    ):
+        return None, instrument.collect()
+
+    return image.Analysis, instrument.collect()
+
+
+def _annotate_in_worker(image_path: str, project_path: str, config: Config) -> tuple:
+    """Crop and annotate a single image with the raster renderer
+
+    Returns
+    -------
+    tuple
+        (bool, list) success and the spans recorded by the worker
+    """
+
+    image = Image(Project(path=project_path, config=config), image_path)
+
+    success = bool(image.annotate(
+        add_scalebar=config.getboolean("annotate", "add_scalebar"),
+        add_sample_name=config.getboolean("annotate", "add_samplename"),
+        renderer="raster",
+    ))
+
+    return success, instrument.collect()
 
 
 class Project:
@@ -84,10 +241,18 @@ class Project:
         List of file paths
     Images : list
         List of refs to Image objects
+    Metadata : pandas.DataFrame
+        Table of image metadata, see scan_metadata
+    results : ResultStore
+        Analysis results of all images
     config : Config
         Ref to Config configuration object
-    engine_handler : MatlabEngine
-        
+    engine_handler : EngineHandler
+        Ref to the analysis engine, e.g. MatlabEngine or PythonEngine
+    diameter_dataset : DiameterDatasetWriter
+        Writes the diameters of every analysed image, None if disabled
+    journal : RunJournal
+        Journal of the current diameter analysis run, None if disabled
     """
 
     def __init__(self, path=".", config=Config()):
@@ -102,11 +267,15 @@ class Project:
         self.Path = path
         self.FileList = list()
         self.Images = list()
+        self.Metadata = None
+        self.results = ResultStore()
 
         self.config = config
 
         self.engine_handler = None
-
+        self.result_cache = None
+        self.diameter_dataset = None
+        self.journal = None
 
     def __len__(self):
         """Override len(), return number of images.
@@ -132,13 +301,39 @@ class Project:
         self.engine_handler = analysis_engines.MatlabEngine()
         return self.engine_handler.is_running
 
-    def add_images(self, extension=".tif") -> bool:
+    def append_engine(self, name=None) -> bool:
+        """Starts and appends analysis engine
+
+        Parameters
+        ----------
+        name : str
+            Engine name, e.g. "simpoly-matlab" or "simpoly-python".
+            Default: engine set in config [analysis]
+
+        Returns
+        -------
+        bool
+            Status of the engine
+        """
+
+        if name is None:
+            name = self.config.get("analysis", "engine")
+
+        self.engine_handler = analysis_engines.create_engine(name)
+        if self.engine_handler is None:
+            return False
+
+        return self.engine_handler.is_running
+
+    def add_images(self, extension=".tif", recursive=False, include=None, exclude=None) -> bool:
         """Get a list of all images on project path and add those images to the project
         
         Parameter
         ---------
         extension : str
             File path extension filter
+        recursive, include, exclude
+            See iter_files_on_path
 
         Returns
         -------
@@ -150,22 +345,121 @@ class Project:
 
         print(f"- Input Path: {self.Path}")
 
-        # Set self.FileList
-        if not self.getFileList(self.Path, extension):
+        found = 0
+
+        try:
+            with instrument.span("discover"):
+                for _ in self.discover_images(extension, recursive, include, exclude):
+                    found += 1
+        except OSError as e:
+            logging.warning("File path not found.")
+            print(e)
+            return False
+
+        if not found:
             logging.warning("No files were found on path.")
             return False
 
-        for imagefilepath in self.FileList:
-            img = Image(self, imagefilepath)
-            self.Images.append(img)
+        return True
 
-            print(f"-- {img.Filename}")
+    def discover_images(self, extension=".tif", recursive=False, include=None, exclude=None):
+        """Add the images on the project path, while the path is being scanned
 
-        return True
+        Parameter
+        ---------
+        extension : str
+            File path extension filter
+        recursive, include, exclude
+            See iter_files_on_path
+
+        Yields
+        ------
+        Image
+            Added image, the next images are discovered when the next one is requested
+        """
+
+        # Results and outputs are stored by file name
+        filenames = {image.Filename for image in self.Images}
+
+        for path in iter_files_on_path(self.Path, extension, recursive, include, exclude):
+            image = self.add_image(path)
+
+            if image.Filename in filenames:
+                logging.warning(f"Images in different folders have the same file name {image.Filename}, their outputs overwrite each other.")
+            filenames.add(image.Filename)
+
+            yield image
+
+    def add_image(self, path: str):
+        """Add a single image to the project, e.g. a new image in the project folder
+
+        Returns
+        -------
+        Image
+        """
+
+        img = Image(self, path)
+
+        self.FileList.append(path)
+        self.Images.append(img)
+
+        print(f"-- {img.Filename}")
+
+        return img
+
+    def scan_metadata(self, workers=8) -> pd.DataFrame:
+        """Read the metadata of all images, without decoding pixel data
+
+        Sets Image.Meta of every image and self.Metadata.
+
+        Parameters
+        ----------
+        workers : int
+            Number of threads reading file headers
+
+        Returns
+        -------
+        pandas.DataFrame
+            Table with one row per image, indexed by file name
+        """
+
+        logging.info(f"Reading metadata of {len(self.Images)} images.")
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            loaded = list(executor.map(lambda img: img.loadMeta(), self.Images))
+
+        rows = []
+        for image, success in zip(self.Images, loaded):
+            if not success:
+                continue
+
+            meta = image.Meta
+            zeiss = meta["image"]
+
+            rows.append({
+                "filename": image.Filename,
+                "sample_name": image.sample_name,
+                "width": meta.get("ImageWidth"),
+                "height": meta.get("ImageLength"),
+                "bits_per_sample": meta.get("BitsPerSample"),
+                "compression": meta.get("Compression"),
+                "pixel_size_value": meta["Pixel Size Value"],
+                "pixel_size_unit": meta["Pixel Size Unit"],
+                "mag": zeiss.get("Mag"),
+                "eht": zeiss.get("EHT"),
+                "wd": zeiss.get("WD"),
+                "detector": zeiss.get("Detector"),
+            })
+
+        self.Metadata = pd.DataFrame(rows)
+        if rows:
+            self.Metadata = self.Metadata.set_index("filename")
+
+        return self.Metadata
 
     def getFileList(self, path=".", extension=".tif") -> bool:
         """Set self.FileList
-        
+
         Parameters
         ----------
         path : str
@@ -189,45 +483,374 @@ class Project:
 
         return False
 
-    def run_diameter_analysis(self, method="matlab", verbose=False):
+    def run_diameter_analysis(self, method="matlab", verbose=False, workers=1, resume=False):
         """Runs fibre diameter analysis on every image
         
         Parameters
         ----------
         method : str
-            Default = "matlab" until porting to python has been completed
+            Default = "matlab", the engine itself is set in config [analysis]
         verbose : bool
             Verbosity of the engine
+        workers : int
+            Number of worker processes, each running its own engine.
+            Default = 1, analyse sequentially with self.engine_handler
+        resume : bool
+            Skip images analysed by a previous run, see open_journal
+        """
+
+        images = self.open_journal(resume)
+        number_of_images = len(images)
+
+        if not images:
+            logging.info("All images have been analysed already.")
+            self.close_journal()
+            return
+
+        if workers > 1:
+            logging.info(f"Starting diameter analysis with {workers} workers.")
+            for i, image in enumerate(self.iter_diameter_analysis(workers, images)):
+                logging.info(f"Analysed {i + 1:02d} of {number_of_images:d}: {image.Filename}")
+            self.close_journal()
+            return
+
+        if not self.prepare_diameter_analysis():
+            return
+
+        logging.info(f"Starting diameter analysis ({self.engine_handler.name}).")
+        logging.info(
+            "Diameter analysis parameter 'optimise_for_thin_fibres' = %s", self.config.get('general', 'optimise_for_thin_fibres')
+        )
+
+        try:
+            batch_size = self.config.getint("analysis", "batch_size")
+            if batch_size > 1:
+                self.run_batched_diameter_analysis(batch_size, images)
+            else:
+                # Run diameter analysis on every image
+                for i, image in enumerate(images):
+                    msg = f"Analyzing {i + 1:02d} of {number_of_images + 1:d}: {image.Filename}"
+                    logging.info(msg)
+
+                    image.run_diameter_analysis(
+                        method=method,
+                        engine_handler=self.engine_handler,
+                        load_externally=self.config.getboolean("simpoly-matlab-engine", "load_externally"),
+                        config=self.config,
+                        verbose=verbose,
+                        cache=self.result_cache,
+                    )
+        finally:
+            self.close_engine()
+
+        self.close_journal()
+
+    def run_batched_diameter_analysis(self, batch_size: int, images=None):
+        """Runs fibre diameter analysis with one engine call per batch of images
+
+        The engine loads the image files itself, see EngineHandler.run_batch.
+
+        Parameters
+        ----------
+        batch_size : int
+            Number of images per engine call
+        images : list
+            Images to analyse, default: all images
         """
 
-        number_of_images = len(self.Images)
+        if images is None:
+            images = self.Images
+
+        all_images = images
+        number_of_images = len(all_images)
+
+        for start in range(0, number_of_images, batch_size):
+            images = all_images[start : start + batch_size]
+
+            logging.info(
+                f"Analyzing {start + 1:02d}-{start + len(images):02d} of {number_of_images:d}"
+            )
+
+            analyses = [
+                image.create_analysis(engine_handler=self.engine_handler, config=self.config)
+                for image in images
+            ]
+
+            fibreanalysis.start_batch(
+                [analysis for analysis in analyses if analysis is not None],
+                cache=self.result_cache,
+            )
+
+            for image in images:
+                self.store_result(image)
+                image.unloadImage()
+
+    def prepare_diameter_analysis(self) -> bool:
+        """Make sure the engine and the result cache are set up
+
+        Returns
+        -------
+        bool
+            Engine is running
+        """
 
         # Check if engine handler is set up
         if self.engine_handler is None:
             logging.warning("Engine Handler not defined.")
 
             # Append engine and start engine (if necessary)
-            if not self.append_matlabengine():
+            if not self.append_engine():
                 logging.warning("Engine Handler could not be appended to project. Aborting Diameter Analysis")
-                return
+                return False
+
+        if self.result_cache is None:
+            self.result_cache = ResultCache.from_config(self.config)
+
+        self.open_diameter_dataset()
+
+        return True
+
+    def close_engine(self):
+        """Stop or release the engine, e.g. return a pooled MATLAB engine to the pool
+
+        The engine is started again by the next diameter analysis.
+        """
+
+        if self.engine_handler is not None:
+            self.engine_handler.close()
+            self.engine_handler = None
+
+    def open_journal(self, resume=False) -> list:
+        """Start the run journal, if resume or enabled in config [analysis] journal
+
+        Every analysed image is appended to the journal in the project
+        folder. If resume, the results of the images in the journal of a
+        previous run are restored instead of starting a new journal.
+
+        Returns
+        -------
+        list
+            Images that still have to be analysed
+        """
+
+        self.journal = None
+
+        if not resume and not self.config.getboolean("analysis", "journal"):
+            return list(self.Images)
+
+        try:
+            self.journal = RunJournal(
+                self.Path,
+                self.config.get("analysis", "engine"),
+                fibreanalysis.analysis_params(self.config),
+                resume=resume,
+            )
+        except OSError as err:
+            logging.warning(f"Could not open run journal: {err}")
+            return list(self.Images)
+
+        if not resume:
+            return list(self.Images)
+
+        pending = [image for image in self.Images if not self.restore_result(image)]
+
+        # Images discovered later are restored as they are processed
+        if not self.Images:
+            return pending
 
-        logging.info("Starting diameter analysis.")
         logging.info(
-            "Diameter analysis parameter 'optimise_for_thin_fibres' = %s", self.config.get('general', 'optimise_for_thin_fibres')
+            f"Resuming diameter analysis: {len(self.Images) - len(pending)} of "
+            f"{len(self.Images)} images restored from the run journal."
         )
 
-        # Run diameter analysis on every image
-        for i, image in enumerate(self.Images):
-            msg = f"Analyzing {i + 1:02d} of {number_of_images + 1:d}: {image.Filename}"
-            logging.info(msg)
-
-            image.run_diameter_analysis(
-                method=method,
-                engine_handler=self.engine_handler,
-                load_externally=True,
-                config=self.config,
-                verbose=verbose
-            )
+        return pending
+
+    def close_journal(self):
+        """End the run journal, its files are removed if every image has a result
+
+        A journal is only kept for a run that has to be resumed.
+        """
+
+        if self.journal is None:
+            return
+
+        if all(image.Analysis is not None and image.Analysis.result is not None for image in self.Images):
+            try:
+                self.journal.remove()
+            except OSError as err:
+                logging.warning(f"Could not remove run journal: {err}")
+
+        self.journal = None
+
+    def restore_result(self, image) -> bool:
+        """Restore the result of the image from the run journal
+
+        Returns
+        -------
+        bool
+            The image is in the journal and has not changed since
+        """
+
+        entry = self.journal.lookup(image.relative_path, image.Path)
+        if entry is None:
+            return False
+
+        analysis = image.create_analysis(engine_handler=self.engine_handler, config=self.config)
+        if analysis is None:
+            return False
+
+        try:
+            analysis.set_result(self.journal.load(entry))
+        except (OSError, ValueError) as err:
+            logging.warning(f"Could not restore result of {image.Filename}: {err}")
+            image.Analysis = None
+            return False
+
+        self.store_result(image, restored=True)
+
+        return True
+
+    def open_diameter_dataset(self) -> bool:
+        """Set up the diameter dataset export, see config [export] diameters
+
+        Returns
+        -------
+        bool
+            Diameters are exported
+        """
+
+        dataset_format = self.config.get("export", "diameters")
+        if not dataset_format:
+            self.diameter_dataset = None
+            return False
+
+        output_path = os.path.join(self.Path, self.config.get("export", "diameters_folder_name"))
+
+        dataset = self.diameter_dataset
+        if dataset is not None and dataset.path == output_path and dataset.format == dataset_format:
+            return True
+
+        try:
+            self.diameter_dataset = fibredataset.DiameterDatasetWriter(output_path, format=dataset_format)
+        except ModuleNotFoundError:
+            logging.error("Pyarrow module not found, diameters are not exported.")
+            print("Please install pyarrow: python -m pip install pyarrow")
+            self.diameter_dataset = None
+            return False
+        except (ValueError, OSError) as err:
+            logging.error("Could not export diameters")
+            print(err)
+            self.diameter_dataset = None
+            return False
+
+        logging.info(f"Exporting diameters to {output_path}")
+
+        return True
+
+    def iter_diameter_analysis(self, workers=None, images=None):
+        """Runs fibre diameter analysis on a pool of worker processes
+
+        Every worker starts its own engine once and analyses images until
+        the pool is exhausted.
+
+        Parameters
+        ----------
+        workers : int
+            Number of worker processes, default: number of CPUs
+        images : list
+            Images to analyse, default: all images
+
+        Yields
+        ------
+        Image
+            Analysed image, in order of completion
+        """
+
+        engine_name = self.config.get("analysis", "engine")
+
+        if images is None:
+            images = self.Images
+
+        self.open_diameter_dataset()
+
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(engine_name, self.Path, self.config, instrument.is_enabled(), instrument.traces_memory()),
+        ) as executor:
+            futures = {
+                executor.submit(_run_diameter_analysis_in_worker, image.Path): image
+                for image in images
+            }
+
+            for future in concurrent.futures.as_completed(futures):
+                image = futures[future]
+
+                try:
+                    analysis, events = future.result()
+                    instrument.merge(events)
+                except Exception as err:
+                    logging.error(f"Diameter analysis failed for {image.Filename}")
+                    print(err)
+                    continue
+
+                if analysis is None:
+                    continue
+
+                analysis.parent = image
+                image.Analysis = analysis
+                self.store_result(image)
+
+                yield image
+
+    def annotate_images(self, renderer=None, workers=1):
+        """Crop and annotate every image
+
+        Parameters
+        ----------
+        renderer : str
+            "matplotlib" or "raster", default: renderer set in config [annotate]
+        workers : int
+            Number of worker processes, only used by the raster renderer.
+            Default = 1, annotate sequentially
+        """
+
+        if renderer is None:
+            renderer = self.config.get("annotate", "renderer")
+
+        add_scalebar = self.config.getboolean("annotate", "add_scalebar")
+        add_sample_name = self.config.getboolean("annotate", "add_samplename")
+
+        # pyplot is not thread or process safe, annotate sequentially
+        if renderer != "raster" or workers <= 1:
+            for image in self.Images:
+                image.annotate(add_scalebar, add_sample_name, renderer=renderer)
+            return
+
+        logging.info(f"Annotating with {workers} workers.")
+
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=instrument.init_worker,
+            initargs=(instrument.is_enabled(), instrument.traces_memory()),
+        ) as executor:
+            futures = {
+                executor.submit(_annotate_in_worker, image.Path, self.Path, self.config): image
+                for image in self.Images
+            }
+
+            for future in concurrent.futures.as_completed(futures):
+                image = futures[future]
+
+                try:
+                    _, events = future.result()
+                    instrument.merge(events)
+                except Exception as err:
+                    logging.error(f"Could not annotate {image.Filename}")
+                    print(err)
+                    continue
+
+                logging.info(f"Annotated {image.Filename}")
 
     def print_analysis_summary(self):
         """Get summary of analysis results"""
@@ -241,34 +864,84 @@ class Project:
                 # No analysis
                 print("")
 
-    def analysis_summary(self):
-        """Summarise results in dict"""
+    def store_result(self, image, restored=False) -> bool:
+        """Add the analysis result of the image to self.results
+
+        New results are appended to the run journal and the diameter dataset.
+
+        Parameters
+        ----------
+        restored : bool
+            The result has been restored from the run journal, it has been
+            journaled and exported by a previous run
+
+        Returns
+        -------
+        bool
+            The image has a result
+        """
 
-        variables = ["pixel_size_value","pixel_size_unit","pixel_average","pixel_sdev","average","sdev","unit"]
+        analysis = image.Analysis
+        if analysis is None or analysis.result is None:
+            return False
+
+        if analysis.result.store is self.results:
+            return True
 
-        index = [img.Filename for img in self.Images]
+        row = self.results.add(
+            image.relative_path,
+            analysis.result,
+            sample_name=image.sample_name,
+            pixel_size_value=analysis.pixel_size_value,
+            pixel_size_unit=analysis.pixel_size_unit,
+        )
+
+        if restored:
+            return True
 
-        # Initialise dict
-        data = {"sample_name": []}
-        for var in variables:
-            data[var] = []
+        if self.journal is not None:
+            try:
+                self.journal.append(
+                    image.relative_path,
+                    image.Path,
+                    analysis.result,
+                    pixel_size_value=analysis.pixel_size_value,
+                    pixel_size_unit=analysis.pixel_size_unit,
+                )
+            except OSError as err:
+                logging.error(f"Could not append {image.Filename} to the run journal")
+                print(err)
+
+        # Stream the diameters to the dataset, while the image is processed
+        if self.diameter_dataset is not None:
+            try:
+                with instrument.span("export", image=image.Filename):
+                    self.diameter_dataset.write(
+                        image.Filename,
+                        image.sample_name,
+                        self.results.diameters_of(row),
+                        analysis.result.conversion_factor,
+                        analysis.result.unit,
+                    )
+            except OSError as err:
+                logging.error(f"Could not export diameters of {image.Filename}")
+                print(err)
 
-        # Fill dict
-        for img in self.Images:
-            data["sample_name"].append(img.sample_name)
+        return True
 
-            # Create empty result dataclass as fallback
-            result = fibreanalysis.Result()
+    def analysis_summary(self):
+        """Summarise the results in self.results in dict of columns, see ResultStore.summary
 
-            # Retrieve result
-            if img.Analysis is not None:
-                if img.Analysis.result is not None:
-                    result = img.Analysis.result
+        Results are added to the store as they are produced, see store_result.
 
-            for var in variables:
-                data[var].append(getattr(result, var))
+        Returns
+        -------
+        tuple
+            (index, data) paths of the analysed images relative to the
+            project and their summary columns, one row per analysed image
+        """
 
-        return (index, data)
+        return (list(self.results.names), self.results.summary())
 
     def export_mat(self):
         """Quick function to export to MATLAB (.mat) file"""
@@ -293,36 +966,27 @@ class Project:
             ("diameters", "O"),
         ]
 
-        num_images = len(self.Images)
+        index, data = self.analysis_summary()
 
-        arr = np.zeros((num_images,), dtype=dtypes)
+        arr = np.zeros((len(index),), dtype=dtypes)
 
-        for i, image in enumerate(self.Images):
+        for name in ("pixel_size_value", "pixel_average", "pixel_sdev", "average", "sdev"):
+            arr[name] = data[name]
 
-            # If no analysis has been performed, skip
-            if image.Analysis is None:
-                continue
+        arr["sample_name"] = np.char.encode(data["sample_name"].astype(str), "utf-8")
+        arr["pixel_size_unit"] = data["pixel_size_unit"].astype(str)
+        arr["unit"] = data["unit"].astype(str)
+
+        # Diameters per image (a cell per image), exported as double like before
+        factors = self.results.conversion_factor
+        for row, pixel_diameters in enumerate(self.results.split_diameters()):
+            pixel_diameters = pixel_diameters.astype(np.float64)
+            arr[row]["pixel_diameters"] = pixel_diameters
+            arr[row]["diameters"] = pixel_diameters * factors[row]
 
-            # Store analysis data
-            arr[i]["sample_name"] = image.sample_name
-            arr[i]["pixel_size_value"] = image.Analysis.pixel_size_value
-            arr[i]["pixel_average"] = image.Analysis.result.pixel_average
-            arr[i]["pixel_sdev"] = image.Analysis.result.pixel_sdev
-            arr[i]["average"] = image.Analysis.result.average
-            arr[i]["sdev"] = image.Analysis.result.sdev
-            arr[i]["pixel_diameters"] = image.Analysis.result.pixel_diameters
-            arr[i]["diameters"] = image.Analysis.result.diameters
-
-            # Make sure we can handle µm
-            try:
-                arr[i]["pixel_size_unit"] = image.Analysis.pixel_size_unit
-                arr[i]["unit"] = image.Analysis.result.unit
-            except UnicodeEncodeError:
-                arr[i]["unit"] = image.Analysis.result.unit.encode("utf-8")
-                arr[i]["pixel_size_unit"] = image.Analysis.pixel_size_unit.encode("utf-8")
-                
         output_path = os.path.join(self.Path, "export.mat")
-        sio.savemat(output_path, {"results": arr})
+        with instrument.span("export"):
+            sio.savemat(output_path, {"results": arr})
 
         logging.info("Saved .mat file")
 
@@ -338,7 +1002,8 @@ class Project:
         logging.info(f"Exporting analysis to {output_path}")
 
         try:
-            df.to_excel(output_path, "Fibre Analysis")
+            with instrument.span("export"):
+                df.to_excel(output_path, "Fibre Analysis")
         except Exception as err:
             logging.error("Could not export fibre analysis")
             print(err)
@@ -361,6 +1026,8 @@ class Image:
         Grayscale image data as 2D array
     Meta : dict
         Image meta information
+    Crop : str
+        Crop applied to Data: None (as read from file), "square" or "sem_bar"
     Analysis : Analysis
         Ref to image analysis
     """
@@ -370,12 +1037,18 @@ class Image:
         self.Path = filepath
         self.Data = None
         self.Meta = None
+        self.Crop = None
         self.Analysis = None
 
     @property
     def Filename(self) -> str:
         return os.path.split(self.Path)[-1]
 
+    @property
+    def relative_path(self) -> str:
+        """Path relative to the project folder, with forward slashes"""
+        return os.path.relpath(self.Path, self.Project.Path).replace(os.sep, "/")
+
     @property
     def Name(self) -> str:
         return os.path.splitext(self.Filename)[0]
@@ -389,11 +1062,22 @@ class Image:
     def sample_name(self) -> str:
         return self.Name.split("_")[0]
 
-    def loadImage(self) -> bool:
-        """Load actual image from file"""
+    def loadImage(self, memmap=None) -> bool:
+        """Load actual image from file
+
+        Parameters
+        ----------
+        memmap : bool
+            Map uncompressed images into memory (read-only) instead of
+            reading them. Default: config [general] memmap
+        """
+
+        if memmap is None:
+            memmap = self.Project.config.getboolean("general", "memmap")
 
         try:
-            tifimg, tags = readtif.importtif(self.Path)
+            with instrument.span("load", image=self.Filename):
+                tifimg, tags = readtif.importtif(self.Path, memmap=memmap)
         except Exception as err:
             logging.error(f"Could not load {self.Filename}")
             print(err)
@@ -401,12 +1085,29 @@ class Image:
 
         self.Data = tifimg
         self.Meta = tags
+        self.Crop = None
+
+        return True
+
+    def loadMeta(self) -> bool:
+        """Load image metadata from the file header, without the pixel data"""
+
+        try:
+            with instrument.span("load", image=self.Filename):
+                tags = readtif.readmeta(self.Path)
+        except Exception as err:
+            logging.error(f"Could not read metadata of {self.Filename}")
+            print(err)
+            return False
+
+        self.Meta = tags
 
         return True
 
     def unloadImage(self):
         self.Data = None
         self.Meta = None
+        self.Crop = None
 
     def crop_square(self, copy=False, barheight=SEM_BAR_HEIGHT):
         """Crop to Square and omit the SEM meta bar
@@ -427,7 +1128,8 @@ class Image:
         right = self.Data.shape[1] - left
 
         try:
-            cropped_image = self.Data[0:newHeight, left:right]
+            with instrument.span("crop", image=self.Filename):
+                cropped_image = self.Data[0:newHeight, left:right]
         except Exception as err:
             logging.error(f"Could not crop {self.Filename}")
             print(err)
@@ -437,13 +1139,43 @@ class Image:
             return cropped_image
 
         self.Data = cropped_image
+        self.Crop = "square"
+        return True
+
+    def crop_sem_bar(self, copy=False, barheight=SEM_BAR_HEIGHT):
+        """Omit the SEM meta bar, keep the full width
+
+        Parameters
+        ----------
+        copy : bool
+            If set to false, cropping will replace self.Data,
+            if set to true, cropping will output a view of self.Data
+        barheight : int
+            Height of SEM meta bar
+        """
+
+        with instrument.span("crop", image=self.Filename):
+            newHeight = round(self.Data.shape[0] * (1 - barheight))
+            cropped_image = self.Data[0:newHeight, :]
+
+        if copy:
+            return cropped_image
+
+        self.Data = cropped_image
+        self.Crop = "sem_bar"
         return True
 
-    def annotate(self, add_scalebar=True, add_sample_name=True):
+    def annotate(self, add_scalebar=True, add_sample_name=True, renderer="matplotlib"):
         """
         Add annotations to image:
         - a scalebar in the lower right corner
         - sample name in the lower left corner
+
+        Parameters
+        ----------
+        renderer : str
+            "matplotlib": draw a matplotlib figure,
+            "raster": burn annotations into the image array, see render.py
         """
 
         logging.info(f"Annotating {self.Filename}")
@@ -454,36 +1186,46 @@ class Image:
                 return None  # No image loaded
 
         # Crop image
-        if not self.crop_square():
+        if self.Crop != "square" and not self.crop_square():
             return None
 
         img = self.Data
 
+        if renderer == "raster":
+            self.save_raster(add_scalebar, add_sample_name)
+
+            if not KEEP_IN_MEMORY:
+                self.unloadImage()
+
+            return True
+
         # Suppress Matplotlib debug output
         logging.getLogger("matplotlib.font_manager").disabled = True
 
         # Turn interactive plotting off
         plt.ioff()
 
-        # Create Matplotlib figure
-        f = plt.figure(
-            figsize=(img.shape[1] / 300, img.shape[0] / 300)
-        )  # figure with correct aspect ratio
-        ax = plt.axes((0, 0, 1, 1))  # axes over whole figure
-        ax.imshow(img, cmap="gray", vmin=0, vmax=255)
-        ax.axis("off")
+        with instrument.span("render", image=self.Filename):
+            # Create Matplotlib figure
+            f = plt.figure(
+                figsize=(img.shape[1] / 300, img.shape[0] / 300)
+            )  # figure with correct aspect ratio
+            ax = plt.axes((0, 0, 1, 1))  # axes over whole figure
+            ax.imshow(img, cmap="gray", vmin=0, vmax=255)
+            ax.axis("off")
 
-        # Add annotations
-        if add_scalebar:
-            logging.debug("-- Adding scalebar, pixelsize = {}".format(self.Meta["Pixel Size"]))
-            self.add_scalebar(ax)
+            # Add annotations
+            if add_scalebar:
+                logging.debug("-- Adding scalebar, pixelsize = {}".format(self.Meta["Pixel Size"]))
+                self.add_scalebar(ax)
 
-        if add_sample_name:
-            logging.debug("-- Adding sample name")
-            self.add_sample_name(ax)
+            if add_sample_name:
+                logging.debug("-- Adding sample name")
+                self.add_sample_name(ax)
 
         # Save figure
-        self.save_figure(plt)
+        with instrument.span("save", image=self.Filename):
+            self.save_figure(plt)
 
         # Unload image to save memory
         if not KEEP_IN_MEMORY:
@@ -491,12 +1233,12 @@ class Image:
 
         return True
 
-    def add_scalebar(self, figure_axes):
-        if self.Meta["Pixel Size"] == "NaN":
-            logging.warning("Could not read pixel size. Scalebar is not added.")
-            return None
+    @property
+    def has_pixel_size(self) -> bool:
+        return self.Meta["Pixel Size"] != "NaN" and self.Meta["Pixel Size Unit"] is not None
 
-        if self.Meta["Pixel Size Unit"] is None:
+    def add_scalebar(self, figure_axes):
+        if not self.has_pixel_size:
             logging.warning("Could not read pixel size. Scalebar is not added.")
             return None
 
@@ -524,12 +1266,16 @@ class Image:
         # Add to figure
         figure_axes.add_artist(scalebar)
 
+    @property
+    def annotation_name(self) -> str:
+        samplenameParts = self.Name.split("_")
+        return " ".join(samplenameParts[0:1])
+
     def add_sample_name(self, figure_axes):
         dynFontSize = round(0.013 * self.Data.shape[0])
 
         # Add sample name in lower left corner
-        samplenameParts = self.Name.split("_")
-        string = " ".join(samplenameParts[0:1])
+        string = self.annotation_name
 
         figure_axes.text(
             0.05 * self.Data.shape[0],  # x coordinate text
@@ -539,20 +1285,25 @@ class Image:
             size=dynFontSize * 0.7,  # size
         )
 
-    def save_figure(self, figureplot) -> bool:
-        """Write figure to file"""
+    def output_file_path(self) -> str:
+        """Path of the annotated .png image, creates the output folder"""
 
         outputFolderName = OUTPUT_FOLDER_NAME
-        plt = figureplot
 
         outputDirectory = os.path.join(self.Project.Path, outputFolderName)
-        if not os.path.exists(outputDirectory):
-            os.mkdir(outputDirectory)
+        os.makedirs(outputDirectory, exist_ok=True)
 
         outputFile = self.Name + ".png"
-        targetPath = os.path.join(outputDirectory, outputFile)
+        return os.path.join(outputDirectory, outputFile)
+
+    def save_figure(self, figureplot) -> bool:
+        """Write figure to file"""
+
+        plt = figureplot
+
+        targetPath = self.output_file_path()
 
-        logging.debug(f"-- Writing output to: {outputFile}")
+        logging.debug(f"-- Writing output to: {os.path.basename(targetPath)}")
         
         try:
             plt.savefig(targetPath, bbox_inches="tight", pad_inches=0, dpi=300)
@@ -565,30 +1316,119 @@ class Image:
 
         return True
 
-    def run_diameter_analysis(
-        self, load_externally=False, method="matlab", engine_handler=None, config=None, verbose=False
-    ) -> bool:
-        """Runs diameter analysis"""
+    def save_raster(self, add_scalebar=True, add_sample_name=True) -> bool:
+        """Burn annotations into the image data and write to file"""
 
-        # Make sure image is loaded
-        if self.Data is None:
-            if not self.loadImage():
-                return False
+        pixel_size_value = pixel_size_unit = sample_name = None
 
-        # Make sure everything is loaded for the image analysis
-        if method == "matlab":
-            if engine_handler is None:
-                logging.warning("Tried to run diameter analysis without engine handler.")
-                return False
+        if add_scalebar:
+            if self.has_pixel_size:
+                logging.debug("-- Adding scalebar, pixelsize = {}".format(self.Meta["Pixel Size"]))
+                pixel_size_value = self.Meta["Pixel Size Value"]
+                pixel_size_unit = self.Meta["Pixel Size Unit"]
+            else:
+                logging.warning("Could not read pixel size. Scalebar is not added.")
+
+        if add_sample_name:
+            logging.debug("-- Adding sample name")
+            sample_name = self.annotation_name
+
+        with instrument.span("render", image=self.Filename):
+            img = render.render_annotations(
+                self.Data, pixel_size_value, pixel_size_unit, sample_name
+            )
+
+        targetPath = self.output_file_path()
+
+        logging.debug(f"-- Writing output to: {os.path.basename(targetPath)}")
+
+        try:
+            with instrument.span("save", image=self.Filename):
+                render.write_png(targetPath, img)
+        except OSError as err:
+            logging.warning(err)
+            return False
+
+        logging.debug("-- Output written")
+
+        return True
+
+    def create_analysis(self, engine_handler, config=None) -> fibreanalysis.Analysis:
+        """Set up the analysis of this image, without starting it
+
+        Loads the metadata if necessary.
+
+        Returns
+        -------
+        Analysis
+            self.Analysis, or None if the metadata could not be loaded
+        """
+
+        if self.Meta is None:
+            if not self.loadMeta():
+                return None
 
-        # Do analysis
         self.Analysis = fibreanalysis.Analysis(
             self,
             engine_handler=engine_handler,
             output_path=os.path.join(self.Project.Path, "output"),
             config=config,
         )
-        self.Analysis.start(load_externally=load_externally)
+
+        return self.Analysis
+
+    def run_diameter_analysis(
+        self, load_externally=False, method="matlab", engine_handler=None, config=None, verbose=False,
+        cache=None
+    ) -> bool:
+        """Runs diameter analysis
+
+        If the image is loaded externally by the engine, only the metadata
+        is read. Otherwise, the SEM bar is removed from the image as read
+        from file, like the engine would do.
+        The result cache is only used if the analysed data is read from the
+        file, not for data that has been cropped differently in memory. It is
+        looked up before the image is decoded.
+        """
+
+        if engine_handler is None:
+            logging.warning("Tried to run diameter analysis without engine handler.")
+            return False
+
+        # A cached result of the file skips decoding the image
+        if cache is not None and self.Data is None:
+            if self.create_analysis(engine_handler, config) is None:
+                return False
+
+            with instrument.span("analysis", image=self.Filename):
+                cached = self.Analysis.load_cached(cache)
+
+            if cached:
+                self.Project.store_result(self)
+                self.unloadImage()
+                return True
+
+        # Make sure image (or its metadata) is loaded
+        if load_externally:
+            if self.Meta is None:
+                if not self.loadMeta():
+                    return False
+        else:
+            if self.Data is None:
+                if not self.loadImage():
+                    return False
+
+            if self.Crop is None:
+                self.crop_sem_bar()
+            elif self.Crop != "sem_bar":
+                cache = None
+
+        # Do analysis
+        self.create_analysis(engine_handler, config)
+        with instrument.span("analysis", image=self.Filename):
+            self.Analysis.start(load_externally=load_externally, cache=cache)
+
+        self.Project.store_result(self)
 
         # Free up memory
         self.unloadImage()
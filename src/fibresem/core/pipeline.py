@@ -0,0 +1,274 @@
+"""Streaming pipeline
+
+Runs chained commands image by image: every image is decoded once and
+flows through all chained stages while it is in memory. The next images
+are decoded in background threads, overlapping file I/O with the stages.
+
+Commands take part in streaming by providing a Stage; commands without one
+(e.g. rename) act as a barrier and run over the whole project.
+
+The same stages run on images as they appear in the project folder, see
+run_watching.
+"""
+
+import time
+import logging
+import concurrent.futures
+from collections import deque
+from collections.abc import Sized
+from dataclasses import dataclass
+from typing import Callable
+
+# Number of images decoded ahead of the current image
+DEFAULT_PREFETCH = 2
+
+# Minimum seconds between updates of the exports while watching
+DEFAULT_EXPORT_INTERVAL = 60
+
+
+@dataclass
+class Stage:
+    """Per-image part of a chained command
+
+    Attributes
+    ----------
+    run : callable
+        run(project, image), processes a single loaded image
+    setup : callable
+        setup(project) -> bool, called once before the first image.
+        If it returns False, the stage is skipped
+    finish : callable
+        finish(project), called once after the last image
+    update : callable
+        update(project), called now and then while images keep coming in,
+        see run_watching, e.g. to export the results so far
+    """
+
+    run: Callable
+    setup: Callable = None
+    finish: Callable = None
+    update: Callable = None
+
+
+def get_stage(processor) -> Stage:
+    """Return the Stage of a command processor, None if it can't stream"""
+    return getattr(processor, "stage", None)
+
+
+def iter_loaded_images(images, prefetch=DEFAULT_PREFETCH):
+    """Yield images in order, loaded by a pool of prefetching threads
+
+    At most prefetch + 1 images are held in memory at the same time.
+
+    Yields
+    ------
+    (Image, bool)
+        Image and whether it was loaded successfully
+    """
+
+    images = iter(images)
+    pending = deque()
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(prefetch, 1)) as executor:
+
+        def submit_next():
+            image = next(images, None)
+            if image is not None:
+                pending.append((image, executor.submit(image.loadImage)))
+
+        for _ in range(prefetch + 1):
+            submit_next()
+
+        while pending:
+            image, future = pending.popleft()
+            loaded = future.result()
+
+            yield image, loaded
+
+            submit_next()
+
+
+def setup_stages(project, stages) -> list:
+    """Set up stages, returns the stages that are not skipped"""
+    return [stage for stage in stages if stage.setup is None or stage.setup(project)]
+
+
+def process_images(project, stages, images, prefetch=DEFAULT_PREFETCH):
+    """Run set up stages on images, image by image
+
+    Every stage gets the image as read from file: data cropped or unloaded
+    by a stage is restored before the next stage.
+
+    Parameters
+    ----------
+    images : iterable
+        Images to process, e.g. a list or Project.discover_images
+    """
+
+    number_of_images = f" of {len(images):d}" if isinstance(images, Sized) else ""
+
+    for i, (image, loaded) in enumerate(iter_loaded_images(images, prefetch)):
+        if not loaded:
+            continue
+
+        logging.info(f"Processing {i + 1:02d}{number_of_images}: {image.Filename}")
+
+        data, meta = image.Data, image.Meta
+
+        for stage in stages:
+            stage.run(project, image)
+
+            # Restore image as read from file
+            image.Data, image.Meta, image.Crop = data, meta, None
+
+        image.unloadImage()
+
+
+def finish_stages(project, stages):
+    for stage in stages:
+        if stage.finish is not None:
+            stage.finish(project)
+
+
+def update_stages(project, stages):
+    for stage in stages:
+        if stage.update is not None:
+            stage.update(project)
+
+
+def run_stages(project, stages, prefetch=DEFAULT_PREFETCH, images=None):
+    """Run stages on all images of the project, image by image
+
+    Parameters
+    ----------
+    images : iterable
+        Images to process, default: project.Images
+    """
+
+    if images is None:
+        images = project.Images
+
+    stages = setup_stages(project, stages)
+    process_images(project, stages, images, prefetch)
+    finish_stages(project, stages)
+
+
+def run_streaming(project, processors, prefetch=DEFAULT_PREFETCH, images=None):
+    """Run chained command processors, streaming consecutive stages
+
+    Parameters
+    ----------
+    project : Project
+        Project to process
+    processors : list
+        Command processors, processor(project) -> project
+    prefetch : int
+        Number of images decoded ahead
+    images : iterable
+        Images added to the project while they are processed, e.g.
+        Project.discover_images. The first stages process every image as it
+        is found; a barrier first waits for all images.
+
+    Returns
+    -------
+    Project
+    """
+
+    stages = []
+
+    for processor in processors:
+        stage = get_stage(processor)
+
+        if stage is not None:
+            stages.append(stage)
+            continue
+
+        # Barrier: finish the streamed stages, then run over the whole project
+        if stages:
+            run_stages(project, stages, prefetch, images)
+            stages = []
+        elif images is not None:
+            deque(images, maxlen=0)
+
+        images = None
+        project = processor(project)
+
+    if stages:
+        run_stages(project, stages, prefetch, images)
+    elif images is not None:
+        deque(images, maxlen=0)
+
+    return project
+
+
+def run_watching(
+    project, processors, watcher, prefetch=DEFAULT_PREFETCH, process_existing=True, idle_timeout=None,
+    export_interval=DEFAULT_EXPORT_INTERVAL,
+):
+    """Run chained command processors on every new image in the project folder
+
+    The stages are set up once (e.g. the analysis engine is started once)
+    and run on every batch of new images reported by the watcher. Exports
+    of the whole project (e.g. the summary) are rewritten by Stage.update
+    at most every export_interval seconds, not after every batch, and by
+    Stage.finish when watching stops. Per image outputs, e.g. the diameter
+    dataset, are written by the stages as every image is processed.
+
+    Parameters
+    ----------
+    project : Project
+        Project to process, new images are added to it
+    processors : list
+        Command processors, all of them must provide a Stage
+    watcher : FolderWatcher
+        Reports new, completely written images
+    process_existing : bool
+        Process the images already in the project first
+    idle_timeout : float
+        Stop after this many seconds without new images, default: never
+    export_interval : float
+        Minimum seconds between updates of the exports
+
+    Returns
+    -------
+    Project
+    """
+
+    stages = []
+    for processor in processors:
+        stage = get_stage(processor)
+        if stage is None:
+            logging.error(f"Command {processor.__qualname__.split('.')[0]} can't be run on new images.")
+            return project
+        stages.append(stage)
+
+    stages = setup_stages(project, stages)
+
+    # New results since the last update of the exports
+    changed = False
+    last_update = time.monotonic()
+
+    try:
+        if process_existing and project.Images:
+            process_images(project, stages, project.Images, prefetch)
+            changed = True
+
+        logging.info(f"Watching {watcher.path} for new images ({watcher.backend}).")
+
+        for paths in watcher.watch(idle_timeout=idle_timeout, yield_empty=True):
+            if paths:
+                images = [project.add_image(path) for path in paths]
+
+                logging.info(f"{len(images)} new image(s): {', '.join(image.Filename for image in images)}")
+
+                process_images(project, stages, images, prefetch)
+                changed = True
+
+            if changed and time.monotonic() - last_update >= export_interval:
+                update_stages(project, stages)
+                changed = False
+                last_update = time.monotonic()
+    finally:
+        finish_stages(project, stages)
+
+    return project
@@ -0,0 +1,214 @@
+"""Raster renderer
+
+Burns the annotations (scalebar and sample name) directly into the image
+array and encodes the PNG with Pillow. No pyplot figure is drawn, so images
+can be rendered concurrently in threads or processes.
+
+The layout follows Image.annotate, which renders the figure at 300 dpi.
+Its tight bounding box can be a pixel smaller than the image, and shift the
+image by a pixel; the raster output is cropped the same way, see
+figure_geometry.
+"""
+
+import os
+import math
+import functools
+import numpy as np
+from PIL import Image as PILImage, ImageDraw, ImageFont
+import matplotlib
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.transforms import Bbox
+
+try:
+    from matplotlib import _tight_bbox as tight_bbox
+except ImportError:  # matplotlib < 3.6
+    from matplotlib import tight_bbox
+
+from fibresem.matplotlib_scalebar.scalebar import ScaleBar
+
+# Resolution of the matplotlib output of Image.annotate
+DPI = 300
+
+# Font size (pt) the scalebar paddings refer to, matplotlib's 'medium'
+LEGEND_FONT_SIZE = 10
+
+FONT_DIRECTORY = os.path.join(matplotlib.get_data_path(), "fonts", "ttf")
+
+WHITE = 255
+
+
+def points_to_pixels(points: float) -> float:
+    """Convert font points to pixels at DPI"""
+    return points * DPI / 72
+
+
+def load_font(size_px: float, bold=False) -> ImageFont.FreeTypeFont:
+    """Load DejaVu Sans, the default matplotlib font"""
+    name = "DejaVuSans-Bold.ttf" if bold else "DejaVuSans.ttf"
+    return ImageFont.truetype(os.path.join(FONT_DIRECTORY, name), round(size_px))
+
+
+def scalebar_length(pixel_size_value: float, pixel_size_unit: str, length_px: float) -> tuple:
+    """Length (px) and label of a scalebar with a preferred value
+
+    Uses the same rounding to preferred values as the ScaleBar artist.
+    """
+
+    scalebar = ScaleBar(pixel_size_value, pixel_size_unit)
+    length_px, value, units = scalebar._calculate_best_length(length_px)  # pylint: disable=protected-access
+    label = scalebar.scale_formatter(value, scalebar.dimension.to_latex(units))
+
+    return length_px, label
+
+
+def draw_scalebar(draw: ImageDraw.ImageDraw, shape: tuple, pixel_size_value: float, pixel_size_unit: str):
+    """Draw a scalebar with its label in the lower right corner"""
+
+    height, width = shape
+
+    # Dynamic sizes, see Image.add_scalebar
+    border_pad = 0.001 * height
+    font = load_font(points_to_pixels(round(0.013 * height)), bold=True)
+    sep = points_to_pixels(0.2)
+    pad = 0.2
+
+    length, label = scalebar_length(pixel_size_value, pixel_size_unit, 0.25 * width)
+    bar_height = 0.022 * height
+
+    label_width = font.getlength(label)
+    _, descent = font.getmetrics()
+
+    # Anchor the box in the lower right corner, bar and label centered
+    offset = (border_pad + pad) * points_to_pixels(LEGEND_FONT_SIZE)
+    centre = width - offset - max(label_width, length) / 2
+    bottom = height - offset
+
+    draw.rectangle(
+        (
+            round(centre - length / 2),
+            round(bottom - bar_height),
+            round(centre + length / 2) - 1,
+            round(bottom) - 1,
+        ),
+        fill=WHITE,
+    )
+    draw.text(
+        (centre, bottom - bar_height - sep - descent),
+        label,
+        fill=WHITE,
+        font=font,
+        anchor="ms",
+    )
+
+
+def draw_sample_name(draw: ImageDraw.ImageDraw, shape: tuple, sample_name: str):
+    """Draw the sample name in the lower left corner, see Image.add_sample_name"""
+
+    height = shape[0]
+    font = load_font(points_to_pixels(round(0.013 * height) * 0.7))
+
+    draw.text((0.05 * height, 0.95 * height), sample_name, fill=WHITE, font=font, anchor="ls")
+
+
+@functools.lru_cache(maxsize=16)
+def figure_geometry(shape: tuple) -> tuple:
+    """Placement of an image in the matplotlib output of Image.annotate
+
+    Lays out the figure of Image.annotate for an image of this shape, and
+    applies the tight bounding box of savefig, without drawing it.
+
+    Returns
+    -------
+    tuple
+        (height, width) of the output, (row, col) of the top left image
+        pixel in the output and the drawn (height, width) of the image
+    """
+
+    height, width = shape
+
+    fig = Figure(figsize=(width / DPI, height / DPI))
+    canvas = FigureCanvasAgg(fig)
+    ax = fig.add_axes((0, 0, 1, 1))
+    ax.imshow(np.zeros((1, 1), dtype=np.uint8), extent=(-0.5, width - 0.5, height - 0.5, -0.5))
+    ax.axis("off")
+
+    # savefig(bbox_inches="tight", pad_inches=0, dpi=DPI)
+    fig.dpi = DPI
+    renderer = canvas.get_renderer()
+    tight_bbox.adjust_bbox(fig, fig.get_tightbbox(renderer).padded(0), DPI)
+
+    out_height, out_width = int(fig.bbox.height), int(fig.bbox.width)
+
+    # The image is drawn rounded up to whole pixels, at the truncated offset
+    drawn = Bbox.intersection(ax.images[0].get_window_extent(renderer), ax.bbox)
+    drawn_height, drawn_width = math.ceil(drawn.height), math.ceil(drawn.width)
+    row = int(out_height - (drawn.y0 + drawn_height))
+    col = int(drawn.x0)
+
+    return (out_height, out_width), (row, col), (drawn_height, drawn_width)
+
+
+def figure_region(data: np.ndarray) -> np.ndarray:
+    """The image as placed in the matplotlib output, see figure_geometry
+
+    Pixels are taken from the nearest image pixel, if matplotlib stretches
+    the image by a pixel.
+    """
+
+    height, width = data.shape
+    (out_height, out_width), (row, col), (drawn_height, drawn_width) = figure_geometry((height, width))
+
+    if (drawn_height, drawn_width) == (height, width):
+        top, left = max(-row, 0), max(-col, 0)
+        if (row, col) == (-top, -left) and top + out_height <= height and left + out_width <= width:
+            return data[top : top + out_height, left : left + out_width]
+
+    def source(size, offset, drawn, n):
+        index = np.floor((np.arange(size) - offset + 0.5) * n / drawn).astype(np.intp)
+        return np.clip(index, 0, n - 1)
+
+    rows = source(out_height, row, drawn_height, height)
+    cols = source(out_width, col, drawn_width, width)
+
+    return data[np.ix_(rows, cols)]
+
+
+def render_annotations(
+    data: np.ndarray,
+    pixel_size_value=None,
+    pixel_size_unit=None,
+    sample_name=None,
+) -> np.ndarray:
+    """Return a copy of the uint8 image with burnt-in annotations
+
+    The annotations are laid out on the image, which is then cropped like
+    the matplotlib output, see figure_region.
+
+    Parameters
+    ----------
+    data : numpy.ndarray
+        Grayscale (cropped) image
+    pixel_size_value : float
+        Pixel size, if None no scalebar is drawn
+    pixel_size_unit : str
+        Pixel size unit
+    sample_name : str
+        Sample name, if None no name is drawn
+    """
+
+    canvas = PILImage.fromarray(np.ascontiguousarray(data, dtype=np.uint8), mode="L")
+    draw = ImageDraw.Draw(canvas)
+
+    if pixel_size_value is not None:
+        draw_scalebar(draw, data.shape, pixel_size_value, pixel_size_unit)
+
+    if sample_name is not None:
+        draw_sample_name(draw, data.shape, sample_name)
+
+    return np.ascontiguousarray(figure_region(np.asarray(canvas)))
+
+
+def write_png(path: str, data: np.ndarray):
+    """Encode the grayscale image as PNG"""
+    PILImage.fromarray(data, mode="L").save(path, format="PNG")
@@ -0,0 +1,248 @@
+#!/usr/bin/env python
+""" """
+
+# Standard library modules.
+import os
+import shutil
+
+# Third party modules.
+import numpy as np
+import pytest
+
+# Local modules.
+from fibresem.core.config import Config
+from fibresem.core.fibresem import Project, iter_files_on_path, get_file_list_on_path
+from fibresem.analysis.analysis_engines import EngineHandler
+from fibresem.analysis.fibreanalysis import Result, analysis_params
+from fibresem.analysis.journal import RunJournal
+from fibresem.io import readtif
+
+# Globals and constants variables.
+SAMPLE = os.path.join(os.path.dirname(__file__), "..", "..", "..", "sampledata", "sample.01_img08.tif")
+
+
+def make_tree(root):
+    for relpath in ["top.tif", "notes.txt", "a/S1.TIF", "a/raw/r.tif", "b/s2.tif", "b/c/s3.tif"]:
+        path = root / relpath
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"")
+
+
+def relative(root, paths):
+    return [os.path.relpath(path, root).replace(os.sep, "/") for path in paths]
+
+
+def test_iter_files_on_path(tmp_path):
+    make_tree(tmp_path)
+
+    assert relative(tmp_path, iter_files_on_path(str(tmp_path), ".tif")) == ["top.tif"]
+    assert relative(tmp_path, iter_files_on_path(str(tmp_path), ".tif", recursive=True)) == [
+        "top.tif", "a/S1.TIF", "a/raw/r.tif", "b/s2.tif", "b/c/s3.tif"
+    ]
+
+
+def test_include_exclude(tmp_path):
+    make_tree(tmp_path)
+
+    files = iter_files_on_path(str(tmp_path), ".tif", recursive=True, exclude=["raw", "b/c"])
+    assert relative(tmp_path, files) == ["top.tif", "a/S1.TIF", "b/s2.tif"]
+
+    files = iter_files_on_path(str(tmp_path), ".tif", recursive=True, include=["b/*"])
+    assert relative(tmp_path, files) == ["b/s2.tif", "b/c/s3.tif"]
+
+    files = iter_files_on_path(str(tmp_path), ".tif", recursive=True, include=["s[23].tif"])
+    assert relative(tmp_path, files) == ["b/s2.tif", "b/c/s3.tif"]
+
+
+def test_missing_path(tmp_path):
+    assert get_file_list_on_path(str(tmp_path / "missing"), ".tif") == []
+
+
+class FakeEngine(EngineHandler):
+    name = "fake"
+    closed = 0
+
+    def __init__(self, fail_on=None):
+        super().__init__()
+        self.fail_on = fail_on
+        self.analysed = []
+        self.start()
+
+    def start(self):
+        self.engine = self
+        return True
+
+    def run(self, analysis, load_externally=False):
+        if self.fail_on is None or analysis.image_path.endswith(self.fail_on):
+            raise RuntimeError("Engine failed")
+
+        self.analysed.append(analysis.image_path)
+
+        result = Result()
+        result.pixel_average = float(len(analysis.image_path))
+        result.pixel_diameters = [1.0, 2.0]
+        return result
+
+    def close(self):
+        FakeEngine.closed += 1
+        super().close()
+
+
+def test_run_diameter_analysis_closes_engine(tmp_path):
+    (tmp_path / "missing.tif").write_bytes(b"")
+
+    project = Project(path=str(tmp_path), config=Config())
+    project.add_images()
+    project.engine_handler = FakeEngine()
+    FakeEngine.closed = 0
+
+    # E.g. a pooled engine is returned to the pool, also if the analysis fails
+    project.run_diameter_analysis()
+
+    assert FakeEngine.closed == 1
+    assert project.engine_handler is None
+
+
+@pytest.fixture
+def nested_project(tmp_path):
+    """Project with images of the same name in two folders"""
+
+    for folder in ("a", "b"):
+        (tmp_path / folder).mkdir()
+        shutil.copyfile(SAMPLE, tmp_path / folder / "s.tif")
+
+    config = Config()
+    config.set("cache", "enabled", "False")
+    config.set("analysis", "journal", "True")
+
+    project = Project(path=str(tmp_path), config=config)
+    project.add_images(recursive=True)
+
+    return project
+
+
+def test_journal_is_removed_after_complete_run(nested_project):
+    nested_project.engine_handler = FakeEngine(fail_on="b/s.tif")
+
+    with pytest.raises(RuntimeError):
+        nested_project.run_diameter_analysis()
+
+    # Interrupted: the journal is kept, entries are keyed by relative path
+    journal = RunJournal(nested_project.Path, "simpoly-matlab", analysis_params(nested_project.config), resume=True)
+    assert list(journal.entries) == ["a/s.tif"]
+
+    resumed = Project(path=nested_project.Path, config=nested_project.config)
+    resumed.add_images(recursive=True)
+    resumed.engine_handler = engine = FakeEngine(fail_on="missing")
+    resumed.run_diameter_analysis(resume=True)
+
+    # Only the image missing in the journal is analysed again
+    assert engine.analysed == [os.path.join(nested_project.Path, "b", "s.tif")]
+    assert all(image.Analysis.result is not None for image in resumed.Images)
+    assert not os.path.exists(os.path.join(nested_project.Path, "fibresem_journal.jsonl"))
+
+
+def test_exports_read_the_result_store(nested_project, monkeypatch):
+    import scipy.io as sio
+
+    nested_project.config.set("analysis", "journal", "False")
+    nested_project.engine_handler = FakeEngine(fail_on="missing")
+    nested_project.run_diameter_analysis()
+
+    # Exports do not add results to the store (or journal them) themselves
+    monkeypatch.setattr(nested_project, "store_result", None)
+
+    index, data = nested_project.analysis_summary()
+    assert index == ["a/s.tif", "b/s.tif"]
+    assert data["sample_name"].tolist() == ["s", "s"]
+
+    nested_project.export_mat()
+    results = sio.loadmat(os.path.join(nested_project.Path, "export.mat"))["results"]
+
+    assert results.shape == (1, 2)
+    assert results[0, 1]["pixel_diameters"].ravel().tolist() == [1.0, 2.0]
+
+
+def test_cached_result_skips_decoding(nested_project, tmp_path, monkeypatch):
+    from fibresem.analysis.cache import ResultCache
+    from fibresem.core.fibresem import Image
+
+    class PooledFakeEngine(FakeEngine):
+        name = "fake-pool"
+        cache_name = "fake"
+
+    nested_project.config.set("simpoly-matlab-engine", "load_externally", "False")
+    nested_project.result_cache = ResultCache(str(tmp_path / "cache"))
+    nested_project.engine_handler = FakeEngine(fail_on="missing")
+    nested_project.run_diameter_analysis()
+
+    def load_image(self, memmap=None):
+        raise AssertionError("image decoded")
+
+    monkeypatch.setattr(Image, "loadImage", load_image)
+
+    # Engines running the same algorithm share the cached results
+    nested_project.engine_handler = engine = PooledFakeEngine(fail_on="missing")
+    nested_project.run_diameter_analysis()
+
+    assert engine.analysed == []
+    assert len(nested_project.results) == 2
+
+
+def write_fibre_image(path, width, seed, size=300):
+    """Synthetic SEM image with bright fibres and a ZEISS pixel size tag"""
+
+    rng = np.random.default_rng(seed)
+    image = rng.normal(40, 8, (size, size))
+
+    for centre in range(30, size, 70):
+        lo, hi = centre - width // 2, centre - width // 2 + width
+        image[lo:hi, :] = rng.normal(200, 8, (width, size))
+        image[:, lo:hi] = rng.normal(200, 8, (size, width))
+
+    readtif.tifffile.imwrite(
+        str(path),
+        image.clip(0, 255).astype(np.uint8),
+        extratags=[(readtif.TAG_INDEX, "s", 0, "\r\nImage Pixel Size = 10.0 nm\r\n", True)],
+    )
+
+
+def test_run_diameter_analysis_on_workers(tmp_path):
+    for i, width in enumerate((6, 9, 12)):
+        write_fibre_image(tmp_path / f"s{i}.tif", width, seed=i)
+
+    config = Config()
+    config.set("analysis", "engine", "simpoly-python")
+    config.set("cache", "enabled", "False")
+
+    def run(workers):
+        project = Project(path=str(tmp_path), config=config)
+        project.add_images()
+        project.run_diameter_analysis(workers=workers)
+        return project
+
+    sequential = run(workers=1)
+    parallel = run(workers=2)
+
+    assert sorted(parallel.results.names) == ["s0.tif", "s1.tif", "s2.tif"]
+
+    for image, expected in zip(parallel.Images, sequential.Images):
+        # Analyses come back from the workers detached and are bound to their image again
+        assert image.Analysis.parent is image
+        assert image.Analysis.result.store is parallel.results
+        assert image.Analysis.pixel_size_unit == "nm"
+
+        assert image.Analysis.result.pixel_average == expected.Analysis.result.pixel_average
+        np.testing.assert_array_equal(image.Analysis.result.pixel_diameters, expected.Analysis.result.pixel_diameters)
+
+    # Wider fibres, larger diameters
+    averages = [image.Analysis.result.pixel_average for image in sequential.Images]
+    assert averages == sorted(averages)
+
+    # Every image is yielded once, in order of completion
+    project = Project(path=str(tmp_path), config=config)
+    project.add_images()
+    analysed = list(project.iter_diameter_analysis(workers=2))
+
+    assert sorted(image.Filename for image in analysed) == ["s0.tif", "s1.tif", "s2.tif"]
+    assert project.results.names == [image.relative_path for image in analysed]
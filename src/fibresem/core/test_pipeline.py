@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+""" """
+
+# Standard library modules.
+
+# Third party modules.
+import numpy as np
+
+# Local modules.
+from fibresem.core.fibresem import Project, Image
+from fibresem.core.pipeline import Stage, run_streaming, run_watching
+
+# Globals and constants variables.
+
+
+class CountingImage(Image):
+    loads = 0
+
+    def loadImage(self):
+        CountingImage.loads += 1
+        self.Data = np.zeros((100, 120), dtype=np.uint8)
+        self.Meta = {}
+        self.Crop = None
+        return True
+
+
+def test_run_streaming():
+    project = Project(path=".")
+    project.Images = [CountingImage(project, f"{i}.tif") for i in range(5)]
+    CountingImage.loads = 0
+
+    calls = []
+
+    def crop(prj, image):
+        image.crop_square()
+        calls.append(("crop", image.Path))
+
+    def analyse(prj, image):
+        assert image.Data.shape == (100, 120)
+        assert image.Crop is None
+        calls.append(("analyse", image.Path))
+
+    def crop_processor(prj):
+        return prj
+
+    def analyse_processor(prj):
+        return prj
+
+    def barrier(prj):
+        calls.append(("barrier", None))
+        return prj
+
+    crop_processor.stage = Stage(run=crop)
+    analyse_processor.stage = Stage(run=analyse, finish=lambda prj: calls.append(("finish", None)))
+
+    run_streaming(project, [barrier, crop_processor, analyse_processor], prefetch=2)
+
+    # Every image is decoded once and passes through both stages in order
+    assert CountingImage.loads == 5
+    assert calls[0] == ("barrier", None)
+    assert calls[1:-1] == [
+        (name, f"{i}.tif") for i in range(5) for name in ("crop", "analyse")
+    ]
+    assert calls[-1] == ("finish", None)
+    assert all(image.Data is None for image in project.Images)
+
+
+def test_run_streaming_while_discovering():
+    project = Project(path=".")
+    calls = []
+
+    def discover():
+        for i in range(5):
+            image = CountingImage(project, f"{i}.tif")
+            project.Images.append(image)
+            calls.append(("found", image.Path))
+            yield image
+
+    def analyse(prj, image):
+        calls.append(("analyse", image.Path))
+
+    def analyse_processor(prj):
+        return prj
+
+    def barrier(prj):
+        calls.append(("barrier", len(prj.Images)))
+        return prj
+
+    analyse_processor.stage = Stage(run=analyse)
+
+    run_streaming(project, [analyse_processor, barrier], prefetch=1, images=discover())
+
+    # The first images are processed before the last one is found
+    assert calls.index(("analyse", "0.tif")) < calls.index(("found", "4.tif"))
+    assert [call for call in calls if call[0] == "analyse"] == [("analyse", f"{i}.tif") for i in range(5)]
+    assert calls[-1] == ("barrier", 5)
+
+    # A leading barrier waits for all images
+    project = Project(path=".")
+    calls.clear()
+    run_streaming(project, [barrier, analyse_processor], prefetch=1, images=discover())
+
+    assert calls[5] == ("barrier", 5)
+
+
+class FakeWatcher:
+    path = "."
+    backend = "fake"
+
+    def __init__(self, batches):
+        self.batches = batches
+
+    def watch(self, idle_timeout=None, yield_empty=False):
+        for paths in self.batches:
+            if paths or yield_empty:
+                yield paths
+
+
+def test_run_watching_updates_exports_on_interval():
+    calls = []
+
+    def analyse(prj, image):
+        calls.append(("analyse", image.Path))
+
+    def analyse_processor(prj):
+        return prj
+
+    analyse_processor.stage = Stage(
+        run=analyse,
+        update=lambda prj: calls.append(("update", len(prj.Images))),
+        finish=lambda prj: calls.append(("finish", len(prj.Images))),
+    )
+
+    def run(export_interval):
+        project = Project(path=".")
+        project.add_image = lambda path: project.Images.append(CountingImage(project, path)) or project.Images[-1]
+        calls.clear()
+
+        watcher = FakeWatcher([["0.tif"], [], ["1.tif", "2.tif"], []])
+        run_watching(project, [analyse_processor], watcher, prefetch=1, export_interval=export_interval)
+
+        return [call for call in calls if call[0] != "analyse"]
+
+    # Exports are rewritten once per interval with new results, not per batch
+    assert run(export_interval=0) == [("update", 1), ("update", 3), ("finish", 3)]
+    assert run(export_interval=3600) == [("finish", 3)]
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+""" """
+
+# Standard library modules.
+import os
+import shutil
+
+# Third party modules.
+import numpy as np
+import pytest
+from PIL import Image as PILImage
+
+# Local modules.
+from fibresem.core import render
+from fibresem.core.fibresem import Project, Image
+
+# Globals and constants variables.
+SAMPLE = os.path.join(os.path.dirname(__file__), "..", "..", "..", "sampledata", "sample.01_img08.tif")
+
+
+def test_render_annotations():
+    data = np.zeros((1000, 1000), dtype=np.uint8)
+
+    img = render.render_annotations(data, 10.0, "nm", "sample")
+
+    assert img.shape == data.shape
+    assert not data.any()
+
+    # Scalebar in the lower right, sample name in the lower left quadrant
+    assert (img[900:, 500:] == 255).any()
+    assert (img[900:, :500] == 255).any()
+    assert not img[:500].any()
+
+
+def test_scalebar_length():
+    length, label = render.scalebar_length(10.0, "nm", 250)
+
+    assert length == pytest.approx(200)
+    assert label == "2 µm"
+
+
+@pytest.mark.parametrize("shape", [(1367, 1368), (874, 916), (1000, 1000)])
+def test_figure_geometry(shape):
+    (height, width), (row, col), drawn = render.figure_geometry(shape)
+    data = np.zeros(shape, dtype=np.uint8)
+
+    assert render.figure_region(data).shape == (height, width)
+    assert drawn == shape
+    assert 0 <= -row <= 1 and 0 <= -col <= 1
+
+
+def test_raster_matches_matplotlib(tmp_path):
+    path = tmp_path / "sample.01_img08.tif"
+    shutil.copyfile(SAMPLE, path)
+    project = Project(path=str(tmp_path))
+
+    outputs = {}
+    for renderer in ("matplotlib", "raster"):
+        image = Image(project, str(path))
+        assert image.annotate(renderer=renderer)
+        with PILImage.open(image.output_file_path()) as png:
+            outputs[renderer] = np.asarray(png.convert("L")).astype(int)
+
+    expected, result = outputs["matplotlib"], outputs["raster"]
+
+    assert result.shape == expected.shape
+    # Equal up to the colormap rounding, except for the antialiased annotations
+    assert (np.abs(result - expected) <= 1).mean() > 0.99
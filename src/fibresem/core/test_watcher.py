@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+""" """
+
+# Standard library modules.
+import os
+import sys
+import shutil
+
+# Third party modules.
+import pytest
+
+# Local modules.
+from fibresem.core.watcher import FolderWatcher
+
+# Globals and constants variables.
+SAMPLE = os.path.join(os.path.dirname(__file__), "..", "..", "..", "sampledata", "sample.01_img08.tif")
+
+BACKENDS = ["poll"] + (["inotify"] if sys.platform.startswith("linux") else [])
+
+
+def poll_until(watcher, attempts=20):
+    for _ in range(attempts):
+        paths = watcher.poll(0.05)
+        if paths:
+            return paths
+    return []
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_reports_complete_files_once(tmp_path, backend):
+    known = tmp_path / "known.tif"
+    shutil.copyfile(SAMPLE, known)
+
+    with FolderWatcher(str(tmp_path), known=[str(known)], backend=backend, interval=0.05, settle=0.05) as watcher:
+        assert watcher.backend == backend
+
+        new = tmp_path / "new.tif"
+        shutil.copyfile(SAMPLE, new)
+
+        assert poll_until(watcher) == [str(new)]
+        assert poll_until(watcher, attempts=3) == []
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_waits_for_incomplete_files(tmp_path, backend):
+    with open(SAMPLE, "rb") as fh:
+        data = fh.read()
+
+    with FolderWatcher(str(tmp_path), backend=backend, interval=0.05, settle=0.05) as watcher:
+        partial = tmp_path / "partial.tif"
+        partial.write_bytes(data[: len(data) // 2])
+
+        assert poll_until(watcher, attempts=5) == []
+        assert str(partial) in watcher.pending
+
+        partial.write_bytes(data)
+
+        assert poll_until(watcher) == [str(partial)]
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_filters_like_add_images(tmp_path, backend):
+    with FolderWatcher(
+        str(tmp_path), backend=backend, interval=0.05, settle=0.05, recursive=True, exclude=["raw"]
+    ) as watcher:
+        upper = tmp_path / "UPPER.TIF"
+        shutil.copyfile(SAMPLE, upper)
+        assert poll_until(watcher) == [str(upper)]
+
+        # A folder created while watching
+        (tmp_path / "a" / "b").mkdir(parents=True)
+        (tmp_path / "raw").mkdir()
+        poll_until(watcher, attempts=3)
+
+        nested = tmp_path / "a" / "b" / "nested.tif"
+        shutil.copyfile(SAMPLE, nested)
+        shutil.copyfile(SAMPLE, tmp_path / "raw" / "excluded.tif")
+        shutil.copyfile(SAMPLE, tmp_path / "a" / "other.png")
+
+        assert poll_until(watcher) == [str(nested)]
+        assert poll_until(watcher, attempts=3) == []
+
+
+def test_not_recursive(tmp_path):
+    (tmp_path / "sub").mkdir()
+    shutil.copyfile(SAMPLE, tmp_path / "sub" / "nested.tif")
+
+    with FolderWatcher(str(tmp_path), backend="poll", settle=0) as watcher:
+        assert poll_until(watcher, attempts=3) == []
+
+
+def test_keeps_files_that_cannot_be_checked(tmp_path, monkeypatch):
+    import fibresem.core.watcher as watcher_module
+
+    locked = tmp_path / "locked.tif"
+    shutil.copyfile(SAMPLE, locked)
+
+    stat = os.stat
+
+    def locked_stat(path, *args, **kwargs):
+        if str(path) == str(locked):
+            raise PermissionError(13, "Permission denied", str(path))
+        return stat(path, *args, **kwargs)
+
+    with FolderWatcher(str(tmp_path), backend="poll", interval=0.05, settle=0.05) as watcher:
+        monkeypatch.setattr(watcher_module.os, "stat", locked_stat)
+        assert poll_until(watcher, attempts=3) == []
+        assert str(locked) in watcher.pending
+
+        monkeypatch.undo()
+        assert poll_until(watcher) == [str(locked)]
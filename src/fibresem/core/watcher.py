@@ -0,0 +1,374 @@
+"""Folder watcher
+
+Detects new images in a folder (and its subfolders), e.g. written by the
+microscope during an acquisition. On Linux, the folders are watched with
+inotify (through ctypes, without additional dependencies); otherwise they
+are polled. Files are filtered like Project.add_images, see
+iter_files_on_path.
+
+A new file is reported once it is complete: its size and modification
+time have not changed for `settle` seconds and it contains all pixel data
+of the first page, see readtif.is_complete.
+
+    watcher = FolderWatcher(path, known=project.FileList)
+    for paths in watcher.watch():
+        ...
+"""
+
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+import logging
+
+from fibresem.io import readtif
+from fibresem.core.fibresem import matches, iter_files_on_path
+
+# Seconds between polls of the folder
+DEFAULT_INTERVAL = 2.0
+
+# Seconds a file must be unchanged before it is checked
+DEFAULT_SETTLE = 1.0
+
+# inotify constants, see inotify(7)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+# struct inotify_event: wd, mask, cookie, len, followed by the name
+INOTIFY_EVENT = struct.Struct("iIII")
+
+
+class Inotify:
+    """Files closed after writing or moved into folders, reported by inotify
+
+    Every folder has its own watch. New subfolders are reported, so they
+    can be watched too.
+    """
+
+    def __init__(self):
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+
+        # Watched folder of every watch descriptor
+        self.folders = {}
+
+        # Events were lost, the folders have to be scanned
+        self.overflow = False
+
+    def add_watch(self, path: str):
+        """Watch a folder for written files and new subfolders"""
+
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), path)
+
+        self.folders[wd] = path
+
+    def read(self, timeout: float) -> tuple:
+        """Wait up to timeout seconds for events
+
+        Returns
+        -------
+        tuple
+            (files, folders) paths of the written files and the new folders
+        """
+
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return [], []
+
+        try:
+            data = os.read(self.fd, 1 << 16)
+        except OSError as err:
+            if err.errno in (errno.EAGAIN, errno.EINTR):
+                return [], []
+            raise
+
+        files = []
+        folders = []
+        offset = 0
+
+        while offset + INOTIFY_EVENT.size <= len(data):
+            wd, mask, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+            offset += INOTIFY_EVENT.size
+
+            name = data[offset : offset + length].rstrip(b"\0")
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                self.overflow = True
+                continue
+
+            if not name or wd not in self.folders:
+                continue
+
+            path = os.path.join(self.folders[wd], os.fsdecode(name))
+
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    folders.append(path)
+            elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                files.append(path)
+
+        return files, folders
+
+    def close(self):
+        os.close(self.fd)
+
+
+class FolderWatcher:
+    """Reports new, completely written files in a folder
+
+    Attributes
+    ----------
+    path : str
+        Watched folder
+    extension : str or tuple
+        File path extension filter, not case-sensitive
+    recursive, include, exclude
+        See iter_files_on_path
+    known : set
+        Paths of the files that have been reported (or were known before)
+    pending : dict
+        New files that are not complete yet: path -> ((size, mtime), since)
+    backend : str
+        "inotify" or "poll"
+    """
+
+    def __init__(
+        self, path: str, extension=".tif", known=(), backend="auto", interval=DEFAULT_INTERVAL, settle=DEFAULT_SETTLE,
+        recursive=False, include=None, exclude=None
+    ):
+        """
+        Parameters
+        ----------
+        known : list
+            Paths of files that are not reported, e.g. Project.FileList
+        backend : str
+            "auto" (inotify if available), "inotify" or "poll"
+        interval : float
+            Seconds between polls of the folder
+        settle : float
+            Seconds a file must be unchanged before it is checked
+        recursive, include, exclude
+            See iter_files_on_path
+        """
+
+        self.path = os.path.abspath(path)
+        self.extension = extension
+        self.extensions = tuple(ext.lower() for ext in ((extension,) if isinstance(extension, str) else extension))
+        self.recursive = recursive
+        self.include = list(include or [])
+        self.exclude = list(exclude or [])
+        self.known = {os.path.abspath(file) for file in known}
+        self.pending = {}
+        self.interval = interval
+        self.settle = settle
+
+        self.inotify = None
+
+        if backend in ("auto", "inotify"):
+            try:
+                if not sys.platform.startswith("linux"):
+                    raise OSError("inotify is only available on Linux")
+                self.inotify = Inotify()
+                self.watch_folder(self.path)
+            except (OSError, AttributeError) as err:
+                # E.g. more subfolders than fs.inotify.max_user_watches
+                self.close()
+                if backend == "inotify":
+                    raise
+                logging.info(f"Could not watch {self.path} with inotify, polling instead: {err}")
+
+        self.backend = "poll" if self.inotify is None else "inotify"
+
+        # Files that appeared before the watch started
+        self.scan()
+
+    def close(self):
+        if self.inotify is not None:
+            self.inotify.close()
+            self.inotify = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def relpath(self, path: str) -> str:
+        """Path relative to the watched folder, with "/" separators"""
+        return os.path.relpath(path, self.path).replace(os.sep, "/")
+
+    def accepts(self, path: str) -> bool:
+        """The file passes the extension, folder and include/exclude filters"""
+
+        relpath = self.relpath(path)
+        parts = relpath.split("/")
+
+        if not relpath.lower().endswith(self.extensions):
+            return False
+        if len(parts) > 1 and not self.recursive:
+            return False
+
+        # Excluded folders exclude everything in them
+        for i in range(1, len(parts) + 1):
+            if self.exclude and matches("/".join(parts[:i]), self.exclude):
+                return False
+
+        return not self.include or matches(relpath, self.include)
+
+    def add(self, path: str):
+        """Add a new file, reported once it is complete"""
+
+        if path not in self.known and path not in self.pending and self.accepts(path):
+            self.pending[path] = None
+
+    def watch_folder(self, folder: str):
+        """Watch a folder and, if recursive, its subfolders with inotify"""
+
+        self.inotify.add_watch(folder)
+
+        if not self.recursive:
+            return
+
+        stack = [folder]
+        while stack:
+            try:
+                with os.scandir(stack.pop()) as it:
+                    subfolders = [entry.path for entry in it if entry.is_dir(follow_symlinks=False)]
+            except OSError:
+                continue
+
+            for subfolder in subfolders:
+                if self.exclude and matches(self.relpath(subfolder), self.exclude):
+                    continue
+                self.inotify.add_watch(subfolder)
+                stack.append(subfolder)
+
+    def scan(self):
+        """Add all unknown files in the folder (and subfolders)
+
+        Known files are skipped without a stat call.
+        """
+
+        try:
+            for path in iter_files_on_path(self.path, self.extensions, self.recursive, self.include, self.exclude):
+                if path not in self.known:
+                    self.add(path)
+        except OSError as err:
+            logging.warning(f"Could not scan {self.path}: {err}")
+
+    def check_pending(self) -> list:
+        """Return the pending files that are complete, in order of file name"""
+
+        now = time.monotonic()
+        complete = []
+
+        for path, state in list(self.pending.items()):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                # Removed or renamed
+                del self.pending[path]
+                continue
+            except OSError as err:
+                # E.g. locked by the writer on a network share, check again later
+                logging.debug(f"Could not stat {path}: {err}")
+                self.pending[path] = None
+                continue
+
+            signature = (stat.st_size, stat.st_mtime_ns)
+
+            if state is None or state[0] != signature:
+                self.pending[path] = (signature, now)
+                continue
+
+            if now - state[1] < self.settle:
+                continue
+
+            if not readtif.is_complete(path):
+                # Check again after the next settle period
+                self.pending[path] = (signature, now)
+                continue
+
+            del self.pending[path]
+            self.known.add(path)
+            complete.append(path)
+
+        return sorted(complete)
+
+    def poll(self, timeout: float) -> list:
+        """Wait up to timeout seconds for new files, returns the complete files"""
+
+        # Wake up in time to check the pending files
+        if self.pending:
+            timeout = min(timeout, self.settle)
+
+        if self.inotify is None:
+            time.sleep(timeout)
+            self.scan()
+        else:
+            files, folders = self.inotify.read(timeout)
+
+            for path in files:
+                self.add(path)
+
+            # Files may have been written before the new folders were watched
+            if folders and self.recursive:
+                for folder in folders:
+                    if self.exclude and matches(self.relpath(folder), self.exclude):
+                        continue
+                    try:
+                        self.watch_folder(folder)
+                    except OSError as err:
+                        logging.warning(f"Could not watch {folder}: {err}")
+                self.scan()
+
+            if self.inotify.overflow:
+                self.inotify.overflow = False
+                self.scan()
+
+        return self.check_pending()
+
+    def watch(self, idle_timeout=None, yield_empty=False):
+        """Yield lists of new, complete files
+
+        Parameters
+        ----------
+        idle_timeout : float
+            Stop after this many seconds without new files, default: never
+        yield_empty : bool
+            Also yield an empty list after every poll without new files,
+            e.g. to do deferred work while the folder is idle
+        """
+
+        last = time.monotonic()
+
+        while True:
+            paths = self.poll(self.interval)
+
+            if paths:
+                yield paths
+                last = time.monotonic()
+                continue
+
+            if idle_timeout is not None and time.monotonic() - last > idle_timeout:
+                return
+
+            if yield_empty:
+                yield paths
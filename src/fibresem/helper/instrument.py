@@ -0,0 +1,229 @@
+"""Instrumentation
+
+Opt-in tracing of the processing stages (discover, load, tag_parse, crop,
+render, save, engine_transfer, engine_compute, result_parse, export). Every
+stage is recorded as a span with its wall time, CPU time of the calling thread
+and, if enabled, the net bytes allocated during the stage.
+
+Tracing is disabled by default; span() then costs a single global lookup.
+Allocations are traced with tracemalloc, which slows down allocation-heavy
+stages considerably and inflates their wall and CPU times, so it is only
+enabled on request: instrument.enable(trace_memory=True).
+
+    instrument.enable()
+    with instrument.span("load", image="sample.01_img08.tif"):
+        ...
+    instrument.write_chrome_trace("trace.json")
+
+Spans inherit the image of the enclosing span. Spans recorded in worker
+processes are collected with collect() and merged with merge().
+"""
+
+import os
+import json
+import time
+import threading
+import tracemalloc
+import contextvars
+from contextlib import contextmanager, nullcontext
+from collections import defaultdict
+
+# The tracer, None if tracing is disabled
+_tracer = None
+
+# Image of the enclosing span
+_current_image = contextvars.ContextVar("fibresem_trace_image", default=None)
+
+
+class Tracer:
+    """Records spans
+
+    Attributes
+    ----------
+    events : list
+        Recorded spans, dicts with name, image, start (s since epoch),
+        wall_s, cpu_s, alloc_bytes, pid and tid
+    trace_memory : bool
+        Trace allocations with tracemalloc
+    """
+
+    def __init__(self, trace_memory=False):
+        self.events = []
+        self.trace_memory = trace_memory
+        self._lock = threading.Lock()
+
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def allocated(self) -> int:
+        if not self.trace_memory:
+            return 0
+        return tracemalloc.get_traced_memory()[0]
+
+    @contextmanager
+    def span(self, name: str, image=None):
+        if image is None:
+            image = _current_image.get()
+        token = _current_image.set(image)
+
+        start = time.time()
+        wall = time.perf_counter()
+        cpu = time.thread_time()
+        allocated = self.allocated()
+
+        try:
+            yield
+        finally:
+            event = {
+                "name": name,
+                "image": image,
+                "start": start,
+                "wall_s": time.perf_counter() - wall,
+                "cpu_s": time.thread_time() - cpu,
+                "alloc_bytes": self.allocated() - allocated,
+                "pid": os.getpid(),
+                "tid": threading.get_ident(),
+            }
+
+            _current_image.reset(token)
+
+            with self._lock:
+                self.events.append(event)
+
+    def per_image(self) -> dict:
+        """Spans grouped by image, in order of completion"""
+
+        trace = defaultdict(list)
+        for event in self.events:
+            trace[event["image"]].append(event)
+
+        return dict(trace)
+
+    def summary(self) -> dict:
+        """Total wall time, CPU time and allocated bytes per stage"""
+
+        summary = defaultdict(lambda: {"count": 0, "wall_s": 0.0, "cpu_s": 0.0, "alloc_bytes": 0})
+        for event in self.events:
+            stage = summary[event["name"]]
+            stage["count"] += 1
+            stage["wall_s"] += event["wall_s"]
+            stage["cpu_s"] += event["cpu_s"]
+            stage["alloc_bytes"] += event["alloc_bytes"]
+
+        return dict(summary)
+
+    def chrome_trace(self) -> dict:
+        """Trace in the Chrome trace event format (chrome://tracing, Perfetto)"""
+
+        events = []
+        for event in self.events:
+            events.append({
+                "name": event["name"],
+                "cat": "fibresem",
+                "ph": "X",
+                "ts": event["start"] * 1e6,
+                "dur": event["wall_s"] * 1e6,
+                "pid": event["pid"],
+                "tid": event["tid"],
+                "args": {
+                    "image": event["image"],
+                    "cpu_ms": event["cpu_s"] * 1e3,
+                    "alloc_bytes": event["alloc_bytes"],
+                },
+            })
+
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+def enable(trace_memory=False) -> Tracer:
+    """Start tracing, returns the tracer
+
+    Parameters
+    ----------
+    trace_memory : bool
+        Also record the bytes allocated per span, slows down the traced stages
+    """
+    global _tracer  # pylint: disable=global-statement
+
+    if _tracer is None:
+        _tracer = Tracer(trace_memory)
+
+    return _tracer
+
+
+def disable():
+    """Stop tracing and discard the recorded spans"""
+    global _tracer  # pylint: disable=global-statement
+
+    if _tracer is not None and _tracer.trace_memory:
+        tracemalloc.stop()
+
+    _tracer = None
+
+
+def is_enabled() -> bool:
+    return _tracer is not None
+
+
+def traces_memory() -> bool:
+    return _tracer is not None and _tracer.trace_memory
+
+
+def get_tracer() -> Tracer:
+    """The tracer, None if tracing is disabled"""
+    return _tracer
+
+
+def span(name: str, image=None):
+    """Context manager recording a stage, a no-op if tracing is disabled
+
+    Parameters
+    ----------
+    name : str
+        Stage, e.g. "load" or "engine_compute"
+    image : str
+        File name of the processed image, default: image of the enclosing span
+    """
+
+    if _tracer is None:
+        return nullcontext()
+
+    return _tracer.span(name, image)
+
+
+def init_worker(enabled: bool, trace_memory=False):
+    """Enable tracing in a worker process if it is enabled in the parent
+
+    A forked worker starts with a fresh tracer, so that the spans of the
+    parent process are not collected twice.
+    """
+    global _tracer  # pylint: disable=global-statement
+
+    _tracer = Tracer(trace_memory) if enabled else None
+
+
+def collect() -> list:
+    """Return and clear the spans recorded so far, e.g. in a worker process"""
+
+    if _tracer is None:
+        return []
+
+    events, _tracer.events = _tracer.events, []
+    return events
+
+
+def merge(events: list):
+    """Add spans collected in another process"""
+
+    if _tracer is not None:
+        _tracer.events.extend(events)
+
+
+def write_chrome_trace(path: str):
+    """Write the recorded spans as Chrome trace JSON"""
+
+    if _tracer is None:
+        return
+
+    with open(path, "w", encoding="utf-8") as fh:
+        json.dump(_tracer.chrome_trace(), fh)
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+""" """
+
+# Standard library modules.
+import json
+
+# Third party modules.
+import numpy as np
+
+# Local modules.
+from fibresem.helper import instrument
+
+# Globals and constants variables.
+
+
+def test_span_disabled():
+    instrument.disable()
+
+    with instrument.span("load", image="a.tif"):
+        pass
+
+    assert instrument.get_tracer() is None
+    assert instrument.collect() == []
+
+
+def test_span_memory_off_by_default():
+    tracer = instrument.enable()
+
+    try:
+        assert not tracer.trace_memory
+        with instrument.span("load", image="a.tif"):
+            np.ones(1 << 20, dtype=np.uint8)
+        assert tracer.events[0]["alloc_bytes"] == 0
+    finally:
+        instrument.disable()
+
+
+def test_span(tmp_path):
+    tracer = instrument.enable(trace_memory=True)
+
+    try:
+        with instrument.span("analysis", image="a.tif"):
+            with instrument.span("engine_compute"):
+                data = np.ones(1 << 20, dtype=np.uint8)
+
+        trace = tracer.per_image()
+        assert [event["name"] for event in trace["a.tif"]] == ["engine_compute", "analysis"]
+        assert trace["a.tif"][0]["alloc_bytes"] >= data.nbytes
+        assert tracer.summary()["analysis"]["count"] == 1
+
+        path = tmp_path / "trace.json"
+        instrument.write_chrome_trace(str(path))
+        events = json.loads(path.read_text())["traceEvents"]
+        assert {event["ph"] for event in events} == {"X"}
+
+        assert len(instrument.collect()) == 2
+        assert tracer.events == []
+    finally:
+        instrument.disable()
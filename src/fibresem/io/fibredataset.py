@@ -0,0 +1,177 @@
+"""Fibre dataset
+
+Writes the diameters of every fibre to a dataset partitioned by sample
+(Hive style), with one Parquet or Arrow IPC file per image:
+
+    diameters/sample_name=PU.088/PU.088_01.parquet
+
+Every file is written as soon as its image has been analysed, so the
+dataset never has to be held in memory as a whole. Requires pyarrow.
+
+    writer = DiameterDatasetWriter("diameters", format="parquet")
+    writer.write("PU.088_01.tif", "PU.088", pixel_diameters, 0.0098, "µm")
+    df = read_diameter_dataset("diameters")
+"""
+
+import os
+import logging
+from urllib.parse import quote
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet
+    import pyarrow.dataset
+except ModuleNotFoundError:
+    pa = None
+
+# File extension of every format
+FORMATS = {"parquet": ".parquet", "arrow": ".arrow"}
+
+# Default compression of every format, Arrow IPC supports lz4 and zstd only
+COMPRESSION = {"parquet": "snappy", "arrow": None}
+
+# Column used to partition the dataset
+PARTITION = "sample_name"
+
+
+def available() -> bool:
+    """pyarrow is installed"""
+    return pa is not None
+
+
+class DiameterDatasetWriter:
+    """Writes the fibre diameters of single images to a partitioned dataset
+
+    Attributes
+    ----------
+    path : str
+        Root directory of the dataset
+    format : str
+        "parquet" or "arrow" (Arrow IPC file)
+    compression : str
+        Compression codec, e.g. "snappy", "lz4" or "zstd", default: see COMPRESSION
+    """
+
+    def __init__(self, path: str, format="parquet", compression=None):  # pylint: disable=redefined-builtin
+        if pa is None:
+            raise ModuleNotFoundError("pyarrow is required to export diameter datasets")
+
+        if format not in FORMATS:
+            raise ValueError(f"Unknown dataset format: {format}")
+
+        self.path = path
+        self.format = format
+        self.compression = compression if compression else COMPRESSION[format]
+
+        os.makedirs(path, exist_ok=True)
+
+    def file_path(self, name: str, sample_name: str) -> str:
+        """Path of the file of an image"""
+
+        partition = f"{PARTITION}={quote(sample_name or '', safe='')}"
+        filename = os.path.splitext(os.path.basename(name))[0] + FORMATS[self.format]
+
+        return os.path.join(self.path, partition, filename)
+
+    @staticmethod
+    def table(name: str, pixel_diameters: np.ndarray, conversion_factor: float, unit: str) -> "pa.Table":
+        """Table with one row per fibre
+
+        The image name and unit are dictionary encoded, they are stored once
+        per file rather than once per fibre.
+        """
+
+        pixel_diameters = np.ascontiguousarray(pixel_diameters, dtype=np.float32)
+        n = pixel_diameters.size
+        indices = pa.array(np.zeros(n, dtype=np.int32))
+
+        return pa.table({
+            "image": pa.DictionaryArray.from_arrays(indices, pa.array([name])),
+            "fibre": pa.array(np.arange(n, dtype=np.uint32)),
+            "pixel_diameter": pa.array(pixel_diameters),
+            "diameter": pa.array(pixel_diameters * np.float32(conversion_factor)),
+            "unit": pa.DictionaryArray.from_arrays(indices, pa.array([unit])),
+        })
+
+    def write(self, name: str, sample_name: str, pixel_diameters: np.ndarray, conversion_factor: float, unit: str) -> str:
+        """Write the diameters of an image, replacing a previous file of that image
+
+        Parameters
+        ----------
+        name : str
+            Image file name
+        sample_name : str
+            Sample name, the partition of the file
+        pixel_diameters : numpy.ndarray
+            Fibre diameters in pixels
+        conversion_factor : float
+            Pixel to unit conversion factor, NaN if unknown
+        unit : str
+            Unit of the converted diameters
+
+        Returns
+        -------
+        str
+            Path of the written file
+        """
+
+        table = self.table(name, pixel_diameters, conversion_factor, unit)
+
+        output_path = self.file_path(name, sample_name)
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+
+        # Write to a hidden temporary file first, readers never see a partial file
+        tmp_path = os.path.join(os.path.dirname(output_path), f".{os.path.basename(output_path)}.tmp")
+
+        if self.format == "parquet":
+            pa.parquet.write_table(table, tmp_path, compression=self.compression)
+        else:
+            options = pa.ipc.IpcWriteOptions(compression=self.compression)
+            with pa.ipc.new_file(tmp_path, table.schema, options=options) as writer:
+                writer.write_table(table)
+
+        os.replace(tmp_path, output_path)
+
+        logging.debug(f"Wrote {table.num_rows} diameters to {output_path}")
+
+        return output_path
+
+
+def read_diameter_dataset(path: str, format="parquet", columns=None):  # pylint: disable=redefined-builtin
+    """Read a diameter dataset as pandas.DataFrame
+
+    Parameters
+    ----------
+    path : str
+        Root directory of the dataset
+    format : str
+        "parquet" or "arrow"
+    columns : list
+        Columns to read, default: all, including sample_name
+    """
+
+    if pa is None:
+        raise ModuleNotFoundError("pyarrow is required to read diameter datasets")
+
+    # Keep sample names as strings, e.g. "01" rather than 1
+    partitioning = pa.dataset.partitioning(pa.schema([(PARTITION, pa.string())]), flavor="hive")
+
+    # Only files of this format, the other format may be written to the same directory
+    files = sorted(
+        os.path.join(root, filename)
+        for root, _, filenames in os.walk(path)
+        for filename in filenames
+        if filename.endswith(FORMATS[format]) and not filename.startswith(".")
+    )
+
+    dataset = pa.dataset.dataset(
+        files,
+        format="ipc" if format == "arrow" else format,
+        partitioning=partitioning,
+        partition_base_dir=path,
+    )
+
+    return dataset.to_table(columns=columns).to_pandas()
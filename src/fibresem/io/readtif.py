@@ -1,26 +1,353 @@
+
+import os
+import struct
+
+import numpy as np
+
 from fibresem.io import tifffile
+from fibresem.helper import instrument
 
 # ZEISS SEM tag index for pixel size information
 TAG_INDEX = 34119
 
+# Baseline tags read by readmeta, besides the ZEISS SEM tag
+HEADER_TAGS = {
+    256: "ImageWidth",
+    257: "ImageLength",
+    258: "BitsPerSample",
+    259: "Compression",
+    277: "SamplesPerPixel",
+}
+
+# Offsets and byte counts of the pixel data: StripOffsets, TileOffsets
+DATA_TAGS = {273: 279, 324: 325}
+
+# TIFF field types: (struct format, size in bytes)
+FIELD_TYPES = {
+    1: ("B", 1),
+    2: ("s", 1),
+    3: ("H", 2),
+    4: ("I", 4),
+    7: ("s", 1),
+    16: ("Q", 8),
+}
+
+
+def importtif(path, memmap=False):
+    """Read the first page and its tags
+
+    Parameters
+    ----------
+    path : str
+        Path to .tif file
+    memmap : bool
+        Map the pixel data of the file into memory instead of reading it,
+        if the page is uncompressed and stored contiguously. The returned
+        array is then a read-only numpy.memmap; pages that can't be mapped
+        are read as usual.
+
+    Returns
+    -------
+    tuple
+        (numpy.ndarray, dict) image data and tags
+    """
 
-def importtif(path):
     with tifffile.TiffFile(path) as fh:
-        tif = fh.pages[0].asarray()
+        page = fh.pages[0]
+
+        if memmap and page.is_memmappable:
+            tif = memmap_page(path, page, fh.byteorder)
+        else:
+            tif = page.asarray()
+
         tags = readtags(fh)
 
     return (tif, tags)
 
 
+def memmap_page(path, page, byteorder) -> np.memmap:
+    """Read-only memory map of the (contiguous) pixel data of a page"""
+
+    offset, _ = page.is_contiguous
+    dtype = np.dtype(page.dtype).newbyteorder(byteorder)
+
+    return np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=page.shape)
+
+
+class RegionReader:
+    """Reads rectangular regions of the first page of a large image
+
+    Only the strips or tiles intersecting a region are read and decoded,
+    uncompressed contiguous pages are memory-mapped. The segments of the
+    last region are kept, so regions next to each other in the same strips
+    decode them once. Multi-sample (e.g. RGB) pages return the first sample.
+
+        with RegionReader(path) as reader:
+            region = reader.read(0, 2048, 0, 2048)
+
+    Attributes
+    ----------
+    shape : tuple
+        (height, width) of the page
+    dtype : numpy.dtype
+    """
+
+    def __init__(self, path, memmap=True):
+        self._fh = tifffile.TiffFile(path)
+
+        try:
+            page = self._fh.pages[0]
+            self.page = page
+            self.shape = (page.imagelength, page.imagewidth)
+            self.dtype = np.dtype(page.dtype)
+
+            self._memmap = None
+            if memmap and page.is_memmappable:
+                self._memmap = memmap_page(path, page, self._fh.byteorder)
+        except Exception:
+            self._fh.close()
+            raise
+
+        # Decoded segments of the last region: index -> (segment, y, x)
+        self._segments = {}
+
+    def close(self):
+        self._memmap = None
+        self._segments = {}
+        self._fh.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def segment_indices(self, y0, y1, x0, x1) -> list:
+        """Indices of the strips or tiles intersecting a region"""
+
+        page = self.page
+
+        if page.is_tiled:
+            tile_h, tile_w = page.tilelength, page.tilewidth
+            tiles_x = -(-self.shape[1] // tile_w)
+            return [
+                row * tiles_x + col
+                for row in range(y0 // tile_h, -(-y1 // tile_h))
+                for col in range(x0 // tile_w, -(-x1 // tile_w))
+            ]
+
+        rows_per_strip = min(page.rowsperstrip, self.shape[0])
+        return list(range(y0 // rows_per_strip, -(-y1 // rows_per_strip)))
+
+    def read(self, y0, y1, x0, x1) -> np.ndarray:
+        """Read the region [y0:y1, x0:x1] into a new array"""
+
+        y0, x0 = max(y0, 0), max(x0, 0)
+        y1, x1 = min(y1, self.shape[0]), min(x1, self.shape[1])
+
+        with instrument.span("load"):
+            if self._memmap is not None:
+                region = self._memmap[y0:y1, x0:x1]
+                if region.ndim == 3:
+                    region = region[:, :, 0]
+                return np.array(region)
+
+            return self._read_segments(y0, y1, x0, x1)
+
+    def _read_segments(self, y0, y1, x0, x1) -> np.ndarray:
+        page = self.page
+        out = np.zeros((y1 - y0, x1 - x0), dtype=self.dtype)
+
+        needed = self.segment_indices(y0, y1, x0, x1)
+        segments = {index: self._segments[index] for index in needed if index in self._segments}
+        missing = [index for index in needed if index not in segments]
+
+        decodeargs = {"_fullsize": page.is_tiled}
+        if page.compression in (6, 7, 34892):  # JPEG
+            decodeargs["jpegtables"] = page.jpegtables
+
+        # Segments are returned with their position in missing
+        fh = self._fh.filehandle
+        for data, position in fh.read_segments(
+            [page.dataoffsets[i] for i in missing],
+            [page.databytecounts[i] for i in missing],
+            lock=fh.lock,
+        ):
+            index = missing[position]
+            segment, indices, _ = page.decode(data, index, **decodeargs)
+            if segment is not None:
+                # (depth, length, width, samples) -> first plane and sample
+                segment = segment[0, :, :, 0]
+            segments[index] = (segment, indices[2], indices[3])
+
+        for segment, sy, sx in segments.values():
+            if segment is None:
+                continue
+
+            # Intersection of segment and region
+            ty0, ty1 = max(y0, sy), min(y1, sy + segment.shape[0])
+            tx0, tx1 = max(x0, sx), min(x1, sx + segment.shape[1])
+            if ty0 >= ty1 or tx0 >= tx1:
+                continue
+
+            out[ty0 - y0 : ty1 - y0, tx0 - x0 : tx1 - x0] = segment[ty0 - sy : ty1 - sy, tx0 - sx : tx1 - sx]
+
+        self._segments = segments
+
+        return out
+
+
 def readtags(filehandle):
+    with instrument.span("tag_parse"):
+        tif_tags = {}
+        for tag in filehandle.pages[0].tags.values():
+            name, value = tag.name, tag.value
+            tif_tags[name] = value
+
+        tif_tags["filename"] = filehandle.filename
+
+        return parse_zeiss_tags(tif_tags)
+
+
+def readmeta(path):
+    """Read the tags of the first page without decoding any pixel data
+
+    Only the first IFD is parsed: the baseline image tags and the ZEISS SEM
+    tag. Falls back to tifffile for files that cannot be parsed directly.
+
+    Returns
+    -------
+    dict
+        Tags, with the same ZEISS SEM fields as readtags
+    """
+
+    with instrument.span("tag_parse"):
+        try:
+            with open(path, "rb") as fh:
+                entries = read_first_ifd(fh, set(HEADER_TAGS) | {TAG_INDEX})
+        except (ValueError, struct.error):
+            entries = None
+
+    if entries is None:
+        with tifffile.TiffFile(path) as fh:
+            return readtags(fh)
+
     tif_tags = {}
-    for tag in filehandle.pages[0].tags.values():
-        name, value = tag.name, tag.value
-        tif_tags[name] = value
+    for code, value in entries.items():
+        if code == TAG_INDEX:
+            tif_tags[str(TAG_INDEX)] = value.decode("latin-1")
+        else:
+            tif_tags[HEADER_TAGS[code]] = value
 
-    tif_tags["image"] = {}
+    tif_tags["filename"] = os.path.basename(path)
+
+    return parse_zeiss_tags(tif_tags)
+
+
+def is_complete(path) -> bool:
+    """Check that a TIFF file has been written completely
+
+    The first IFD and the ZEISS SEM tag must be readable and the file must
+    contain all image strips (or tiles) of the first page, e.g. to detect
+    images that are still being written by the microscope.
+    """
+
+    try:
+        with open(path, "rb") as fh:
+            entries = read_first_ifd(fh, {TAG_INDEX, *DATA_TAGS, *DATA_TAGS.values()})
+            size = os.fstat(fh.fileno()).st_size
+    except (OSError, ValueError, struct.error):
+        return False
+
+    if TAG_INDEX not in entries:
+        return False
+
+    for offsets_code, counts_code in DATA_TAGS.items():
+        if offsets_code not in entries or counts_code not in entries:
+            continue
 
-    tif_tags["filename"] = filehandle.filename
+        offsets = np.atleast_1d(entries[offsets_code])
+        counts = np.atleast_1d(entries[counts_code])
+        if offsets.size != counts.size:
+            return False
+
+        return bool(np.max(offsets.astype(np.int64) + counts) <= size)
+
+    return False
+
+
+def read_first_ifd(fh, codes) -> dict:
+    """Read selected tags from the first IFD of a classic or BigTIFF file
+
+    Parameters
+    ----------
+    fh : file
+        Binary file handle
+    codes : set
+        Tag codes to read
+
+    Returns
+    -------
+    dict
+        Tag values by code; numbers for single values, bytes for strings
+    """
+
+    header = fh.read(16)
+    byteorder = {b"II": "<", b"MM": ">"}.get(header[:2])
+    if byteorder is None:
+        raise ValueError("Not a TIFF file")
+
+    version = struct.unpack(byteorder + "H", header[2:4])[0]
+    if version == 42:
+        offset = struct.unpack(byteorder + "I", header[4:8])[0]
+        count_format, entry_format, entry_size, inline_size = "H", "HHI4s", 12, 4
+    elif version == 43:
+        offset = struct.unpack(byteorder + "Q", header[8:16])[0]
+        count_format, entry_format, entry_size, inline_size = "Q", "HHQ8s", 20, 8
+    else:
+        raise ValueError("Unknown TIFF version")
+
+    fh.seek(offset)
+    count_size = struct.calcsize(count_format)
+    num_entries = struct.unpack(byteorder + count_format, fh.read(count_size))[0]
+    ifd = fh.read(num_entries * entry_size)
+
+    entries = {}
+    for i in range(num_entries):
+        code, field_type, count, data = struct.unpack(
+            byteorder + entry_format, ifd[i * entry_size : (i + 1) * entry_size]
+        )
+
+        if code not in codes:
+            continue
+
+        if field_type not in FIELD_TYPES:
+            raise ValueError(f"Unsupported field type {field_type} of tag {code}")
+
+        value_format, value_size = FIELD_TYPES[field_type]
+        size = count * value_size
+
+        # Values that don't fit in the entry are stored at an offset
+        if size > inline_size:
+            value_offset = struct.unpack(byteorder + ("I" if version == 42 else "Q"), data)[0]
+            fh.seek(value_offset)
+            data = fh.read(size)
+        else:
+            data = data[:size]
+
+        if value_format == "s":
+            entries[code] = data
+        else:
+            values = struct.unpack(f"{byteorder}{count}{value_format}", data)
+            entries[code] = values[0] if count == 1 else values
+
+    return entries
+
+
+def parse_zeiss_tags(tif_tags):
+    """Parse the ZEISS SEM tag into tif_tags["image"] and the pixel size"""
+
+    tif_tags["image"] = {}
 
     try:
         imgtags = tif_tags[str(TAG_INDEX)].replace("\x00", "").split("\r\n")
@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+""" """
+
+# Standard library modules.
+
+# Third party modules.
+import numpy as np
+import pytest
+
+pytest.importorskip("pyarrow")
+
+# Local modules.
+from fibresem.io.fibredataset import DiameterDatasetWriter, read_diameter_dataset
+
+# Globals and constants variables.
+
+
+@pytest.mark.parametrize("dataset_format", ["parquet", "arrow"])
+def test_write_and_read(tmp_path, dataset_format):
+    writer = DiameterDatasetWriter(str(tmp_path), format=dataset_format)
+
+    writer.write("01_a.tif", "01", np.array([1.0, 2.0, 3.0]), 0.5, "µm")
+    writer.write("02_a.tif", "02", np.array([4.0]), 2.0, "µm")
+
+    df = read_diameter_dataset(str(tmp_path), format=dataset_format)
+    df["image"] = df["image"].astype(str)
+    df = df.sort_values(["image", "fibre"])
+
+    assert list(df["sample_name"]) == ["01", "01", "01", "02"]
+    assert list(df["image"]) == ["01_a.tif"] * 3 + ["02_a.tif"]
+    np.testing.assert_allclose(df["pixel_diameter"], [1.0, 2.0, 3.0, 4.0])
+    np.testing.assert_allclose(df["diameter"], [0.5, 1.0, 1.5, 8.0])
+
+
+def test_write_replaces_image(tmp_path):
+    writer = DiameterDatasetWriter(str(tmp_path))
+
+    writer.write("a.tif", "a", np.array([1.0, 2.0]), 1.0, "µm")
+    path = writer.write("a.tif", "a", np.array([3.0]), 1.0, "µm")
+
+    df = read_diameter_dataset(str(tmp_path))
+
+    assert path.endswith("a.parquet")
+    np.testing.assert_allclose(df["pixel_diameter"], [3.0])
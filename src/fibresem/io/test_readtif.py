@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+""" """
+
+# Standard library modules.
+import os
+
+# Third party modules.
+import numpy as np
+import pytest
+
+# Local modules.
+from fibresem.io import readtif
+
+# Globals and constants variables.
+SAMPLE_DATA = os.path.join(os.path.dirname(__file__), "..", "..", "..", "sampledata")
+SAMPLES = ["sample.01_img08.tif", "sample.02_img20.tif"]
+
+
+@pytest.mark.parametrize("filename", SAMPLES)
+def test_readmeta_matches_readtags(filename):
+    path = os.path.join(SAMPLE_DATA, filename)
+
+    image, tags = readtif.importtif(path)
+    meta = readtif.readmeta(path)
+
+    assert meta["image"] == tags["image"]
+    assert meta["Pixel Size Value"] == tags["Pixel Size Value"]
+    assert meta["Pixel Size Unit"] == tags["Pixel Size Unit"]
+    assert (meta["ImageLength"], meta["ImageWidth"]) == image.shape
+
+
+@pytest.mark.parametrize("filename", SAMPLES)
+def test_importtif_memmap(filename):
+    path = os.path.join(SAMPLE_DATA, filename)
+
+    image, _ = readtif.importtif(path)
+    mapped, tags = readtif.importtif(path, memmap=True)
+
+    assert isinstance(mapped, np.memmap)
+    assert not mapped.flags.writeable
+    np.testing.assert_array_equal(mapped, image)
+    assert tags["Pixel Size Value"] > 0
+
+
+def test_importtif_memmap_compressed(tmp_path):
+    path = str(tmp_path / "image.tif")
+    image = np.arange(64 * 64, dtype=np.uint8).reshape(64, 64)
+    readtif.tifffile.imwrite(path, image, compression="zlib")
+
+    loaded, _ = readtif.importtif(path, memmap=True)
+
+    assert not isinstance(loaded, np.memmap)
+    np.testing.assert_array_equal(loaded, image)
+
+
+def test_readmeta_not_a_tiff(tmp_path):
+    path = tmp_path / "image.tif"
+    path.write_bytes(b"not a tiff file")
+
+    with pytest.raises(Exception):
+        readtif.readmeta(str(path))
+
+
+# Windows inside the image, across its edges and larger than the image
+WINDOWS = [
+    (0, 10, 0, 10),
+    (5, 47, 13, 70),
+    (-20, 30, -5, 12),
+    (90, 140, 60, 200),
+    (-10, 200, -10, 200),
+    (99, 100, 76, 77),
+]
+
+
+def expected_window(image, y0, y1, x0, x1):
+    return image[max(y0, 0) : max(y1, 0), max(x0, 0) : max(x1, 0)]
+
+
+@pytest.mark.parametrize("memmap", [True, False])
+def test_region_reader_sample(memmap):
+    path = os.path.join(SAMPLE_DATA, SAMPLES[0])
+    image, _ = readtif.importtif(path)
+    height, width = image.shape
+
+    windows = [
+        (0, 512, 0, 512),
+        (height - 300, height + 300, width - 100, width + 50),
+        (-64, 64, width // 2, width // 2 + 1),
+        (0, height, 0, width),
+    ]
+
+    with readtif.RegionReader(path, memmap=memmap) as reader:
+        assert reader.shape == image.shape
+
+        for window in windows:
+            np.testing.assert_array_equal(reader.read(*window), expected_window(image, *window))
+
+
+@pytest.mark.parametrize(
+    "layout",
+    [
+        {"tile": (32, 48)},
+        {"tile": (16, 16), "compression": "zlib"},
+        {"rowsperstrip": 7},
+        {"rowsperstrip": 7, "compression": "zlib"},
+        {"rowsperstrip": 7, "compression": "zlib", "photometric": "rgb"},
+    ],
+)
+def test_region_reader_layouts(tmp_path, layout):
+    rng = np.random.default_rng(0)
+    image = rng.integers(0, 256, (100, 77), dtype=np.uint8)
+
+    data = image
+    if layout.get("photometric") == "rgb":
+        # The first sample is read
+        data = np.stack([image, 255 - image, image // 2], axis=-1)
+
+    path = str(tmp_path / "image.tif")
+    readtif.tifffile.imwrite(path, data, **layout)
+
+    with readtif.RegionReader(path) as reader:
+        assert reader.shape == image.shape
+
+        # Consecutive windows reuse decoded segments
+        for window in WINDOWS + WINDOWS[::-1]:
+            np.testing.assert_array_equal(reader.read(*window), expected_window(image, *window))